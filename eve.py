@@ -2,10 +2,9 @@
 # vim: set expandtab:
 
 import os, sys
-import copy
-import importlib
-import configparser
+import time
 import eve.common
+import eve.scanner
 
 # eve [module] <feature> feature_args ...
 class Eve:
@@ -19,6 +18,14 @@ class Eve:
     _eve_cfg_key = 'EVE_CFG'
     _eve_cfg = None
 
+    # precompiled modules and classes, next to config, see __load_dispatch
+    _eve_idx = None
+    _eve_idx_version = 2
+
+    # eve system scan imports modules in subprocesses, see __scan_modules
+    _eve_scan_jobs = 8
+    _eve_scan_timeout = 30
+
     _eve_db_def = '.eve.db'
     _eve_db_key = 'EVE_DB'
     _eve_db = None
@@ -26,31 +33,71 @@ class Eve:
     _eve_system_str = 'system'
     _eve_system_desc = 'eve system operations'
 
+    _eve_system_features = ['scan', 'complete', 'profile-startup', 'server', 'trace']
+
+    _eve_shell_str = 'shell'
+    _eve_shell_desc = 'interactive eve shell'
+    _eve_shell_prompt = 'eve> '
+    _eve_shell_exit = ['exit', 'quit']
+
+    _eve_history_def = '.eve_history'
+    _eve_history_key = 'EVE_HISTORY'
+    _eve_history_len = 1000
+
+    # eve system server listens on $EVE_SERVER (or this in script dir),
+    # eve runs as its client when EVE_SERVER is set
+    _eve_server_def = '.eve.sock'
+    _eve_server_key = 'EVE_SERVER'
+    _eve_server_backlog = 16
+
+    # set by eve system profile-startup, file to write phases to at exit
+    _eve_profile_key = 'EVE_PROFILE_STARTUP'
+    _eve_profile_top = 15
+
     EXITCODE_SUCC = 0
     EXITCODE_FAIL = 1
 
     def __init__(self):
+        start = time.perf_counter()
+        if self._eve_profile_key in os.environ:
+            import atexit
+            atexit.register(self.__dump_phases, os.environ[self._eve_profile_key])
         script_dir=os.path.dirname(os.path.realpath(sys.argv[0]))
         sys.path.append(script_dir)
+        self._script_dir = script_dir
 
         self._eve_cfg_template = '{}/{}'.format(script_dir, self._eve_cfg_template)
         self._eve_cfg = os.environ.get(self._eve_cfg_key, self._eve_cfg_def)
         if not self._eve_cfg.startswith('/'):
             self._eve_cfg = '{}/{}'.format(script_dir, self._eve_cfg)
+        self._eve_idx = os.path.splitext(self._eve_cfg)[0] + '.idx'
 
         self._eve_db = os.environ.get(self._eve_db_key, self._eve_db_def)
         if not self._eve_db.startswith('/'):
             self._eve_db = '{}/{}'.format(script_dir, self._eve_db)
         eve.common.set_dbfilepath(self._eve_db)
 
+        self._eve_history = os.environ.get(self._eve_history_key, self._eve_history_def)
+        if not self._eve_history.startswith('/'):
+            self._eve_history = '{}/{}'.format(script_dir, self._eve_history)
+
+        # command instances, kept by eve shell to reuse parsers and db
+        self._instances = {}
+
         self._script = os.path.basename(__file__)
-        if os.path.isfile(self._eve_cfg):
-            self.__load_config(self._eve_cfg)
+        if sys.argv[1:3] == [self._eve_system_str, 'complete'] and os.path.isfile(self._eve_cfg):
+            # completion reads its own index, config is loaded only to rebuild it
+            pass
+        elif sys.argv[1:3] == [self._eve_system_str, 'scan'] and os.path.isfile(self._eve_cfg):
+            # scan does not import modules itself
+            pass
+        elif os.path.isfile(self._eve_cfg):
+            self.__load_dispatch()
         else:
             print('config file not exists, generate from template')
-            self.__load_config(self._eve_cfg_template)
-            self.__system_scan()
-            self.__load_config(self._eve_cfg)
+            self.__system_scan(self._eve_cfg_template)
+            self.__load_dispatch()
+        eve.common.record_phase('eve.dispatch', start)
 
     def run(self):
         cls = self.__parse()
@@ -75,47 +122,151 @@ class Eve:
     ### end of helper functions ###
 
     def __load_config(self, cfg_file):
-        self._config['modules'] = []
-        _modules = {}
-        _classes = {}
-
+        # imported here, the dispatch index makes config parsing rare
+        import configparser
         parser = configparser.ConfigParser()
         parser.read(cfg_file)
 
+        self._config['modules'] = []
         if 'modules' in parser:
             for m in parser['modules']:
                 if parser['modules'][m]:
                     self._config['modules'].append(m)
+        scans = {}
         for m in self._config['modules']:
             mod_class = m + '.classes'
             mod_alias = m + ".alias"
-            mod = {'name': m,
-                   'desc': None,
-                   'classes': [] }
+            mod_complete = m + '.complete'
+            scan = {'desc': None, 'classes': {}, 'alias': {}, 'complete': {}}
             if m in parser:
-                mod['desc'] = parser[m].get('desc', None)
-            self._modules[m] = mod
-
+                scan['desc'] = parser[m].get('desc', None)
             if mod_class in parser:
-                for c in parser[mod_class]:
-                    if c not in self._classes:
-                        cls = { 'name': c,
-                                'classname': parser[mod_class][c],
-                                'modules': [] }
-                        self._classes[c] = cls
-                    self._classes[c]['modules'].append(m)
-                    self._modules[m]['classes'].append(c)
+                scan['classes'] = dict(parser[mod_class])
             if mod_alias in parser:
-                for a in parser[mod_alias]:
-                    c = parser[mod_alias][a]
-                    if c not in self._classes:
-                        continue
-                    if a not in self._classes:
-                        self._classes[a] = copy.deepcopy(self._classes[c])
-                    else:
-                        self._classes[a]['modules'].append(m)
-                    self._modules[m]['classes'].append(a)
-        pass
+                scan['alias'] = dict(parser[mod_alias])
+            if mod_complete in parser:
+                for k in parser[mod_complete]:
+                    c, var = k.split('.', 1)
+                    scan['complete'].setdefault(c, {})[var] = parser[mod_complete][k]
+            scans[m] = scan
+        self._modules, self._classes = self.__build_dispatch(self._config['modules'], scans)
+
+    @staticmethod
+    def __build_dispatch(order, scans):
+        """
+        modules and classes (with aliases) of scan results of modules in
+        `order`, see eve.scanner.scan
+        """
+        modules = {}
+        classes = {}
+        for m in order:
+            if m not in scans:
+                continue
+            scan = scans[m]
+            modules[m] = {'name': m,
+                          'desc': scan['desc'],
+                          'classes': [] }
+            for c, classname in scan['classes'].items():
+                if c not in classes:
+                    classes[c] = { 'name': c,
+                                   'classname': classname,
+                                   'modules': [] }
+                classes[c]['modules'].append(m)
+                modules[m]['classes'].append(c)
+            for c, hints in scan['complete'].items():
+                if c in classes:
+                    classes[c].setdefault('complete', {}).update(hints)
+            for a, c in scan['alias'].items():
+                if c not in classes:
+                    continue
+                if a not in classes:
+                    classes[a] = dict(classes[c], modules=list(classes[c]['modules']))
+                    if 'complete' in classes[c]:
+                        classes[a]['complete'] = dict(classes[c]['complete'])
+                else:
+                    classes[a]['modules'].append(m)
+                modules[m]['classes'].append(a)
+        return modules, classes
+
+    ### start of dispatch index ###
+    @staticmethod
+    def __stamp(path):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def __fresh(self, scan):
+        # same mtime and size, or touched but same content
+        try:
+            stamp = eve.scanner.stamp(scan['file'])
+            if stamp == scan['stamp']:
+                return True
+            if eve.scanner.digest(scan['file']) == scan['digest']:
+                scan['stamp'] = stamp
+                return None
+        except OSError:
+            pass
+        return False
+
+    def __read_index(self):
+        import marshal
+        try:
+            with open(self._eve_idx, 'rb') as f:
+                index = marshal.loads(f.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if not isinstance(index, dict) or index.get('version') != Eve._eve_idx_version:
+            return None
+        return index
+
+    def __write_index(self, index):
+        import marshal
+        try:
+            tmpfile = '{}.{}.tmp'.format(self._eve_idx, os.getpid())
+            with open(tmpfile, 'wb') as f:
+                marshal.dump(index, f)
+            os.replace(tmpfile, self._eve_idx)
+        except OSError:
+            pass
+
+    def __load_dispatch(self):
+        """
+        load modules and classes from the dispatch index, the config is
+        parsed only if it changed, and modules changed since last scan
+        are scanned again
+        """
+        index = self.__read_index()
+        dirty = False
+        cfg_stamp = self.__stamp(self._eve_cfg)
+        if index is None or index['cfg'] != cfg_stamp:
+            self.__load_config(self._eve_cfg)
+            scans = index['scans'] if index is not None else {}
+            index = {
+                'version': Eve._eve_idx_version,
+                'cfg': cfg_stamp,
+                'order': self._config['modules'],
+                'scans': {m: scans[m] for m in self._config['modules'] if m in scans},
+            }
+            dirty = True
+
+        for m in index['order']:
+            fresh = self.__fresh(index['scans'][m]) if m in index['scans'] else False
+            if fresh is None:
+                dirty = True
+            elif not fresh:
+                try:
+                    index['scans'][m] = eve.scanner.scan(m)
+                except Exception as e:
+                    sys.stderr.write('failed to scan module "{}": {}\n'.format(m, e))
+                    index['scans'].pop(m, None)
+                dirty = True
+
+        if dirty:
+            index['modules'], index['classes'] = self.__build_dispatch(index['order'], index['scans'])
+            self.__write_index(index)
+        self._config['modules'] = index['order']
+        self._modules = index['modules']
+        self._classes = index['classes']
+    ### end of dispatch index ###
 
     def __system(self):
         args = sys.argv
@@ -124,51 +275,243 @@ class Eve:
             return Eve.EXITCODE_SUCC
         elif args[2] == 'scan':
             return self.__system_scan()
+        elif args[2] == 'complete':
+            return self.__system_complete(args[3:])
+        elif args[2] == 'profile-startup':
+            return self.__system_profile_startup(args[3:])
+        elif args[2] == 'server':
+            return self.__system_server(args[3:])
+        elif args[2] == 'trace':
+            return self.__system_trace(args[3:])
         else:
             self.__help_system()
             return Eve.EXITCODE_FAIL
 
     # eve system <cr> | ? | -h | --help | (unknown feature)
     def __help_system(self):
-        features = ['scan']
         print('Usage: {} {} ({}) ' \
-            .format(self._script, self._eve_system_str, '|'.join(features)))
+            .format(self._script, self._eve_system_str, '|'.join(self._eve_system_features)))
+
+    # eve system complete [words ...], print candidates of the last word
+    def __system_complete(self, words):
+        from eve.completion import Completer
+        def load_config():
+            if len(self._modules) == 0:
+                self.__load_dispatch()
+            return self._modules, self._classes
+        completer = Completer(load_config, self._eve_cfg, self._script_dir,
+                [self._eve_system_str, self._eve_shell_str], self._eve_system_features)
+        for candidate in completer.complete(words):
+            print(candidate)
+        return Eve.EXITCODE_SUCC
+
+    # eve system profile-startup <cmd ...>, run eve <cmd ...> again with
+    # import time profiling and report where its startup went
+    def __system_profile_startup(self, args):
+        if len(args) == 0 or self.is_help(args[0]):
+            print('Usage: {} {} profile-startup <module/class args ...>'.format(self._script, self._eve_system_str))
+            return Eve.EXITCODE_SUCC if len(args) != 0 else Eve.EXITCODE_FAIL
+        import subprocess
+        import tempfile
+        import time
+        with tempfile.NamedTemporaryFile('r', prefix='eve-phases-') as phasefile:
+            env = dict(os.environ)
+            env['PYTHONPROFILEIMPORTTIME'] = '1'
+            env[self._eve_profile_key] = phasefile.name
+            start = time.perf_counter()
+            p = subprocess.run([sys.executable, os.path.realpath(sys.argv[0])] + args, env=env,
+                    stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            wall = time.perf_counter() - start
+            phases = []
+            for line in phasefile:
+                name, seconds = line.rstrip('\n').split('\t')
+                phases.append((name, float(seconds)))
+
+        # import time: self [us] | cumulative | <2 spaces per level>package
+        imports = []
+        for line in p.stderr.decode(errors='replace').splitlines():
+            if not line.startswith('import time:'):
+                continue
+            fields = line[len('import time:'):].split('|')
+            if len(fields) != 3 or not fields[0].strip().isdigit():
+                continue
+            name = fields[2][1:]
+            depth = (len(name) - len(name.lstrip(' '))) // 2
+            imports.append((name.strip(), int(fields[0]) / 1e6, int(fields[1]) / 1e6, depth))
+
+        top = sorted([i for i in imports if i[3] == 0], key=lambda i: i[2], reverse=True)
+        print('{} {}: exit {}, wall {:.1f} ms'.format(self._script, ' '.join(args), p.returncode, wall * 1000))
+        print('imports: {} modules, {:.1f} ms'.format(len(imports), sum(i[2] for i in top) * 1000))
+        print('  {:>9} {:>9}  {}'.format('cumul', 'self', 'top-level import'))
+        for name, own, cumul, depth in top[:Eve._eve_profile_top]:
+            print('  {:>6.1f} ms {:>6.1f} ms  {}'.format(cumul * 1000, own * 1000, name))
+        print('  {:>9} {:>9}  {}'.format('cumul', 'self', 'slowest module'))
+        for name, own, cumul, depth in sorted(imports, key=lambda i: i[1], reverse=True)[:Eve._eve_profile_top]:
+            print('  {:>6.1f} ms {:>6.1f} ms  {}'.format(cumul * 1000, own * 1000, name))
+        print('phases:')
+        for name, seconds in phases:
+            print('  {:>6.1f} ms  {}'.format(seconds * 1000, name))
+        return Eve.EXITCODE_SUCC
+
+    # eve system trace <spans.jsonl> [trace.json], convert spans written
+    # with $EVE_TRACE for chrome://tracing or perfetto
+    def __system_trace(self, args):
+        if len(args) == 0 or len(args) > 2 or self.is_help(args[0]):
+            print('Usage: {} {} trace <spans.jsonl> [trace.json]'.format(self._script, self._eve_system_str))
+            print('  record spans with {}=<spans.jsonl> (sample rate {}=0..1)' \
+                .format(eve.common.TRACE_KEY, eve.common.TRACE_SAMPLE_KEY))
+            return Eve.EXITCODE_SUCC if len(args) != 0 else Eve.EXITCODE_FAIL
+        outfile = args[1] if len(args) == 2 else os.path.splitext(args[0])[0] + '.chrome.json'
+        try:
+            cnt = eve.common.trace_to_chrome(args[0], outfile)
+        except OSError as e:
+            print('failed to convert {}: {}'.format(args[0], e))
+            return Eve.EXITCODE_FAIL
+        print('{} span(s) written to {}'.format(cnt, outfile))
+        return Eve.EXITCODE_SUCC
+
+    def __dump_phases(self, filename):
+        with open(filename, 'w') as f:
+            for name, seconds in eve.common.phases():
+                f.write('{}\t{:.6f}\n'.format(name, seconds))
+
+    def __scan_modules(self, names):
+        """
+        scan modules `names`, each in a subprocess so a broken or slow module
+        can not hang or pollute eve, at most _eve_scan_jobs at a time. return
+        {name: scan, or the error message}. the scans also cache CliParser
+        trees of the classes for eve system complete
+        """
+        import marshal
+        import subprocess
+        from concurrent.futures import ThreadPoolExecutor
+        def scan(m):
+            # `python -m` puts cwd first in sys.path, like the script dir for eve
+            try:
+                p = subprocess.run([sys.executable, '-m', 'eve.scanner', m, self._eve_db], cwd=self._script_dir,
+                        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                        timeout=Eve._eve_scan_timeout)
+            except subprocess.TimeoutExpired:
+                return 'timeout after {} seconds'.format(Eve._eve_scan_timeout)
+            if p.returncode != 0:
+                lines = p.stderr.decode(errors='replace').strip().splitlines()
+                return lines[-1] if len(lines) != 0 else 'exit code {}'.format(p.returncode)
+            try:
+                return marshal.loads(p.stdout)
+            except (EOFError, ValueError, TypeError):
+                return 'bad output of scanner'
+        if len(names) == 0:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(len(names), Eve._eve_scan_jobs)) as pool:
+            return dict(zip(names, pool.map(scan, names)))
+
+    def __system_scan(self, cfg_file = None):
+        """
+        scan modules of config `cfg_file` (default: the eve config) changed
+        since the last scan, then replace the eve config and dispatch index
+        if anything changed
+        """
+        import io
+        import configparser
+        self.__load_config(cfg_file or self._eve_cfg)
+        order = list(self._config['modules'])
+        index = self.__read_index()
+        old_scans = index['scans'] if index is not None else {}
+        scans = {}
+        changed = []
+        dirty = False
+        for m in order:
+            fresh = self.__fresh(old_scans[m]) if m in old_scans else False
+            if fresh is False:
+                changed.append(m)
+                continue
+            scans[m] = old_scans[m]
+            if fresh is None:
+                dirty = True
+
+        failed = 0
+        results = self.__scan_modules(changed)
+        for m in order:
+            if m not in results:
+                print('Module "{}" unchanged'.format(m))
+                continue
+            print('Scan module "{}" ... '.format(m))
+            scan = results[m]
+            if not isinstance(scan, dict):
+                failed += 1
+                print('  Failed: {}'.format(scan))
+                if m in old_scans:
+                    scans[m] = old_scans[m]
+                    print('  Keep result of last scan')
+                continue
+            scans[m] = scan
+            dirty = True
+            for k, v in scan['classes'].items():
+                print('  Found class "{}"'.format(v))
+            for k in scan['alias']:
+                print('  Found alias "{}"'.format(k))
+            for k in scan.pop('trees', []):
+                print('  Cached command tree of "{}"'.format(k))
 
-    def __system_scan(self):
         writer = configparser.RawConfigParser()
         writer.add_section('modules')
-        for m in self._config['modules']:
+        for m in order:
             writer.set('modules', m, 'True')
-
         class_cnt = 0
         module_cnt = 0
-        modules = map(__import__, self._config['modules'])
-        for m in modules:
-            writer.add_section(m.__name__)
-            writer.set(m.__name__, "desc", m.__desc__)
+        for m in order:
+            if m not in scans:
+                continue
+            scan = scans[m]
+            writer.add_section(m)
+            writer.set(m, "desc", scan['desc'])
 
-            mod_classes = m.__name__ + ".classes"
-            mod_alias = m.__name__ + ".alias"
+            mod_classes = m + ".classes"
+            mod_alias = m + ".alias"
+            mod_complete = m + ".complete"
             writer.add_section(mod_classes)
             writer.add_section(mod_alias)
+            writer.add_section(mod_complete)
             module_cnt += 1
-            print('Scan module "{}" ... '.format(m.__name__))
-            classes = m.__all__
-            for k, v in m.__classmap__.items():
-                if k in classes:
-                    writer.set(mod_classes, k, v)
-                    class_cnt += 1
-                    print('  Found class "{}"'.format(v))
-            if hasattr(m, '__alias__'):
-                for k, v in m.__alias__.items():
-                    if v in classes:
-                        writer.set(mod_alias, k, v)
-                        print('  Found alias "{}"'.format(k))
-        with open(self._eve_cfg, "w") as configfile:
-            writer.write(configfile)
-        print("System Scan done, total {} classes within {} module(s)".format(class_cnt, module_cnt))
-        print("Config update to {}".format(self._eve_cfg))
-        return Eve.EXITCODE_SUCC
+            for k, v in scan['classes'].items():
+                writer.set(mod_classes, k, v)
+                class_cnt += 1
+            for k, v in scan['alias'].items():
+                writer.set(mod_alias, k, v)
+            for k, hints in scan['complete'].items():
+                for var, column in hints.items():
+                    writer.set(mod_complete, '{}.{}'.format(k, var), column)
+        content = io.StringIO()
+        writer.write(content)
+        content = content.getvalue()
+        try:
+            with open(self._eve_cfg, 'r') as f:
+                cfg_changed = f.read() != content
+        except OSError:
+            cfg_changed = True
+        if cfg_changed:
+            # replaced in one step, eve never sees a partial config
+            tmpfile = '{}.{}.tmp'.format(self._eve_cfg, os.getpid())
+            with open(tmpfile, 'w') as configfile:
+                configfile.write(content)
+            os.replace(tmpfile, self._eve_cfg)
+
+        cfg_stamp = self.__stamp(self._eve_cfg)
+        if dirty or index is None or index['cfg'] != cfg_stamp or index['order'] != order \
+                or set(index['scans']) != set(scans):
+            index = {
+                'version': Eve._eve_idx_version,
+                'cfg': cfg_stamp,
+                'order': order,
+                'scans': scans,
+            }
+            index['modules'], index['classes'] = self.__build_dispatch(order, scans)
+            self.__write_index(index)
+        print("System Scan done, total {} classes within {} module(s), {} scanned, {} failed" \
+            .format(class_cnt, module_cnt, len(changed), failed))
+        if cfg_changed:
+            print("Config update to {}".format(self._eve_cfg))
+        return Eve.EXITCODE_SUCC if failed == 0 else Eve.EXITCODE_FAIL
 
     def __parse(self):
         args = sys.argv
@@ -177,13 +520,15 @@ class Eve:
             return Eve.EXITCODE_SUCC
         elif args[1] == self._eve_system_str:
             return self.__system()
+        elif args[1] == self._eve_shell_str:
+            return self.__shell()
         elif self.is_module(args[1]):
             prefix = '{} {}'.format(args[0], args[1])
             if len(args) == 2 or self.is_help(args[2]):
                 self.__help_module(args[1])
                 return Eve.EXITCODE_SUCC
             elif self.is_class(args[2]):
-                cls = self._classes[args[2]]
+                cls = dict(self._classes[args[2]])
                 cls['prefix'] = prefix
                 cls['module'] = args[1]
                 del cls['modules']
@@ -196,7 +541,7 @@ class Eve:
                         .format(args[2], args[1]))
                 return Eve.EXITCODE_FAIL
         elif self.is_class(args[1]):
-            cls = self._classes[args[1]]
+            cls = dict(self._classes[args[1]])
             if len(cls['modules']) == 1:
                 cls['prefix'] = args[0]
                 cls['module'] = cls['modules'][0]
@@ -212,9 +557,326 @@ class Eve:
             return Eve.EXITCODE_FAIL
 
     def __exec(self, cls):
-        m = importlib.import_module('{}.{}'.format(cls['module'], cls['name']))
-        c = getattr(m, cls['classname'])(cls['name'], cls['prefix'], cls['classname'])
-        return c.run()
+        key = (cls['module'], cls['name'], cls['prefix'])
+        if key not in self._instances:
+            import importlib
+            t = time.perf_counter()
+            m = importlib.import_module('{}.{}'.format(cls['module'], cls['name']))
+            t = eve.common.record_phase('eve.import', t)
+            self._instances[key] = getattr(m, cls['classname'])(cls['name'], cls['prefix'], cls['classname'])
+            eve.common.record_phase('eve.init', t)
+        return self._instances[key].run()
+
+    ### start of server ###
+    @staticmethod
+    def client():
+        """
+        run this invocation in the eve server listening on $EVE_SERVER (see
+        eve system server), stdio are passed to the server, return the exit
+        code, or None if it should run in this process
+        """
+        path = os.environ.get(Eve._eve_server_key)
+        if not path or sys.argv[1:3] == [Eve._eve_system_str, 'server']:
+            return None
+        if not path.startswith('/'):
+            path = '{}/{}'.format(os.path.dirname(os.path.realpath(sys.argv[0])), path)
+        # the socket module pulls in enum and selectors, which costs more
+        # than the rest of the client, use its C part directly
+        import _socket
+        import array
+        sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+            # argc, argv..., cwd, KEY=VALUE..., separated by \0
+            fields = [str(len(sys.argv))] + sys.argv + [os.getcwd()]
+            fields += ['{}={}'.format(k, v) for k, v in os.environ.items()]
+            data = '\0'.join(fields).encode(errors='surrogateescape')
+            fds = array.array('i', [0, 1, 2])
+            sock.sendmsg([len(data).to_bytes(4, 'big')], [(_socket.SOL_SOCKET, _socket.SCM_RIGHTS, fds)])
+            sock.sendall(data)
+        except OSError:
+            sock.close()
+            return None
+
+        # reply is one line, processes forked by the command may keep the
+        # connection open after it, do not wait for EOF
+        reply = b''
+        try:
+            while not reply.endswith(b'\n'):
+                chunk = sock.recv(64)
+                if not chunk:
+                    break
+                reply += chunk
+        except KeyboardInterrupt:
+            # closing the socket interrupts the command in the server
+            return 130
+        finally:
+            sock.close()
+        if reply == b'local\n':
+            return None
+        if not reply.startswith(b'exit ') or not reply.endswith(b'\n'):
+            sys.stderr.write('eve server closed connection\n')
+            return Eve.EXITCODE_FAIL
+        return int(reply[5:])
+
+    def __server_path(self):
+        path = os.environ.get(self._eve_server_key) or self._eve_server_def
+        if not path.startswith('/'):
+            path = '{}/{}'.format(self._script_dir, path)
+        return path
+
+    def __server_preload(self):
+        import importlib
+        # aliases share the module of their class
+        names = {'{}.{}'.format(m, cls['name']) for cls in self._classes.values() for m in cls['modules']}
+        for name in sorted(names):
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                print('failed to preload {}: {}'.format(name, e))
+        # used by every command
+        import argparse, logging, shlex, sqlite3
+        import eve.cliparser
+
+    def __server_worker(self, conn):
+        import signal
+        import socket
+        import threading
+        try:
+            msg, fds, _, _ = socket.recv_fds(conn, 4, 3)
+            size = int.from_bytes(msg, 'big')
+            data = b''
+            while len(data) < size:
+                chunk = conn.recv(size - len(data))
+                if not chunk:
+                    raise EOFError()
+                data += chunk
+            fields = data.decode(errors='surrogateescape').split('\0')
+            argc = int(fields[0])
+            argv = fields[1:1 + argc]
+            cwd = fields[1 + argc]
+            env = dict(f.split('=', 1) for f in fields[2 + argc:] if '=' in f)
+        except (OSError, ValueError, EOFError, IndexError):
+            return Eve.EXITCODE_FAIL
+
+        # config and db were loaded for the environment of the server
+        if len(fds) != 3 or not os.path.isdir(cwd) or \
+                any(env.get(k) != os.environ.get(k) for k in (self._eve_cfg_key, self._eve_db_key)):
+            conn.sendall(b'local\n')
+            return Eve.EXITCODE_SUCC
+
+        # processes forked by the command (e.g. daemonize) must not hold
+        # the connection of the client
+        os.register_at_fork(after_in_child=conn.close)
+
+        for i, fd in enumerate(fds):
+            os.dup2(fd, i)
+            os.close(fd)
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(env)
+        sys.argv = argv
+
+        done = []
+        def watch():
+            # client closed before the command finished (e.g. ctrl-c)
+            try:
+                conn.recv(1)
+            except OSError:
+                pass
+            if not done:
+                os.kill(os.getpid(), signal.SIGINT)
+        watcher = threading.Thread(target=watch, name='client')
+        watcher.daemon = True
+        watcher.start()
+
+        try:
+            r = self.run()
+        except SystemExit as e:
+            r = e.code
+        except KeyboardInterrupt:
+            r = 130
+        except Exception:
+            import traceback
+            traceback.print_exc()
+            r = Eve.EXITCODE_FAIL
+        if r is None or r is False:
+            r = Eve.EXITCODE_SUCC
+        elif not isinstance(r, int) or r is True:
+            r = Eve.EXITCODE_FAIL
+        sys.stdout.flush()
+        sys.stderr.flush()
+        done.append(True)
+        try:
+            conn.sendall('exit {}\n'.format(r).encode())
+        except OSError:
+            pass # client is gone
+        return Eve.EXITCODE_SUCC
+
+    @staticmethod
+    def __server_reap():
+        try:
+            while os.waitpid(-1, os.WNOHANG)[0] != 0:
+                pass
+        except ChildProcessError:
+            pass
+
+    # eve system server, serve eve clients (EVE_SERVER=<socket> eve ...)
+    # from processes forked from this warm one
+    def __system_server(self, args):
+        import signal
+        import socket
+        path = self.__server_path()
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+                print('eve server is running on {}'.format(path))
+                return Eve.EXITCODE_FAIL
+            except OSError:
+                os.unlink(path) # left by a server not stopped cleanly
+            finally:
+                probe.close()
+
+        self.__server_preload()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # clients pass their environment, only the owner may connect
+        umask = os.umask(0o077)
+        try:
+            server.bind(path)
+        finally:
+            os.umask(umask)
+        server.listen(self._eve_server_backlog)
+        server.settimeout(1.0)
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+        print('eve server listening on {}, pid {}'.format(path, os.getpid()))
+        sys.stdout.flush()
+
+        try:
+            while not stopping:
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    conn = None
+                if conn is not None:
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                    pid = os.fork()
+                    if pid == 0:
+                        # never return into the loop of the server
+                        r = Eve.EXITCODE_FAIL
+                        try:
+                            server.close()
+                            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                            conn.settimeout(None)
+                            r = self.__server_worker(conn)
+                        finally:
+                            os._exit(r)
+                    conn.close()
+                self.__server_reap()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            if os.path.exists(path):
+                os.unlink(path)
+        print('eve server stopped')
+        return Eve.EXITCODE_SUCC
+    ### end of server ###
+
+    ### start of shell ###
+    def __shell_completer(self):
+        from eve.completion import Completer
+        completer = Completer(lambda: (self._modules, self._classes), self._eve_idx, self._script_dir,
+                [self._eve_system_str], self._eve_system_features)
+        def complete(text, state):
+            import readline
+            if state == 0:
+                line = readline.get_line_buffer()[:readline.get_endidx()]
+                words = line.split()
+                if line.endswith(' ') or len(words) == 0:
+                    words.append('')
+                try:
+                    self.__candidates = completer.complete(words)
+                except Exception:
+                    self.__candidates = []
+            if state < len(self.__candidates):
+                return self.__candidates[state] + ' '
+            return None
+        return complete
+
+    def __shell_line(self, line):
+        import shlex
+        argv0 = sys.argv[0]
+        try:
+            sys.argv = [argv0] + shlex.split(line)
+        except ValueError as e:
+            print('{}'.format(e))
+            return Eve.EXITCODE_FAIL
+        try:
+            if sys.argv[1] == self._eve_shell_str:
+                print('already in {}'.format(self._eve_shell_str))
+                return Eve.EXITCODE_FAIL
+            return self.run()
+        except SystemExit as e:
+            # argparse errors, --help, commands calling sys.exit
+            if e.code is None or isinstance(e.code, int):
+                return e.code
+            print(e.code)
+            return Eve.EXITCODE_FAIL
+        except KeyboardInterrupt:
+            print('^C')
+            return Eve.EXITCODE_FAIL
+        except Exception as e:
+            print('{}: {}'.format(type(e).__name__, e))
+            return Eve.EXITCODE_FAIL
+        finally:
+            sys.argv = [argv0]
+
+    # eve shell, run lines as arguments of eve in this process
+    def __shell(self):
+        try:
+            import readline
+        except ImportError:
+            readline = None
+        if readline is not None:
+            try:
+                readline.read_history_file(self._eve_history)
+            except OSError:
+                pass
+            readline.set_history_length(self._eve_history_len)
+            readline.set_completer_delims(' \t\n')
+            readline.set_completer(self.__shell_completer())
+            readline.parse_and_bind('tab: complete')
+
+        interactive = sys.stdin.isatty()
+        r = Eve.EXITCODE_SUCC
+        while True:
+            try:
+                line = input(self._eve_shell_prompt if interactive else '').strip()
+            except EOFError:
+                if interactive:
+                    print()
+                break
+            except KeyboardInterrupt:
+                print()
+                continue
+            if len(line) == 0 or line.startswith('#'):
+                continue
+            if line in self._eve_shell_exit:
+                break
+            r = self.__shell_line(line)
+            if r:
+                print('[exit {}]'.format(r))
+
+        if readline is not None:
+            try:
+                readline.write_history_file(self._eve_history)
+            except OSError:
+                pass
+        return r
+    ### end of shell ###
 
     # eve <cr> | ? | --help | -h | (unknown module)
     def __help(self, msg = None):
@@ -224,6 +886,7 @@ class Eve:
         print
         print('Availiable modules:')
         print('{:>10} : {}'.format(self._eve_system_str, self._eve_system_desc))
+        print('{:>10} : {}'.format(self._eve_shell_str, self._eve_shell_desc))
         for m in self._modules.values():
             print('{:>10} : {}'.format(m['name'], m['desc']))
         pass
@@ -240,6 +903,8 @@ class Eve:
         pass
 
 if __name__ == '__main__':
-    r = Eve().run()
+    r = Eve.client()
+    if r is None:
+        r = Eve().run()
     sys.exit(r)
 
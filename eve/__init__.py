@@ -1,10 +1,13 @@
 __desc__ = 'eve system commands'
 
-__all__ = ['cmdbase', 'databae', 'common', 'polling_service']
+__all__ = ['cmdbase', 'databae', 'common', 'polling_service', 'cron', 'inotify', 'memory_profiler', 'completion', 'scanner', 'stack_sampler']
 __classmap__ = {
         'polling_service': 'PollingServiceCLI',
         }
 __alias__ = {
     'ps': 'polling_service'
 }
+__completion__ = {
+    'polling_service': {'jobname': 'jobs.jobname'},
+}
 
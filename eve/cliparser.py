@@ -3,6 +3,10 @@
 
 import re
 import sys
+import os
+import json
+import hashlib
+import importlib
 
 TOKEN_TYPE_CONST = 'const'
 TOKEN_TYPE_OPTION = 'opt'
@@ -12,6 +16,12 @@ KEY_TARGET = 'target'
 KEY_TYPE = 'type'
 KEY_LIST = 'list'
 
+# prefix shared by more than one const child, see CliParser.compile
+AMBIGUOUS = object()
+
+# bump when format of CliParser.freeze changes
+FROZEN_VERSION = 1
+
 class CliParser:
     class BadTokenFormatException(Exception):
         def __init__(self, message):
@@ -25,6 +35,10 @@ class CliParser:
         def __init__(self, message):
             super().__init__(message)
 
+    class CmdTreeFreezeException(Exception):
+        def __init__(self, message):
+            super().__init__(message)
+
     class CmdToken:
         RE_VAR_PATTERN = r'@\s*(\w+)\s*(\((\w+)\))?\s*(...)?'
         ACCEPT_TYPE = {'bool', 'str', 'int'}
@@ -40,6 +54,8 @@ class CliParser:
             self.hidden = True
             self.const_children = {}
             self.var_child = None
+            self.prefix_map = None # every prefix of const children => child or AMBIGUOUS
+            self.frozen = None # children not thawed yet, see CliParser.thaw
 
             self.token = token
             self.props = None
@@ -88,6 +104,64 @@ class CliParser:
                 self.props = {KEY_TYPE: 'short'}
             return TOKEN_TYPE_OPTION
 
+        def freeze(self, inst):
+            args = dict(self.args) if self.args else {}
+            with_inst = 'self' in args
+            if with_inst and args.pop('self') is not inst:
+                raise CliParser.CmdTreeFreezeException('token {} is bound to another instance'.format(self.token))
+            try:
+                if json.loads(json.dumps(args)) != args:
+                    raise ValueError()
+            except (TypeError, ValueError):
+                raise CliParser.CmdTreeFreezeException('args of token {} are not serializable'.format(self.token))
+            return {
+                't': self.token, 'y': self.type, 'p': self.props,
+                'h': self.help, 'x': self.hidden, 'e': self.extra,
+                'f': __class__.__func_name(self.func),
+                'a': args, 'i': with_inst,
+            }
+
+        @staticmethod
+        def __func_name(func):
+            if func is None:
+                return None
+            name = '{}:{}'.format(getattr(func, '__module__', None), getattr(func, '__qualname__', None))
+            try:
+                resolved = __class__.__resolve_func(name)
+            except (ImportError, AttributeError):
+                resolved = None
+            if resolved is not func:
+                raise CliParser.CmdTreeFreezeException('func {} can not be found by name'.format(name))
+            return name
+
+        @staticmethod
+        def __resolve_func(name):
+            modname, qualname = name.split(':', 1)
+            obj = sys.modules.get(modname) or importlib.import_module(modname)
+            for attr in qualname.split('.'):
+                obj = getattr(obj, attr)
+            return obj
+
+        @classmethod
+        def thaw(cls, data, inst):
+            # skip __init__, the frozen token is parsed already
+            node = cls.__new__(cls)
+            node.token = data['t']
+            node.type = data['y']
+            node.props = data['p']
+            node.help = data['h']
+            node.hidden = data['x']
+            node.extra = data['e']
+            node.func = None if data['f'] is None else cls.__resolve_func(data['f'])
+            node.args = dict(data['a'])
+            if data['i']:
+                node.args['self'] = inst
+            node.const_children = {}
+            node.var_child = None
+            node.prefix_map = None
+            node.frozen = (data.get('c'), data.get('v'), inst)
+            return node
+
         def token_str(self):
             if self.type == TOKEN_TYPE_CONST:
                 return self.token
@@ -196,17 +270,13 @@ class CliParser:
         if node.type == TOKEN_TYPE_VAR and node.props[KEY_LIST]:
             return self.__capture_arg(node, token, args)
 
-        # check const children first
-        prefix_children = []
-        for ctoken, cnode in node.const_children.items():
-            if ctoken == token:
-                return cnode
-            if ctoken.startswith(token):
-                prefix_children.append(cnode)
-
-        # one const child solely matched the prefix
-        if len(prefix_children) == 1:
-            return prefix_children[0]
+        # check const children first, exact match or the only child with
+        # the prefix, see compile
+        if node.prefix_map is None:
+            CliParser.__compile_node(node)
+        cnode = node.prefix_map.get(token)
+        if cnode is not None and cnode is not AMBIGUOUS:
+            return cnode
 
         # check variable child
         if node.var_child is None:
@@ -214,7 +284,66 @@ class CliParser:
 
         return self.__capture_arg(node.var_child, token, args)
 
+    @staticmethod
+    def __thaw_children(node):
+        if node.frozen is None:
+            return
+        const_children, var_child, inst = node.frozen
+        node.frozen = None
+        for ctoken, data in (const_children or {}).items():
+            node.const_children[ctoken] = CliParser.CmdToken.thaw(data, inst)
+        if var_child is not None:
+            node.var_child = CliParser.CmdToken.thaw(var_child, inst)
+
+    @staticmethod
+    def __compile_node(node):
+        CliParser.__thaw_children(node)
+        prefix_map = {}
+        for ctoken, cnode in node.const_children.items():
+            for i in range(len(ctoken)):
+                prefix = ctoken[:i]
+                prefix_map[prefix] = cnode if prefix not in prefix_map else AMBIGUOUS
+        # and every token itself, none is a prefix of another, see add_command
+        prefix_map.update(node.const_children)
+        node.prefix_map = prefix_map
+
+    @staticmethod
+    def __compile_tree(node):
+        CliParser.__compile_node(node)
+        for cnode in node.const_children.values():
+            CliParser.__compile_tree(cnode)
+        if node.var_child is not None:
+            CliParser.__compile_tree(node.var_child)
+
+    @staticmethod
+    def __thaw_tree(node):
+        CliParser.__thaw_children(node)
+        for cnode in node.const_children.values():
+            CliParser.__thaw_tree(cnode)
+        if node.var_child is not None:
+            CliParser.__thaw_tree(node.var_child)
+
+    @staticmethod
+    def __check_prefix(node, token):
+        # a token that abbreviates a sibling, or is abbreviated by one, could
+        # mean either of them
+        for ctoken in node.const_children:
+            if ctoken.startswith(token) or token.startswith(ctoken):
+                raise CliParser.CmdTreeBuildException('Ambiguous token [{}] vs [{}]'.format(token, ctoken))
+
+    @staticmethod
+    def __freeze_node(node, inst):
+        data = node.freeze(inst)
+        if len(node.const_children) != 0:
+            data['c'] = {ctoken: CliParser.__freeze_node(cnode, inst)
+                    for ctoken, cnode in node.const_children.items()}
+        if node.var_child is not None:
+            data['v'] = CliParser.__freeze_node(node.var_child, inst)
+        return data
+
     def __call_cmd_handler(self, type, node, cmdline, match_cnt):
+        # help messages look into the whole subtree
+        CliParser.__thaw_tree(node)
         parse_info = {
             'handle_type': type,
             'cmdline': cmdline,
@@ -295,7 +424,8 @@ class CliParser:
         """
         add a command with the cmdline tokens to match and the func to execute
 
-        `tokens`: list of str that be used to match user's input, a token start with @ will capture user's input and pass it to handler function
+        `tokens`: list of str that be used to match user's input, a token start with @ will capture user's input and pass it to handler function.
+                  raise CmdTreeBuildException if a const token is a prefix of another one at the same level, or the other way round
         `inst`, `func`: handler function expected to be a member of class,
                         thus (class instance - `inst`, member function `func`) defines func for a command
         `default_args`: predefine some arguments for handler function
@@ -308,9 +438,12 @@ class CliParser:
             cmd_token = CliParser.CmdToken(token)
             if cmd_token.type == TOKEN_TYPE_OPTION:
                 raise CliParser.CmdTreeBuildException('bad format of token in command')
+            CliParser.__thaw_children(node)
             if cmd_token.type == TOKEN_TYPE_CONST:
                 if cmd_token.token not in node.const_children:
+                    CliParser.__check_prefix(node, cmd_token.token)
                     node.const_children[cmd_token.token] = cmd_token
+                    node.prefix_map = None
                 node = node.const_children[cmd_token.token]
             else:
                 if node.var_child is not None:
@@ -322,6 +455,7 @@ class CliParser:
                     node = node.var_child
             node.hidden &= hidden
 
+        default_args = dict(default_args)
         if inst is not None:
             default_args['self'] = inst
         node.setup(help, default_args, hidden, func, extra)
@@ -338,6 +472,7 @@ class CliParser:
         `hidden`: indicate this command should be hidden from help message
         `extra`: extra information that can be used in customized help/bad_cmd message
         """
+        default_args = dict(default_args)
         for o in opts:
             cmd_token = CliParser.CmdToken(o)
             if cmd_token.type != TOKEN_TYPE_OPTION:
@@ -349,6 +484,89 @@ class CliParser:
             opt_type = cmd_token.props[KEY_TYPE]
             self.option_handler[opt_type][cmd_token.token] = cmd_token
 
+    def compile(self):
+        """
+        precompute exact and unique-prefix matches of every node, so each
+        token is matched by one dict lookup. otherwise a node is compiled
+        when invoke first reaches it
+        """
+        CliParser.__compile_tree(self.root)
+
+    def freeze(self, inst = None):
+        """
+        dump the command tree to a json-serializable dict, handler functions
+        are stored by name and `inst` by a flag, see thaw. raise
+        CmdTreeFreezeException if any handler or argument can not be stored
+        """
+        options = []
+        for opts in self.option_handler.values():
+            options += [node.freeze(inst) for node in opts.values()]
+        return {
+            'version': FROZEN_VERSION,
+            'keyword_help': self.keyword_help,
+            'root': CliParser.__freeze_node(self.root, inst),
+            'options': options,
+        }
+
+    @staticmethod
+    def thaw(frozen, inst = None):
+        """
+        parser from the dict of freeze, handlers are bound to `inst`. nodes
+        are restored when invoke first reaches them, so the cost of loading
+        does not grow with the tree. casters and bad/help handlers are not
+        frozen and have to be registered again
+        """
+        if frozen.get('version') != FROZEN_VERSION:
+            raise CliParser.CmdTreeFreezeException('unknown frozen version {}'.format(frozen.get('version')))
+        cp = CliParser()
+        cp.keyword_help = frozen['keyword_help']
+        cp.root = CliParser.CmdToken.thaw(frozen['root'], inst)
+        for data in frozen['options']:
+            node = CliParser.CmdToken.thaw(data, inst)
+            cp.option_handler[node.props[KEY_TYPE]][node.token] = node
+        return cp
+
+    @staticmethod
+    def cache_file(source, cachedir, name = None):
+        """
+        path of the tree cached by `cached` for the same arguments, the file
+        holds {'digest': sha1 of source, 'tree': freeze()}
+        """
+        key = hashlib.sha1(os.path.abspath(source).encode()).hexdigest()[:16]
+        return os.path.join(cachedir, 'cliparser-{}-{}.json'.format(name or 'tree', key))
+
+    @staticmethod
+    def cached(build, source, cachedir, inst = None, name = None):
+        """
+        parser built by `build(parser)`, or thawed from the copy cached in
+        `cachedir` by a previous call, as long as file `source` (the module
+        defining the commands) is not changed. trees that can not be frozen
+        are built every time
+        """
+        with open(source, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        cachefile = CliParser.cache_file(source, cachedir, name)
+        try:
+            with open(cachefile, 'r') as f:
+                cache = json.load(f)
+            if cache['digest'] == digest:
+                return CliParser.thaw(cache['tree'], inst)
+        except (OSError, ValueError, KeyError, ImportError, AttributeError, CliParser.CmdTreeFreezeException):
+            pass # no cache, stale cache or handler moved
+
+        cp = CliParser()
+        build(cp)
+        try:
+            cache = {'digest': digest, 'tree': cp.freeze(inst)}
+            os.makedirs(cachedir, exist_ok=True)
+            tmpfile = '{}.{}.tmp'.format(cachefile, os.getpid())
+            with open(tmpfile, 'w') as f:
+                json.dump(cache, f, separators=(',', ':'))
+            os.replace(tmpfile, cachefile)
+        except (OSError, CliParser.CmdTreeFreezeException):
+            pass
+        return cp
+
     def invoke(self, tokens):
         """
         invoke command with user-input `tokens`
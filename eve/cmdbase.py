@@ -1,9 +1,7 @@
 #!/usr/bin/python
 # vim: set expandtab:
-import argparse
-import logging
 import os, sys
-import subprocess
+import time
 
 import eve.common
 from eve.database import EveDB
@@ -19,44 +17,137 @@ class CmdBase:
    _loggername = None
    _defaultlogfile = 'stderr'
 
-   _required = []
+   _required = None
 
    _dbconn = None
    _dbfile = None
 
+   # --profile-out FILE with this suffix writes sampled stacks instead of
+   # cProfile stats, --profile alone prints top functions
+   PROFILE_STACKS_SUFFIX = '.folded'
+   PROFILE_TOP = 25
+
+   class BatchLineException(Exception):
+      def __init__(self, code):
+         super().__init__('exit code {}'.format(code))
+         self.code = code
+
    def __init__(self, prog, version, desc = None, prefix = None, loggername = None):
       self._prefix = prefix
       self._prog = prog
       self._version = version
       self._desc = desc
       self._loggername = loggername
+      self.__cli_parsers = {}
+      self.__cli_bad = False
+      self.__parser = None
+      self.__common_parser = None
+      self._required = []
+      self.__required_paths = {}
       pass
 
    def run(self):
+      with eve.common.span('cmd', prog=self._prog):
+         return self.__run_phases()
+
+   def __run_phases(self):
+      t = start = time.perf_counter()
+      nphases = len(eve.common.phases())
+      timings = eve.common.timings()
       self.__parse()
+      t = eve.common.record_phase('cmd.parse', t)
       self.__init_logger()
+      t = eve.common.record_phase('cmd.logger', t)
       self.__debug()
+      t = eve.common.record_phase('cmd.debug', t)
       self.__check_required()
-      return self._run()
+      t = eve.common.record_phase('cmd.required', t)
+      if self._args.timings:
+         eve.common.track_subprocess()
+      try:
+         return self.__run_profiled()
+      finally:
+         eve.common.record_phase('cmd.run', t)
+         if self._args.timings:
+            self.__print_timings(start, eve.common.phases()[nphases:], timings)
+
+   def __run(self):
+      if self._args.batch is not None:
+         return self.__run_batch(self._args.batch)
+      with eve.common.span('cmd.run'):
+         return self._run()
 
    def __debug(self):
-      self.logdebug('prog: {}, version: {}'.format(self._prog, self._version))
-      self.logdebug('arg parsed: ' + str(self._args))
-
+      self.logdebug('prog: {}, version: {}', self._prog, self._version)
+      self.logdebug('arg parsed: {}', self._args)
+
+
+   ### start of profiling ###
+   def __run_profiled(self):
+      profile = self._args.profile_out
+      if profile is None and not self._args.profile:
+         return self.__run()
+      if profile is not None and profile.endswith(CmdBase.PROFILE_STACKS_SUFFIX):
+         from eve.stack_sampler import StackSampler
+         sampler = StackSampler()
+         sampler.start()
+         try:
+            return self.__run()
+         finally:
+            sampler.stop()
+            sampler.dump(profile)
+            self.loginfo('{} stack samples written to {}'.format(sampler.samples, profile))
+
+      import cProfile
+      profiler = cProfile.Profile()
+      try:
+         return profiler.runcall(self.__run)
+      finally:
+         if profile is None:
+            import pstats
+            stats = pstats.Stats(profiler, stream=sys.stderr)
+            stats.sort_stats('cumulative').print_stats(CmdBase.PROFILE_TOP)
+         else:
+            profiler.dump_stats(profile)
+            self.loginfo('profile written to {}'.format(profile))
+
+   def __print_timings(self, start, phases, before):
+      # phases of this run, and db/subprocess time spent since it started
+      total = time.perf_counter() - start
+      lines = [(name.split('.', 1)[-1], seconds, None) for name, seconds in phases]
+      for name, (calls, seconds) in sorted(eve.common.timings().items()):
+         calls0, seconds0 = before.get(name, (0, 0.0))
+         if calls != calls0:
+            lines.append((name, seconds - seconds0, calls - calls0))
+      lines.append(('total', total, None))
+      sys.stderr.write('timings of {}:\n'.format(self._prog))
+      for name, seconds, calls in lines:
+         sys.stderr.write('  {:<12} {:>9.2f} ms {:>5.1f}%{}\n'.format(name, seconds * 1000,
+            seconds * 100 / total if total > 0 else 0.0,
+            '' if calls is None else '  ({} calls)'.format(calls)))
+   ### end of profiling ###
 
    ### start of requirement check ###
    def _add_required(self, prog):
-      self.logdebug('add required program [{}]'.format(prog))
-      self._required.append(prog)
+      self.logdebug('add required program [{}]', prog)
+      if prog not in self._required:
+         self._required.append(prog)
+
+   def _required_path(self, prog):
+      """
+      absolute path of required program `prog` found by the requirement
+      check, so commands run it without another PATH lookup. `prog` itself
+      if it is not checked
+      """
+      return self.__required_paths.get(prog, prog)
 
    def __check_required(self):
       for p in self._required:
-         try:
-            cmd = ['which', p]
-            subprocess.check_output(cmd)
-         except subprocess.CalledProcessError:
-             self.logerror('Failed to find required program [{}], abort'.format(p))
-             sys.exit(1)
+         path = eve.common.which(p)
+         if path is None:
+            self.logerror('Failed to find required program [{}], abort'.format(p))
+            sys.exit(1)
+         self.__required_paths[p] = path
 
    ### end of requirement check ###
 
@@ -74,15 +165,72 @@ class CmdBase:
 
    ### end of db facilities ##
 
+   ### start of cli parser facilities ###
+   def _cli_builder(self):
+      """
+      `build(parser)` of the CliParser tree of the command, for eve system
+      scan to cache the tree before the command ever runs, None if the
+      command does not use CliParser
+      """
+      return None
+
+   def _cli_parser(self, build):
+      """
+      CliParser built by `build(parser)`, cached until source of the command
+      changes, and kept by the instance for later calls
+      """
+      key = getattr(build, '__func__', build)
+      if key in self.__cli_parsers:
+         return self.__cli_parsers[key]
+      from eve.cliparser import CliParser
+      cachedir = eve.common.cache_dirpath()
+      if cachedir is None:
+         cp = CliParser()
+         build(cp)
+      else:
+         source = sys.modules[type(self).__module__].__file__
+         cp = CliParser.cached(build, source, cachedir, inst=self, name=type(self).__name__)
+
+      bad_handler = cp.cmd_handler['bad']
+      def bad_cmd(parse_info):
+         self.__cli_bad = True
+         return bad_handler(parse_info)
+      cp.register_bad_command_handler(bad_cmd)
+      self.__cli_parsers[key] = cp
+      return cp
+
+   def _cli_invoke(self, build, tokens):
+      """
+      invoke `tokens` with parser of _cli_parser, return exit code: 1 for
+      bad/incomplete command, result of the handler if it is an int,
+      otherwise 0
+      """
+      cp = self._cli_parser(build)
+      self.__cli_bad = False
+      r = cp.invoke(tokens)
+      if self.__cli_bad:
+         return 1
+      if isinstance(r, int) and not isinstance(r, bool):
+         return r
+      return 0
+
+   ### end of cli parser facilities ###
+
    ### start of parser facilities ###
    @staticmethod
    def action_version(version):
+      import argparse
       class ActionVersion(argparse.Action):
          def __call__(self, parser, args, values, option_string=None):
             print(version)
             sys.exit(0)
       return ActionVersion
 
+   @staticmethod
+   def logrotate(spec):
+      # argument type of --logrotate, argparse names it in errors
+      return eve.common.parse_logrotate(spec)
+
    def _get_parser(self, **kwargs):
       if self._prog is not None:
          prog = self._prog
@@ -95,6 +243,7 @@ class CmdBase:
       if 'description' in kwargs and self._desc is not None:
          kwargs['description'] = self._desc
 
+      import argparse
       parser = argparse.ArgumentParser(**kwargs)
       group = parser.add_argument_group('misc options')
       group.add_argument('--version', action=self.action_version(self._version),
@@ -105,18 +254,104 @@ class CmdBase:
             help='debug mode. shortcut to enable debug, equal to --loglevel DEBUG')
       group.add_argument('--logfile', default=self._defaultlogfile,
             help='log file name for progress, special keyword: (stderr, stdout, none)')
-      group.add_argument('--loglevel', default=logging.INFO,
+      group.add_argument('--loglevel', default='INFO',
             help='set loglevel, default: INFO')
+      group.add_argument('--logjson', default=False, action='store_true',
+            help='write log records as json lines')
+      group.add_argument('--logrotate', metavar='SPEC', type=self.logrotate, default=None,
+            help='rotate log file at a size (e.g. 10M) or interval (S, M, H, D, midnight, W0-W6), '
+            'keep {} old files'.format(eve.common.LOG_BACKUPS))
+      group.add_argument('--batch', metavar='FILE', default=None,
+            help='run commands read from FILE (- for stdin) one per line, in this process')
+      group.add_argument('--profile', default=False, action='store_true',
+            help='profile the command with cProfile and print top functions to stderr')
+      group.add_argument('--profile-out', metavar='FILE', default=None,
+            help='profile the command and write cProfile stats to FILE (pstats format), '
+            'or sampled stacks for flame graphs if FILE ends with {}'.format(CmdBase.PROFILE_STACKS_SUFFIX))
+      group.add_argument('--timings', default=False, action='store_true',
+            help='print time of each phase, db calls and subprocesses to stderr at exit')
       return parser
 
    def __parse(self):
-      parser = self._get_parser()
-      self._prepare_parser(parser)
-      args = parser.parse_args()
+      # built once, eve shell runs the same instance many times
+      if self.__parser is None:
+         parser = self._get_parser()
+         self._prepare_parser(parser)
+         self.__parser = parser
+         self.__common_parser = self._get_parser(add_help=False)
+      # with --batch the lines carry the arguments of the command, only the
+      # common options are parsed from the command line
+      args, extra = self.__common_parser.parse_known_args()
+      if args.batch is None:
+         args = self.__parser.parse_args()
+      elif len(extra) != 0:
+         self.__parser.error('arguments not allowed with --batch: {}'.format(' '.join(extra)))
       self._args = args
       pass
    ### end of parser facilities ###
 
+   ### start of batch mode ###
+   def __run_batch_line(self, tokens):
+      try:
+         args = self.__parser.parse_args(tokens)
+      except SystemExit as e:
+         # argparse error, --help or --version
+         raise CmdBase.BatchLineException(e.code if isinstance(e.code, int) else 1)
+      if args.batch is not None:
+         raise CmdBase.BatchLineException(2)
+      self._args = args
+      try:
+         with eve.common.span('cmd.run'):
+            r = self._run()
+      except SystemExit as e:
+         # commands may sys.exit(), which must not end the batch
+         r = e.code if isinstance(e.code, int) or e.code is None else 1
+      if isinstance(r, int) and not isinstance(r, bool) and r != 0:
+         raise CmdBase.BatchLineException(r)
+
+   def __run_batch(self, batchfile):
+      """
+      run each line of `batchfile` as arguments of this command, sharing the
+      process, parsers and db connection. each line runs in a deferred
+      transaction, so a failed line leaves no changes and the write lock is
+      held only from the first write of a line to its end. empty lines and
+      lines start with # are skipped
+      """
+      if batchfile == '-':
+         lines = sys.stdin.readlines()
+      else:
+         with open(batchfile, 'r') as f:
+            lines = f.readlines()
+
+      import shlex
+      db = self._db()
+      failed = []
+      total = 0
+      for lineno, line in enumerate(lines, 1):
+         line = line.strip()
+         if len(line) == 0 or line.startswith('#'):
+            continue
+         total += 1
+         try:
+            tokens = shlex.split(line)
+            with db.transaction(deferred=True):
+               self.__run_batch_line(tokens)
+         except CmdBase.BatchLineException as e:
+            failed.append(lineno)
+            self.logerror('line {}: [{}] failed, {}'.format(lineno, line, e))
+         except KeyboardInterrupt:
+            failed.append(lineno)
+            self.logerror('line {}: [{}] interrupted, stop'.format(lineno, line))
+            break
+         except Exception as e:
+            failed.append(lineno)
+            self.logerror('line {}: [{}] failed, {}: {}'.format(lineno, line, type(e).__name__, e))
+
+      self.loginfo('batch done, {} of {} commands failed{}'.format(len(failed), total,
+         ', lines: ' + ' '.join(str(l) for l in failed) if len(failed) != 0 else ''))
+      return 0 if len(failed) == 0 else 1
+   ### end of batch mode ###
+
    ### start of logger facilities ###
    def _set_log_format(self, logformat):
       self._logformat = logformat
@@ -130,14 +365,16 @@ class CmdBase:
    def _logger(self):
       return eve.common.logger()
 
+   # msg is formatted by msg.format(*args) only if the level is enabled:
+   # self.logdebug('job[{}]', name)
    def logerror(self, msg, *args, **kwargs):
-      eve.common.logger().error(msg, *args, **kwargs)
+      eve.common.log(eve.common.ERROR, msg, *args, **kwargs)
 
    def loginfo(self, msg, *args, **kwargs):
-      eve.common.logger().info(msg, *args, **kwargs)
+      eve.common.log(eve.common.INFO, msg, *args, **kwargs)
 
    def logdebug(self, msg, *args, **kwargs):
-      eve.common.logger().debug(msg, *args, **kwargs)
+      eve.common.log(eve.common.DEBUG, msg, *args, **kwargs)
 
    def logEnableFor(self, lv):
       return eve.common.logger().isEnabledFor(lv)
@@ -157,7 +394,9 @@ class CmdBase:
          loglevel=loglevel,
          loggername=self._loggername,
          logfile=logfile,
-         logformat=self._logformat
+         logformat=self._logformat,
+         logjson=args.logjson,
+         logrotate=args.logrotate
       )
    ### end of logger facilities ###
 
@@ -1,21 +1,80 @@
 #!/usr/bin/python
 # vim: set expandtab:
-import unicodedata
-import logging
+import os
 import sys
+import stat
+import time
+
+# width of each non-ascii char seen, 2 for east asian full/wide ones
+__EVE_CHAR_WIDTH = {}
+
+def __char_width(c):
+    import unicodedata
+    w = 2 if unicodedata.east_asian_width(c) in ('F', 'W') else 1
+    __EVE_CHAR_WIDTH[c] = w
+    return w
 
 def cht_len(msg):
     if not isinstance(msg, str):
         return 0
-    return sum(unicodedata.east_asian_width(x) in ('F', 'W') for x in msg)
+    return cht_width(msg) - len(msg)
 
 def cht_width(msg):
+    """
+    cells taken by `msg` in a terminal, wide east asian chars take two
+    """
+    if not isinstance(msg, str):
+        msg = '{}'.format(msg)
+    if msg.isascii():
+        return len(msg)
+    widths = __EVE_CHAR_WIDTH
+    n = 0
+    for c in msg:
+        if c < '\x80':
+            n += 1
+        else:
+            n += widths.get(c) or __char_width(c)
+    return n
+
+def cut_width(msg, width, ellipsis = ' ...'):
+    """
+    `msg` cut to at most `width` cells, ending with `ellipsis` if it is cut
+    and the ellipsis fits in `width`
+    """
+    if not isinstance(msg, str):
+        msg = '{}'.format(msg)
+    if len(msg) <= width and msg.isascii() or cht_width(msg) <= width:
+        return msg
+    if cht_width(ellipsis) > width:
+        ellipsis = ''
+    limit = width - cht_width(ellipsis)
+    widths = __EVE_CHAR_WIDTH
+    n = 0
+    for i, c in enumerate(msg):
+        n += 1 if c < '\x80' else widths.get(c) or __char_width(c)
+        if n > limit:
+            return msg[:i] + ellipsis
+    return msg + ellipsis
+
+def pad_width(msg, width, align = '<'):
+    """
+    `msg` padded with spaces to `width` cells, align is < or >
+    """
     if not isinstance(msg, str):
         msg = '{}'.format(msg)
-    return len(msg) + cht_len(msg)
+    fill = ' ' * (width - cht_width(msg))
+    return msg + fill if align == '<' else fill + msg
 
 __EVE_DB_FILEPATH = ''
+__EVE_PHASES = []
+__EVE_TIMINGS = {}
 __EVE_LOGGER_NAME = '__main__'
+__EVE_LOGGER_HANDLERS = {}
+__EVE_LOGGER = None
+__EVE_LOG_LISTENERS = {}
+__EVE_LOG_HOOKED = False
+__EVE_TRACE = None
+__EVE_PROGRAMS = {}
 
 def db_filepath():
     global __EVE_DB_FILEPATH
@@ -25,29 +84,632 @@ def set_dbfilepath(filepath):
     global __EVE_DB_FILEPATH
     __EVE_DB_FILEPATH = filepath
 
-def enable_logger(loglevel = logging.DEBUG, loggername = '', logfile = 'none', logformat = None):
-    global __EVE_LOGGER_NAME
+def cache_dirpath():
+    global __EVE_DB_FILEPATH
+    if not __EVE_DB_FILEPATH:
+        return None
+    return os.path.join(os.path.dirname(__EVE_DB_FILEPATH), 'cache')
+
+# logging is imported on use, commands like `eve system complete` never log.
+# values of logging levels, to check them without importing logging
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+# rotated log files kept, see parse_logrotate
+LOG_BACKUPS = 5
+LOG_ROTATE_WHEN = ['S', 'M', 'H', 'D', 'midnight'] + ['W{}'.format(d) for d in range(7)]
+LOG_ROTATE_UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+class LazyFormat:
+    """
+    log message `fmt.format(*args)`, formatted only when a record is emitted
+    """
+    __slots__ = ('fmt', 'args')
+
+    def __init__(self, fmt, args):
+        self.fmt = fmt
+        self.args = args
+
+    def __str__(self):
+        return self.fmt.format(*self.args)
+
+class JsonFormatter:
+    """
+    one json object per record, for log files read by programs
+    """
+    def format(self, record):
+        import json
+        data = {
+            'ts': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'pid': record.process,
+            'thread': record.threadName,
+            'msg': record.getMessage(),
+        }
+        if record.exc_info:
+            import traceback
+            data['exc'] = ''.join(traceback.format_exception(*record.exc_info))
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+def parse_logrotate(spec):
+    """
+    rotation of a log file: ('size', bytes) for a size like 10M (K, M, G or
+    plain bytes), ('time', when) for an interval of TimedRotatingFileHandler
+    (S, M, H, D, midnight, W0-W6), ('watch', None) for `watch`, reopening a
+    file rotated by another process. raise ValueError for others
+    """
+    if spec in LOG_ROTATE_WHEN:
+        return ('time', spec)
+    if spec == 'watch':
+        return ('watch', None)
+    unit = LOG_ROTATE_UNITS.get(spec[-1:].upper(), 1)
+    digits = spec[:-1] if unit != 1 else spec
+    if not digits.isdigit() or int(digits) == 0:
+        raise ValueError('bad log rotation [{}]'.format(spec))
+    return ('size', int(digits) * unit)
+
+def __log_sink(logfile, logrotate):
+    import logging
+    if logfile == 'none':
+        return logging.NullHandler()
+    elif logfile == 'stderr':
+        return logging.StreamHandler(sys.stderr)
+    elif logfile == 'stdout':
+        return logging.StreamHandler(sys.stdout)
+    elif not isinstance(logfile, str):
+        return __log_socket(logfile)
+    elif logrotate is None:
+        return logging.FileHandler(logfile)
+    import logging.handlers
+    kind, value = logrotate
+    if kind == 'size':
+        return logging.handlers.RotatingFileHandler(logfile, maxBytes=value, backupCount=LOG_BACKUPS)
+    elif kind == 'time':
+        return logging.handlers.TimedRotatingFileHandler(logfile, when=value, backupCount=LOG_BACKUPS)
+    return logging.handlers.WatchedFileHandler(logfile)
+
+def __log_socket(sock):
+    # records are pickled to `sock`, the process at the other end writes
+    # them by receive_logs
+    import logging.handlers
+    class SocketHandler(logging.handlers.SocketHandler):
+        def createSocket(self):
+            # the socket is given, records are dropped once it is closed
+            pass
+    handler = SocketHandler(None, None)
+    handler.sock = sock
+    return handler
+
+def receive_logs(sock):
+    """
+    write records sent to `sock` by the logger of another process (see
+    enable_logger) by the handlers of this process, until it is closed
+    """
+    import pickle
+    import struct
+    import logging
+    f = sock.makefile('rb')
+    try:
+        while True:
+            head = f.read(4)
+            if len(head) < 4:
+                break
+            data = f.read(struct.unpack('>L', head)[0])
+            logger().handle(logging.makeLogRecord(pickle.loads(data)))
+    finally:
+        f.close()
+        sock.close()
+
+def __log_queue(handler):
+    # records are put to a queue by the logging thread, and formatted and
+    # written by a listener thread
+    import queue
+    import atexit
+    import logging.handlers
+    global __EVE_LOG_HOOKED
+    class QueueHandler(logging.handlers.QueueHandler):
+        def prepare(self, record):
+            # only merge the message, formatting is left to the listener
+            record.msg = record.getMessage()
+            record.args = None
+            return record
+    if not __EVE_LOG_HOOKED:
+        __EVE_LOG_HOOKED = True
+        atexit.register(shutdown_logger)
+        os.register_at_fork(after_in_child=__log_after_fork)
+    q = queue.SimpleQueue()
+    qhandler = QueueHandler(q)
+    qhandler.setLevel(handler.level)
+    listener = logging.handlers.QueueListener(q, handler, respect_handler_level=True)
+    listener.start()
+    __EVE_LOG_LISTENERS[qhandler] = listener
+    return qhandler
+
+def __log_after_fork():
+    # listener threads are not copied to a forked child, start new ones. a
+    # record queued before fork is written by the parent
+    import queue
+    import logging.handlers
+    for qhandler, listener in list(__EVE_LOG_LISTENERS.items()):
+        qhandler.queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(qhandler.queue, *listener.handlers, respect_handler_level=True)
+        listener.start()
+        __EVE_LOG_LISTENERS[qhandler] = listener
+
+def shutdown_logger():
+    """
+    write records left in queues of queued loggers and stop their listener
+    threads, called at exit. call it before os._exit
+    """
+    # popped one by one, threads exiting at the same time stop each
+    # listener once
+    while len(__EVE_LOG_LISTENERS) != 0:
+        try:
+            qhandler, listener = __EVE_LOG_LISTENERS.popitem()
+        except KeyError:
+            break
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+def enable_logger(loglevel = None, loggername = '', logfile = 'none', logformat = None,
+        queued = False, logjson = False, logrotate = None):
+    """
+    log to `logfile` (a file name, stderr, stdout, none, or a socket read by
+    receive_logs in another process). `queued`: write records in a listener
+    thread, so logging never waits for the disk. `logjson`: write records
+    as json lines. `logrotate`: rotation of the log file, see
+    parse_logrotate
+    """
+    import logging
+    global __EVE_LOGGER_NAME, __EVE_LOGGER
     __EVE_LOGGER_NAME = loggername
+    if loglevel is None:
+        loglevel = logging.DEBUG
+    if isinstance(logrotate, str):
+        logrotate = parse_logrotate(logrotate)
 
     logger = logging.getLogger(__EVE_LOGGER_NAME)
-    if logger.getEffectiveLevel() != loglevel:
-        if logfile == 'none':
-            handler = logging.NullHandler()
-        elif logfile == 'stderr':
-            handler = logging.StreamHandler(sys.stderr)
-        elif logfile == 'stdout':
-            handler = logging.StreamHandler(sys.stdout)
-        else:
-            handler = logging.FileHandler(logfile)
+    __EVE_LOGGER = logger
+    # called again by commands run many times in one process (eve shell),
+    # replace the handler added before instead of adding one more
+    if loggername in __EVE_LOGGER_HANDLERS:
+        handler = __EVE_LOGGER_HANDLERS.pop(loggername)
+        logger.removeHandler(handler)
+        listener = __EVE_LOG_LISTENERS.pop(handler, None)
+        if listener is not None:
+            listener.stop()
+            for h in listener.handlers:
+                h.close()
+        handler.close()
+    if logger.getEffectiveLevel() != loglevel or not logger.handlers:
+        handler = __log_sink(logfile, logrotate)
 
-        if logformat is None:
-            logformat = '[%(name)s][%(asctime)s][%(levelname)s] %(message)s'
-
-        formatter = logging.Formatter(logformat)
+        if logjson:
+            formatter = JsonFormatter()
+        else:
+            if logformat is None:
+                logformat = '[%(name)s][%(asctime)s][%(levelname)s] %(message)s'
+            formatter = logging.Formatter(logformat)
         handler.setFormatter(formatter)
         handler.setLevel(loglevel)
+        if queued:
+            handler = __log_queue(handler)
         logger.setLevel(loglevel)
         logger.addHandler(handler)
+        __EVE_LOGGER_HANDLERS[loggername] = handler
 
 def logger():
-    return logging.getLogger(__EVE_LOGGER_NAME)
+    global __EVE_LOGGER
+    if __EVE_LOGGER is None:
+        import logging
+        __EVE_LOGGER = logging.getLogger(__EVE_LOGGER_NAME)
+    return __EVE_LOGGER
+
+def log(level, msg, *args, **kwargs):
+    """
+    log `msg` at `level` (DEBUG, INFO, WARNING, ERROR), with `args` it is
+    formatted by msg.format(*args) only when the record is emitted. nothing
+    is done if the level is disabled
+    """
+    l = logger()
+    if l.isEnabledFor(level):
+        l.log(level, LazyFormat(msg, args) if len(args) != 0 else msg, **kwargs)
+
+### start of program lookup ###
+def which(prog):
+    """
+    absolute path of executable `prog` searched in PATH like which(1), or
+    None. results are kept per PATH and checked again by one stat of the
+    program, commands run many times in one process do not search again
+    """
+    path = os.environ.get('PATH', os.defpath)
+    key = (path, prog)
+    if key in __EVE_PROGRAMS:
+        found, mtime = __EVE_PROGRAMS[key]
+        try:
+            if os.stat(found).st_mtime_ns == mtime and os.access(found, os.X_OK):
+                return found
+        except OSError:
+            pass
+        del __EVE_PROGRAMS[key]
+    if os.sep in prog:
+        candidates = [prog]
+    else:
+        candidates = [os.path.join(d or os.curdir, prog) for d in path.split(os.pathsep)]
+    for f in candidates:
+        try:
+            st = os.stat(f)
+        except OSError:
+            continue
+        if stat.S_ISREG(st.st_mode) and os.access(f, os.X_OK):
+            found = os.path.abspath(f)
+            __EVE_PROGRAMS[key] = (found, st.st_mtime_ns)
+            return found
+    return None
+### end of program lookup ###
+
+### start of tracing ###
+# spans are written to file $EVE_TRACE as json lines, traces are sampled
+# at rate $EVE_TRACE_SAMPLE (0 to 1, default 1)
+TRACE_KEY = 'EVE_TRACE'
+TRACE_SAMPLE_KEY = 'EVE_TRACE_SAMPLE'
+
+class Span:
+    """
+    a timed operation, child of the span open in the same thread when it
+    starts. created by span()
+    """
+    __slots__ = ('trace', 'id', 'parent', 'name', 'attrs', 'sampled', 'ts', 'start')
+
+    def __init__(self, trace, parent, name, attrs, sampled):
+        self.trace = trace
+        self.id = _trace_id()
+        self.parent = parent
+        self.name = name
+        self.attrs = attrs
+        self.sampled = sampled
+        self.ts = None
+        self.start = None
+
+    def set(self, key, value):
+        self.attrs[key] = value
+
+    def __enter__(self):
+        _trace_stack().append(self)
+        self.ts = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        dur = time.perf_counter() - self.start
+        stack = _trace_stack()
+        if len(stack) != 0 and stack[-1] is self:
+            stack.pop()
+        if not self.sampled:
+            return False
+        if exc_type is not None:
+            self.attrs['error'] = '{}: {}'.format(exc_type.__name__, exc)
+        import threading
+        _trace_write({
+            'trace': self.trace,
+            'span': self.id,
+            'parent': self.parent,
+            'name': self.name,
+            'ts': self.ts,
+            'dur': dur,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'thread': threading.current_thread().name,
+            'attrs': self.attrs,
+        })
+        return False
+
+class NoSpan:
+    """
+    span of disabled or unsampled tracing, does nothing
+    """
+    __slots__ = ()
+
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+__EVE_NOSPAN = NoSpan()
+
+# helpers of Span, names with __ would be mangled in the class
+def _trace_id():
+    return '{:016x}'.format(__EVE_TRACE['random'].getrandbits(64))
+
+def _trace_stack():
+    local = __EVE_TRACE['local']
+    if not hasattr(local, 'stack'):
+        local.stack = []
+    return local.stack
+
+def _trace_write(record):
+    import json
+    # one append per span, lines of processes and threads never mix
+    os.write(__EVE_TRACE['fd'], (json.dumps(record, ensure_ascii=False, default=str) + '\n').encode())
+
+def enable_trace(filename, sample = 1.0):
+    """
+    write spans to `filename`, keep `sample` (0 to 1) of traces. tracing is
+    enabled by $EVE_TRACE on the first span otherwise
+    """
+    global __EVE_TRACE
+    import random
+    import threading
+    __EVE_TRACE = {
+        'fd': os.open(filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644),
+        'sample': sample,
+        # module functions, which are reseeded in a forked child
+        'random': random,
+        'local': threading.local(),
+    }
+
+def _trace_enabled():
+    # $EVE_TRACE is read on first use, a bad file or sample rate disables
+    # tracing instead of failing the command
+    global __EVE_TRACE
+    if __EVE_TRACE is None:
+        __EVE_TRACE = False
+        if os.environ.get(TRACE_KEY):
+            try:
+                enable_trace(os.environ[TRACE_KEY], float(os.environ.get(TRACE_SAMPLE_KEY, '1')))
+            except (ValueError, OSError) as e:
+                log(WARNING, 'tracing disabled, {}: {}', type(e).__name__, e)
+    return __EVE_TRACE is not False
+
+def current_span():
+    """
+    innermost span open in this thread, None without one. pass it as parent
+    of span() in other threads, e.g. of a thread pool
+    """
+    if not _trace_enabled():
+        return None
+    stack = _trace_stack()
+    return stack[-1] if len(stack) != 0 else None
+
+def span(name, parent = None, **attrs):
+    """
+    with eve.common.span('name', key=value, ...) as s: ..., s.set(key, value)
+    times the with-block as a child of `parent`, or of the current span of
+    the thread. a span without parent starts a trace, which is sampled or
+    not as a whole
+    """
+    if not _trace_enabled():
+        return __EVE_NOSPAN
+    if parent is None:
+        stack = _trace_stack()
+        if len(stack) == 0:
+            sampled = __EVE_TRACE['random'].random() < __EVE_TRACE['sample']
+            return Span(_trace_id(), None, name, attrs, sampled)
+        parent = stack[-1]
+    if not isinstance(parent, Span) or not parent.sampled:
+        return __EVE_NOSPAN
+    return Span(parent.trace, parent.id, name, attrs, True)
+
+def trace_to_chrome(infile, outfile):
+    """
+    convert spans of file `infile` to `outfile` in the trace event format
+    of chrome://tracing and perfetto, return number of spans
+    """
+    import json
+    cnt = 0
+    with open(infile, 'r') as fin, open(outfile, 'w') as fout:
+        fout.write('{"displayTimeUnit": "ms", "traceEvents": [\n')
+        for line in fin:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue # partly written by a killed process
+            args = dict(record['attrs'])
+            args.update({'trace': record['trace'], 'span': record['span'], 'parent': record['parent']})
+            event = {
+                'name': record['name'],
+                'cat': record['name'].split('.', 1)[0],
+                'ph': 'X',
+                'ts': record['ts'] * 1e6,
+                'dur': record['dur'] * 1e6,
+                'pid': record['pid'],
+                'tid': record['tid'],
+                'args': args,
+            }
+            fout.write('{}{}'.format(',\n' if cnt != 0 else '', json.dumps(event, ensure_ascii=False)))
+            cnt += 1
+        fout.write('\n]}\n')
+    return cnt
+### end of tracing ###
+
+### start of phase timing ###
+def record_phase(name, start):
+    """
+    record phase `name` started at `start` (time.perf_counter) and ending
+    now, return now to start the next phase
+    """
+    now = time.perf_counter()
+    __EVE_PHASES.append((name, now - start))
+    return now
+
+def phases():
+    """
+    [(name, seconds), ...] recorded by record_phase, see eve system profile-startup
+    """
+    return list(__EVE_PHASES)
+
+def add_timing(name, seconds):
+    """
+    add a call of `seconds` to total time of `name`, e.g. db, subprocess
+    """
+    timing = __EVE_TIMINGS.get(name)
+    if timing is None:
+        __EVE_TIMINGS[name] = [1, seconds]
+    else:
+        timing[0] += 1
+        timing[1] += seconds
+
+def timings():
+    """
+    { name: (calls, seconds), ... } added by add_timing
+    """
+    return {name: tuple(t) for name, t in __EVE_TIMINGS.items()}
+
+def track_subprocess():
+    """
+    add time from start to exit of subprocesses started from now on by
+    subprocess.Popen (and run, call, check_output, ...) to timing subprocess
+    """
+    import subprocess
+    if getattr(subprocess.Popen, '_eve_tracked', False):
+        return
+    class Popen(subprocess.Popen):
+        _eve_tracked = True
+
+        def __init__(self, *args, **kwargs):
+            self._eve_start = time.perf_counter()
+            self._eve_done = False
+            super().__init__(*args, **kwargs)
+
+        def __done(self):
+            if self.returncode is not None and not self._eve_done:
+                self._eve_done = True
+                add_timing('subprocess', time.perf_counter() - self._eve_start)
+
+        def wait(self, timeout = None):
+            try:
+                return super().wait(timeout)
+            finally:
+                self.__done()
+
+        def poll(self):
+            r = super().poll()
+            self.__done()
+            return r
+    subprocess.Popen = Popen
+### end of phase timing ###
+
+### start of table ###
+class Table:
+    """
+    print rows as aligned columns, widths counted in terminal cells. columns:
+    [{
+      'name': key of the value in a row (dict key or list index), #required
+      'title': header, default: name
+      'width': cells of the column, longer values overflow, or are cut
+               with ' ...' if 'cut' is true
+      'cut': true/false, false if not present
+      'max': upper bound of width of a column without width
+      'align': '<' or '>', '<' if not present
+    }, ...]
+    columns without width get the width of their longest value, then rows
+    are kept until close(). otherwise each row is printed when added. the
+    last column needs no width, it is not padded
+    """
+    def __init__(self, columns, sep = ' ', header = True, rule = '-', out = None):
+        self.columns = []
+        for c in columns:
+            c = dict(c)
+            c.setdefault('title', str(c['name']))
+            c.setdefault('width', None)
+            c.setdefault('cut', False)
+            c.setdefault('max', None)
+            c.setdefault('align', '<')
+            self.columns.append(c)
+        self.sep = sep
+        self.header = header
+        self.rule = rule
+        self.out = out if out is not None else sys.stdout
+        self.rows = 0
+        self.pending = None
+        if any(c['width'] is None for c in self.columns[:-1]):
+            self.pending = []
+        else:
+            self.__write_header()
+
+    def __cell(self, column, value):
+        text = value if isinstance(value, str) else '{}'.format(value)
+        width = column['width'] or column['max']
+        if width is not None and column['cut']:
+            text = cut_width(text, width)
+        return (text, cht_width(text))
+
+    def __line(self, cells):
+        last = len(cells) - 1
+        parts = []
+        for i, (text, w) in enumerate(cells):
+            column = self.columns[i]
+            fill = column['width'] - w if column['width'] is not None else 0
+            if fill <= 0 or (i == last and column['align'] == '<'):
+                parts.append(text)
+            elif column['align'] == '<':
+                parts.append(text + ' ' * fill)
+            else:
+                parts.append(' ' * fill + text)
+        return self.sep.join(parts) + '\n'
+
+    def __write_header(self):
+        if not self.header:
+            return
+        titles = [(c['title'], cht_width(c['title'])) for c in self.columns]
+        self.out.write(self.__line(titles))
+        if self.rule:
+            rules = []
+            for c, (title, w) in zip(self.columns, titles):
+                w = max(w, c['width'] or 0)
+                rules.append((self.rule * w, w))
+            self.out.write(self.__line(rules))
+
+    def add(self, row):
+        """
+        add a row, dict or list of values of columns
+        """
+        cells = [self.__cell(c, row[c['name']]) for c in self.columns]
+        self.rows += 1
+        if self.pending is None:
+            self.out.write(self.__line(cells))
+        else:
+            self.pending.append(cells)
+
+    def text(self, line):
+        """
+        add a line of free text after the last row
+        """
+        if self.pending is None:
+            self.out.write(line + '\n')
+        else:
+            self.pending.append(line)
+
+    def close(self):
+        """
+        print rows kept for widths of columns
+        """
+        if self.pending is None:
+            return
+        pending = self.pending
+        self.pending = None
+        for i, c in enumerate(self.columns):
+            if c['width'] is not None:
+                continue
+            width = max([cht_width(c['title']) if self.header else 0] +
+                    [cells[i][1] for cells in pending if not isinstance(cells, str)])
+            c['width'] = min(width, c['max']) if c['max'] is not None else width
+        self.__write_header()
+        for cells in pending:
+            self.out.write(cells + '\n' if isinstance(cells, str) else self.__line(cells))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+### end of table ###
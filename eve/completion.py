@@ -0,0 +1,292 @@
+#!/usr/bin/python
+# vim: set expandtab:
+
+import os
+import marshal
+
+import eve.common
+
+class Completer:
+    """
+    complete eve command lines without importing command modules. answers
+    come from an index of the config, completion hints of modules and the
+    CliParser trees cached by CmdBase._cli_parser, stored with marshal and
+    rebuilt only when the config, a module or command source or the tree
+    cache changes. trees missing or older than their source are built by
+    eve.scanner when the index is rebuilt. hints map a variable (`@id`) or
+    positional argument of a class to `table.column` of the class's db
+    namespace
+    """
+    INDEX_VERSION = 2
+    MAX_VALUES = 100
+    # int columns are matched by ranges of values sharing the typed prefix
+    MAX_INT_DIGITS = 12
+    # building missing trees imports command modules, give up after this
+    BUILD_TIMEOUT = 30
+
+    def __init__(self, load_config, cfgfile, script_dir, keywords, system_features):
+        """
+        `load_config`: function returning (modules, classes) as loaded by Eve,
+                       classes may have
+                       `complete`: { 'var': 'table.column', ... }
+        `cfgfile`: the eve config
+        `keywords`: words of eve itself, the first one is `system`
+        """
+        self.load_config = load_config
+        self.cfgfile = cfgfile
+        self.script_dir = script_dir
+        self.keywords = keywords
+        self.system_features = system_features
+        self.cachedir = eve.common.cache_dirpath()
+        self.index = None
+
+    ### start of index ###
+    def __index_file(self):
+        return os.path.join(self.cachedir, 'complete.idx')
+
+    def __load_index(self):
+        if self.cachedir is None:
+            return None
+        try:
+            mtime = os.stat(self.__index_file()).st_mtime
+            # trees are replaced by rename, which touches the cache dir
+            if os.stat(self.cachedir).st_mtime > mtime:
+                return None
+            with open(self.__index_file(), 'rb') as f:
+                index = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if not isinstance(index, dict) or index.get('version') != __class__.INDEX_VERSION:
+            return None
+        # modules and commands edited since, their classes or trees changed
+        for source, stamp in index['stamps'].items():
+            if __class__.__stamp(source) != stamp:
+                return None
+        return index
+
+    @staticmethod
+    def __stamp(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    @staticmethod
+    def __compact_tree(node):
+        # keep only what completion needs from a frozen CliParser node
+        from eve.cliparser import TOKEN_TYPE_VAR, KEY_TARGET, KEY_LIST
+        compact = {'x': node['x'], 'var': None, 'list': False, 'v': None}
+        if node['y'] == TOKEN_TYPE_VAR:
+            compact['var'] = node['p'][KEY_TARGET]
+            compact['list'] = node['p'][KEY_LIST]
+        compact['c'] = {k: __class__.__compact_tree(c) for k, c in node.get('c', {}).items()}
+        if 'v' in node:
+            compact['v'] = __class__.__compact_tree(node['v'])
+        return compact
+
+    def __source(self, module, cls):
+        return os.path.join(self.script_dir, module, cls['name'] + '.py')
+
+    def __load_tree(self, module, cls):
+        import json
+        import hashlib
+        from eve.cliparser import CliParser
+        source = self.__source(module, cls)
+        try:
+            with open(CliParser.cache_file(source, self.cachedir, cls['classname']), 'r') as f:
+                cache = json.load(f)
+            with open(source, 'rb') as f:
+                if cache['digest'] != hashlib.sha1(f.read()).hexdigest():
+                    return None
+            return __class__.__compact_tree(cache['tree']['root'])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def __build_trees(self, classes):
+        """
+        cache trees of `classes` [(module, cls), ...] with eve.scanner, in a
+        subprocess as it imports the command modules
+        """
+        import sys
+        import subprocess
+        args = ['{}:{}:{}'.format(module, cls['name'], cls['classname']) for module, cls in classes]
+        try:
+            subprocess.run([sys.executable, '-m', 'eve.scanner', '--trees', eve.common.db_filepath()] + args,
+                    cwd=self.script_dir, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL, timeout=__class__.BUILD_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+
+    def __build_index(self):
+        modules, classes = self.load_config()
+        # stamped before the trees are loaded, a source saved meanwhile is
+        # seen by the next completion
+        sources = [self.cfgfile] + [os.path.join(self.script_dir, name, '__init__.py') for name in modules]
+        sources += [self.__source(cls['modules'][0], cls) for cls in classes.values()]
+        index = {
+            'version': __class__.INDEX_VERSION,
+            'modules': {name: list(mod['classes']) for name, mod in modules.items()},
+            'classes': {},
+            'stamps': {source: __class__.__stamp(source) for source in sources},
+        }
+        trees = {}
+        if self.cachedir is not None:
+            owners = {(cls['modules'][0], cls['name']): cls for cls in classes.values()}
+            trees = {key: self.__load_tree(key[0], cls) for key, cls in owners.items()}
+            missing = [(key[0], owners[key]) for key, tree in trees.items() if tree is None]
+            if len(missing) != 0:
+                self.__build_trees(missing)
+                for module, cls in missing:
+                    trees[(module, cls['name'])] = self.__load_tree(module, cls)
+        for name, cls in classes.items():
+            module = cls['modules'][0]
+            index['classes'][name] = {
+                'name': cls['name'],
+                'complete': dict(cls.get('complete', {})),
+                'tree': trees.get((module, cls['name'])),
+            }
+        if self.cachedir is None:
+            return index
+        try:
+            os.makedirs(self.cachedir, exist_ok=True)
+            tmpfile = '{}.{}.tmp'.format(self.__index_file(), os.getpid())
+            with open(tmpfile, 'wb') as f:
+                marshal.dump(index, f)
+            os.replace(tmpfile, self.__index_file())
+            # the rename touched the cache dir, keep the index newer than it
+            os.utime(self.__index_file())
+        except OSError:
+            pass
+        return index
+    ### end of index ###
+
+    @staticmethod
+    def __filter(candidates, prefix):
+        return [c for c in candidates if c.startswith(prefix)]
+
+    def complete(self, words):
+        """
+        candidates for the last of `words` (words after `eve`, the last one
+        may be empty)
+        """
+        if self.index is None:
+            self.index = self.__load_index() or self.__build_index()
+        modules = self.index['modules']
+        classes = self.index['classes']
+        if len(words) == 0:
+            words = ['']
+        done, cur = words[:-1], words[-1]
+        if len(done) == 0:
+            return self.__filter(self.keywords + list(modules.keys()) + list(classes.keys()), cur)
+
+        first = done[0]
+        if first == self.keywords[0]:
+            return self.__filter(self.system_features, cur) if len(done) == 1 else []
+        if first in modules:
+            if len(done) == 1:
+                return self.__filter(modules[first], cur)
+            if done[1] not in modules[first]:
+                return []
+            return self.__complete_class(classes[done[1]], done[2:], cur)
+        if first in classes:
+            return self.__complete_class(classes[first], done[1:], cur)
+        return []
+
+    @staticmethod
+    def __walk(node, word):
+        children = node['c']
+        if word in children:
+            return children[word]
+        matched = [c for k, c in children.items() if k.startswith(word)]
+        if len(matched) == 1:
+            return matched[0]
+        if node['list']:
+            return node
+        return node['v']
+
+    def __complete_class(self, cls, words, cur):
+        hints = cls['complete']
+        node = cls['tree']
+        if node is None:
+            # argparse based command, or never run yet: offer hinted values
+            # at every positional argument
+            if cur.startswith('-'):
+                return []
+            values = []
+            for hint in sorted(set(hints.values())):
+                values += self.__values(cls['name'], hint, cur)
+            return values
+
+        for word in words:
+            if word.startswith('-'):
+                continue
+            node = self.__walk(node, word)
+            if node is None:
+                return []
+
+        candidates = [k for k, c in node['c'].items() if not c['x'] and k.startswith(cur)]
+        var = node if node['list'] else node['v']
+        if var is not None and var['var'] in hints:
+            candidates += self.__values(cls['name'], hints[var['var']], cur)
+        return candidates
+
+    ### start of values ###
+    def __values(self, namespace, hint, prefix):
+        # only dynamic values need the db, open it read-only
+        import sqlite3
+        dbfile = eve.common.db_filepath()
+        if not os.path.isfile(dbfile):
+            return []
+        table, column = hint.split('.', 1)
+        table = '{}_{}'.format(namespace, table)
+        # characters special in sqlite uri
+        for c in '%?#':
+            dbfile = dbfile.replace(c, '%{:02x}'.format(ord(c)))
+        try:
+            conn = sqlite3.connect('file:{}?mode=ro'.format(dbfile), uri=True)
+        except sqlite3.Error:
+            return []
+        try:
+            coltype = None
+            for row in conn.execute('PRAGMA table_info(`{}`)'.format(table)):
+                if row[1] == column:
+                    coltype = row[2].lower()
+            if coltype is None:
+                return []
+            if coltype == 'integer':
+                return self.__int_values(conn, table, column, prefix)
+            # range on the column instead of LIKE, so its index is used
+            sql = 'SELECT DISTINCT `{0}` FROM `{1}` WHERE `{0}` >= ? AND `{0}` < ? ORDER BY `{0}` LIMIT ?'.format(column, table)
+            rows = conn.execute(sql, (prefix, prefix + '\U0010ffff', __class__.MAX_VALUES))
+            return [str(r[0]) for r in rows]
+        except sqlite3.Error:
+            return []
+        finally:
+            conn.close()
+
+    def __int_values(self, conn, table, column, prefix):
+        if prefix == '':
+            ranges = [(None, None)]
+        elif not prefix.isdigit() or (prefix.startswith('0') and prefix != '0'):
+            return []
+        elif prefix == '0':
+            ranges = [(0, 0)]
+        else:
+            # values starting with "12": 12, 120-129, 1200-1299, ...
+            base = int(prefix)
+            ranges = [(base * 10 ** k, (base + 1) * 10 ** k - 1)
+                    for k in range(0, __class__.MAX_INT_DIGITS - len(prefix) + 1)]
+        values = []
+        for lo, hi in ranges:
+            if lo is None:
+                sql = 'SELECT `{0}` FROM `{1}` ORDER BY `{0}` LIMIT ?'.format(column, table)
+                args = (__class__.MAX_VALUES,)
+            else:
+                sql = 'SELECT `{0}` FROM `{1}` WHERE `{0}` BETWEEN ? AND ? ORDER BY `{0}` LIMIT ?'.format(column, table)
+                args = (lo, hi, __class__.MAX_VALUES - len(values))
+            values += [str(r[0]) for r in conn.execute(sql, args)]
+            if len(values) >= __class__.MAX_VALUES:
+                break
+        return values
+    ### end of values ###
@@ -0,0 +1,158 @@
+#!/usr/bin/python
+# vim: set expandtab:
+
+import bisect
+import datetime
+
+class CronSchedule:
+    """
+    cron expression: "minute hour day-of-month month day-of-week"
+
+    each field accepts `*`, `a`, `a-b`, `*/n`, `a-b/n` and comma separated
+    lists of them, month and day-of-week also accept names (jan, mon, ...).
+    `@yearly`, `@monthly`, `@weekly`, `@daily` and `@hourly` are shortcuts.
+    """
+    class BadExpressionException(Exception):
+        def __init__(self, message):
+            super().__init__(message)
+
+    MACROS = {
+        '@yearly': '0 0 1 1 *',
+        '@annually': '0 0 1 1 *',
+        '@monthly': '0 0 1 * *',
+        '@weekly': '0 0 * * 0',
+        '@daily': '0 0 * * *',
+        '@midnight': '0 0 * * *',
+        '@hourly': '0 * * * *',
+    }
+    MONTH_NAMES = ['jan', 'feb', 'mar', 'apr', 'may', 'jun',
+                   'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+    DOW_NAMES = ['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat']
+    # (name, min, max, names)
+    FIELDS = [
+        ('minute', 0, 59, None),
+        ('hour', 0, 23, None),
+        ('day', 1, 31, None),
+        ('month', 1, 12, MONTH_NAMES),
+        ('dow', 0, 7, DOW_NAMES),
+    ]
+    # give up if no time matches in this many days, e.g. "0 0 30 2 *"
+    MAX_SEARCH_DAYS = 366 * 5
+
+    def __init__(self, expr):
+        self.expr = expr.strip()
+        fields = __class__.MACROS.get(self.expr.lower(), self.expr).split()
+        if len(fields) != 5:
+            raise CronSchedule.BadExpressionException('expect 5 fields in [{}]'.format(expr))
+
+        values = []
+        for field, spec in zip(__class__.FIELDS, fields):
+            values.append(self.__parse_field(field, spec))
+        self.minutes, self.hours, self.days, self.months, dows = values
+        # 7 is also sunday
+        self.dows = sorted(set([d % 7 for d in dows]))
+        # as in vixie cron, when both day fields are restricted either may match
+        self.any_day = fields[2] == '*'
+        self.any_dow = fields[4] == '*'
+
+    def __parse_value(self, field, value):
+        name, lo, hi, names = field
+        if names is not None and value.lower() in names:
+            return names.index(value.lower()) + (1 if name == 'month' else 0)
+        try:
+            v = int(value)
+        except ValueError:
+            raise CronSchedule.BadExpressionException('bad {} value [{}]'.format(name, value))
+        if v < lo or v > hi:
+            raise CronSchedule.BadExpressionException('{} value {} out of range {}-{}'.format(name, v, lo, hi))
+        return v
+
+    def __parse_field(self, field, spec):
+        name, lo, hi, _ = field
+        result = set()
+        for part in spec.split(','):
+            step = 1
+            if '/' in part:
+                part, step = part.split('/', 1)
+                if not step.isdigit() or int(step) == 0:
+                    raise CronSchedule.BadExpressionException('bad {} step [{}]'.format(name, step))
+                step = int(step)
+            if part == '*':
+                first, last = lo, hi
+            elif '-' in part:
+                first, last = part.split('-', 1)
+                first = self.__parse_value(field, first)
+                last = self.__parse_value(field, last)
+            else:
+                first = self.__parse_value(field, part)
+                last = hi if step != 1 else first
+            if first > last:
+                raise CronSchedule.BadExpressionException('bad {} range [{}]'.format(name, part))
+            result.update(range(first, last + 1, step))
+        return sorted(result)
+
+    def __day_match(self, dt):
+        dom = dt.day in self.days
+        dow = (dt.isoweekday() % 7) in self.dows
+        if self.any_day or self.any_dow:
+            return dom and dow
+        return dom or dow
+
+    def __next_day(self, dt):
+        dt = dt.replace(hour=0, minute=0)
+        if not self.any_dow:
+            return dt + datetime.timedelta(days=1)
+        # only day-of-month restricts, jump to its next value in this month
+        day = __class__.__next_in(self.days, dt.day + 1)
+        if day is not None:
+            try:
+                return dt.replace(day=day)
+            except ValueError:
+                pass # no such day in this month
+        return (dt.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+
+    @staticmethod
+    def __next_in(values, v):
+        idx = bisect.bisect_left(values, v)
+        return values[idx] if idx < len(values) else None
+
+    def next_fire(self, ts):
+        """
+        return the first wall-clock timestamp strictly after `ts` matching
+        the expression, fields are skipped by whole months/days/hours
+        instead of stepping minute by minute
+        """
+        dt = datetime.datetime.fromtimestamp(ts).replace(second=0, microsecond=0)
+        dt += datetime.timedelta(minutes=1)
+        limit = dt + datetime.timedelta(days=__class__.MAX_SEARCH_DAYS)
+
+        while dt < limit:
+            if dt.month not in self.months:
+                month = __class__.__next_in(self.months, dt.month)
+                if month is None:
+                    dt = dt.replace(year=dt.year + 1, month=self.months[0], day=1, hour=0, minute=0)
+                else:
+                    dt = dt.replace(month=month, day=1, hour=0, minute=0)
+                continue
+            if not self.__day_match(dt):
+                dt = self.__next_day(dt)
+                continue
+            if dt.hour not in self.hours:
+                hour = __class__.__next_in(self.hours, dt.hour)
+                if hour is None:
+                    dt = (dt + datetime.timedelta(days=1)).replace(hour=0, minute=0)
+                else:
+                    dt = dt.replace(hour=hour, minute=0)
+                continue
+            if dt.minute not in self.minutes:
+                minute = __class__.__next_in(self.minutes, dt.minute)
+                if minute is None:
+                    dt = (dt + datetime.timedelta(hours=1)).replace(minute=0)
+                else:
+                    dt = dt.replace(minute=minute)
+                continue
+            return dt.timestamp()
+        raise CronSchedule.BadExpressionException('[{}] never fires'.format(self.expr))
+
+    def __str__(self):
+        return self.expr
@@ -1,7 +1,12 @@
 #!/usr/bin/python
 # vim: set expandtab:
 import os
+import time
 import sqlite3
+import threading
+import contextlib
+
+import eve.common
 
 class EveDB:
     _conn = None
@@ -14,12 +19,24 @@ class EveDB:
     _eve_tbl_update = 'INSERT OR REPLACE INTO {} (`key`, `value`) VALUES (?, ?)'
     _eve_tbl_select = 'SELECT `value` FROM {} WHERE `key` = ?'
 
+    _change_tbl = 'EveDB_changes'
+    _change_tbl_create = 'CREATE TABLE IF NOT EXISTS {} ( `tbl` TEXT PRIMARY KEY, `version` INTEGER );'
+    # conflict clause of the outer statement (e.g. INSERT OR REPLACE) also
+    # applies inside triggers, so avoid relying on OR IGNORE here
+    _change_trigger_create = ('CREATE TRIGGER IF NOT EXISTS `{table}_evedb_{op}` AFTER {op} ON `{table}` BEGIN '
+            'UPDATE {changes} SET `version` = `version` + 1 WHERE `tbl` = \'{table}\'; '
+            'INSERT INTO {changes} (`tbl`, `version`) SELECT \'{table}\', 1 '
+            'WHERE NOT EXISTS (SELECT 1 FROM {changes} WHERE `tbl` = \'{table}\'); END;')
+
     def __init__(self, dbfile):
         if dbfile is None:
             raise
 
         self._conn = None
         self._dbfile = dbfile
+        self._lock = threading.RLock()
+        self._txn_depth = 0
+        self._own = None # changes of watched tables by this connection, see track_changes
         basedir = os.path.dirname(dbfile)
         if basedir and not os.path.exists(basedir):
             os.makedirs(basedir)
@@ -51,26 +68,127 @@ class EveDB:
     def __full_table_name(self, table):
         return '{}_{}'.format(self._namespace, table)
 
+    def table_name(self, table):
+        """
+        full table name of `table` in current namespace, for raw queries
+        """
+        return self.__full_table_name(table)
+
     def set_namespace(self, namespace):
         self._namespace = namespace
 
     def connect(self):
-        self._conn = sqlite3.connect(self._dbfile)
+        # polling jobs run on worker threads, access is serialized by _lock
+        self._conn = sqlite3.connect(self._dbfile, check_same_thread=False)
         self._conn.row_factory = sqlite3.Row
 
     def disconnect(self):
         self._conn.close()
 
     def execute(self, query, args = ()):
-        c = self._conn.cursor()
-        c.execute(query, args)
-        r = []
-        for x in c.fetchall():
-            r.append(dict(zip(x.keys(),x)))
-        c.close()
-        self._conn.commit()
+        with eve.common.span('db.execute', sql=query):
+            return self.__execute(query, args)
+
+    def __execute(self, query, args):
+        start = time.perf_counter()
+        with self._lock, self.__tracked(query):
+            c = self._conn.cursor()
+            c.execute(query, args)
+            r = []
+            for x in c.fetchall():
+                r.append(dict(zip(x.keys(),x)))
+            c.close()
+            if self._txn_depth == 0:
+                self._conn.commit()
+        eve.common.add_timing('db', time.perf_counter() - start)
         return r;
 
+    def executemany(self, query, args_list):
+        with eve.common.span('db.executemany', sql=query):
+            start = time.perf_counter()
+            with self._lock, self.__tracked(query):
+                self._conn.executemany(query, args_list)
+                if self._txn_depth == 0:
+                    self._conn.commit()
+            eve.common.add_timing('db', time.perf_counter() - start)
+
+    def track_changes(self):
+        """
+        count changes of watched tables (see table_watch) made by this
+        connection, read them with own_changes
+        """
+        if self._own is None:
+            self._own = {}
+
+    def own_changes(self):
+        """
+        return { full table name: changes by this connection } of watched
+        tables since track_changes
+        """
+        return dict(self._own) if self._own is not None else {}
+
+    def __change_counters(self):
+        # on the raw connection, execute() would track itself
+        try:
+            r = self._conn.execute('SELECT `tbl`, `version` FROM {}'.format(self._change_tbl))
+        except sqlite3.OperationalError:
+            return {} # nothing watched yet
+        return {x['tbl']: x['version'] for x in r}
+
+    @contextlib.contextmanager
+    def __tracked(self, query):
+        if self._own is None or query.lstrip()[:6].upper() in ('SELECT', 'PRAGMA'):
+            yield
+            return
+        # counters before and after the statement, in a transaction so no
+        # other connection commits in between
+        with self.transaction():
+            before = self.__change_counters()
+            yield
+            after = self.__change_counters()
+        for tbl, version in after.items():
+            if version != before.get(tbl, 0):
+                self._own[tbl] = self._own.get(tbl, 0) + version - before.get(tbl, 0)
+
+    @contextlib.contextmanager
+    def transaction(self, deferred = False):
+        """
+        run statements of the with-block in one transaction, commit when the
+        block finishes and rollback on exception. nested blocks join the
+        outermost transaction. a `deferred` transaction takes the write lock
+        on its first write instead of at the start
+        """
+        with self._lock:
+            if self._txn_depth == 0:
+                self._conn.execute('BEGIN DEFERRED' if deferred else 'BEGIN IMMEDIATE')
+            self._txn_depth += 1
+            try:
+                yield self
+            except:
+                self._txn_depth -= 1
+                if self._txn_depth == 0:
+                    self._conn.rollback()
+                raise
+            self._txn_depth -= 1
+            if self._txn_depth == 0:
+                self._conn.commit()
+
+    @contextlib.contextmanager
+    def savepoint(self, name = 'evedb'):
+        """
+        run statements of the with-block in a savepoint of the current (or
+        a new) transaction, on exception only the block is rolled back
+        """
+        with self.transaction():
+            self._conn.execute('SAVEPOINT `{}`'.format(name))
+            try:
+                yield self
+            except:
+                self._conn.execute('ROLLBACK TO `{}`'.format(name))
+                self._conn.execute('RELEASE `{}`'.format(name))
+                raise
+            self._conn.execute('RELEASE `{}`'.format(name))
+
     def table_create(self, table, schema, version = 0):
         """
         schema: [
@@ -165,6 +283,54 @@ class EveDB:
         self.__evedb_set('{}.version'.format(table), version)
         return True
 
+    def table_watch(self, table):
+        """
+        count every insert/update/delete of `table` with sqlite triggers,
+        use table_changes to read the counters.
+        return full table name which is the key in table_changes
+        """
+        table = self.__full_table_name(table)
+        self.execute(self._change_tbl_create.format(self._change_tbl))
+        for op in ['INSERT', 'UPDATE', 'DELETE']:
+            self.execute(self._change_trigger_create.format(table=table, op=op, changes=self._change_tbl))
+        return table
+
+    def table_changes(self):
+        """
+        return { full table name: change counter } of watched tables
+        """
+        self.execute(self._change_tbl_create.format(self._change_tbl))
+        r = self.execute('SELECT `tbl`, `version` FROM {}'.format(self._change_tbl))
+        return {x['tbl']: x['version'] for x in r}
+
+    def data_version(self):
+        """
+        changes whenever another connection commits to the database file
+        """
+        return self.execute('PRAGMA data_version')[0]['data_version']
+
+    def table_create_index(self, table, columns, unique = False):
+        table = self.__full_table_name(table)
+        name = '{}_idx_{}'.format(table, '_'.join(columns))
+        cols = ', '.join(['`{}`'.format(c) for c in columns])
+        sql = 'CREATE {}INDEX IF NOT EXISTS `{}` ON `{}` ({});'.format(
+                'UNIQUE ' if unique else '', name, table, cols)
+        self.execute(sql)
+
+    def table_insert_many(self, table, rows):
+        """
+        rows: [
+          { 'key': 'value', ... }, ...
+        ], all rows have the same keys
+        """
+        if len(rows) == 0:
+            return
+        table = self.__full_table_name(table)
+        keys = list(rows[0].keys())
+        sql = 'INSERT INTO `{}` ({}) VALUES ({});'.format(table,
+                ','.join(['`{}`'.format(k) for k in keys]), ','.join(['?'] * len(keys)))
+        self.executemany(sql, [tuple(row[k] for k in keys) for row in rows])
+
     def table_version(self, table):
         table = self.__full_table_name(table)
         return self.__evedb_get('{}.version'.format(table))
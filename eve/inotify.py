@@ -0,0 +1,94 @@
+#!/usr/bin/python
+# vim: set expandtab:
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+
+class Inotify:
+    """
+    minimal binding of linux inotify through libc, fileno() can be passed to
+    select/selectors and read() returns (wd, mask, name) of pending events
+    """
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    # watch removed, by rm_watch or because the inode is gone
+    IN_IGNORED = 0x00008000
+    IN_CHANGES = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+                  | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    EVENT_HEADER = struct.Struct('iIII')
+
+    __libc = None
+
+    @classmethod
+    def __load_libc(cls):
+        if cls.__libc is None:
+            name = ctypes.util.find_library('c')
+            libc = ctypes.CDLL(name, use_errno=True)
+            if not hasattr(libc, 'inotify_init1'):
+                raise OSError(errno.ENOSYS, 'inotify is not supported')
+            cls.__libc = libc
+        return cls.__libc
+
+    @classmethod
+    def available(cls):
+        try:
+            cls.__load_libc()
+            return True
+        except (OSError, TypeError):
+            return False
+
+    def __init__(self):
+        self._libc = __class__.__load_libc()
+        self._fd = self._libc.inotify_init1(__class__.IN_NONBLOCK | __class__.IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def fileno(self):
+        return self._fd
+
+    def add_watch(self, path, mask = IN_CHANGES):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def rm_watch(self, wd):
+        # fails if the watch is already removed (IN_IGNORED), that is fine
+        return self._libc.inotify_rm_watch(self._fd, wd) == 0
+
+    def read(self):
+        events = []
+        while True:
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset + __class__.EVENT_HEADER.size <= len(buf):
+                wd, mask, cookie, length = __class__.EVENT_HEADER.unpack_from(buf, offset)
+                offset += __class__.EVENT_HEADER.size
+                name = buf[offset:offset + length].rstrip(b'\0').decode(errors='replace')
+                offset += length
+                events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
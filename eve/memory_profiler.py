@@ -0,0 +1,117 @@
+#!/usr/bin/python
+# vim: set expandtab:
+
+import os
+import time
+import tracemalloc
+
+class MemoryProfiler:
+    """
+    opt-in tracemalloc profiler, snapshot() compares current allocations
+    with the first snapshot after start() and with the previous one
+    """
+    # allocations are attributed to groups by frames near the root of their
+    # traceback, only the innermost NFRAMES frames are kept
+    NFRAMES = 50
+    TOP_SITES = 10
+
+    def __init__(self):
+        self.baseline = None
+        self.previous = None
+
+    def running(self):
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(__class__.NFRAMES)
+        self.baseline = None
+        self.previous = None
+
+    def stop(self):
+        tracemalloc.stop()
+        self.baseline = None
+        self.previous = None
+
+    @staticmethod
+    def __take():
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ])
+
+    @staticmethod
+    def __attribute(snapshot, groups):
+        # an allocation belongs to the group of the outermost frame of its
+        # traceback in one of the group's code ranges, e.g. the process_batch
+        # of a job, whatever code it calls into. each allocation is counted
+        # once, those made outside of all ranges are not counted
+        ranges = {}
+        for name, codes in groups.items():
+            for filename, first, last in codes:
+                ranges.setdefault(filename, []).append((first, last, name))
+        sizes = {name: 0 for name in groups}
+        for trace in snapshot.traces:
+            # sorted from the oldest frame
+            for frame in trace.traceback:
+                name = next((n for first, last, n in ranges.get(frame.filename, ())
+                        if first <= frame.lineno <= last), None)
+                if name is not None:
+                    sizes[name] += trace.size
+                    break
+        return sizes
+
+    @staticmethod
+    def code_range(func):
+        """
+        (file, first line, last line) of function `func`, a code range of
+        snapshot() groups. nested functions are in the range of their parent
+        """
+        code = func.__code__
+        last = max((line for _, _, line in code.co_lines() if line is not None),
+                default=code.co_firstlineno)
+        return (code.co_filename, code.co_firstlineno, last)
+
+    def snapshot(self, groups = None):
+        """
+        groups: {
+          'name': [(file, first line, last line), ...], ...
+        }, growth of allocations made under each code range (see
+        code_range) is reported by name
+        """
+        if not tracemalloc.is_tracing():
+            return None
+        snapshot = __class__.__take()
+        if self.baseline is None:
+            self.baseline = snapshot
+        current, peak = tracemalloc.get_traced_memory()
+        report = {
+            'pid': os.getpid(),
+            'ts': time.time(),
+            'traced': current,
+            'peak': peak,
+            'top': [],
+            'growth': [],
+            'groups': {},
+        }
+        for stat in snapshot.statistics('lineno')[:__class__.TOP_SITES]:
+            frame = stat.traceback[0]
+            report['top'].append({'site': '{}:{}'.format(frame.filename, frame.lineno),
+                                  'size': stat.size, 'count': stat.count})
+        for stat in snapshot.compare_to(self.baseline, 'lineno')[:__class__.TOP_SITES]:
+            frame = stat.traceback[0]
+            report['growth'].append({'site': '{}:{}'.format(frame.filename, frame.lineno),
+                                     'size_diff': stat.size_diff, 'count_diff': stat.count_diff})
+        groups = groups or {}
+        sizes = __class__.__attribute(snapshot, groups)
+        baseline = __class__.__attribute(self.baseline, groups)
+        previous = __class__.__attribute(self.previous, groups) if self.previous is not None else sizes
+        for name in groups:
+            report['groups'][name] = {
+                'size': sizes[name],
+                'since_baseline': sizes[name] - baseline[name],
+                'since_previous': sizes[name] - previous[name],
+            }
+        self.previous = snapshot
+        return report
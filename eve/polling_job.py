@@ -0,0 +1,169 @@
+#!/usr/bin/python
+# vim: set expandtab:
+# base of polling jobs, kept apart from the daemon so modules defining jobs
+# import it cheaply
+
+import time
+import queue
+
+import eve.common
+from eve.database import EveDB
+
+class PollingBudget:
+    """
+    work allowed for one tick of a job, limited by time (`seconds`) and/or
+    number of items (`items`), None means no limit on that dimension
+    """
+    def __init__(self, seconds = None, items = None):
+        self.deadline = None if seconds is None else time.monotonic() + seconds
+        self.items = items
+        self.used = 0
+
+    def consume(self, n = 1):
+        self.used += n
+
+    def remaining_items(self):
+        if self.items is None:
+            return None
+        return max(self.items - self.used, 0)
+
+    def remaining_time(self):
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0)
+
+    def exhausted(self):
+        if self.items is not None and self.used >= self.items:
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return True
+        return False
+
+class PollingJob:
+    # per-tick budget handed to process_batch, None to use daemon default
+    batch_seconds = None
+    batch_items = None
+
+    def __init__(self, progname):
+        self._dbfile = None
+        self._dbconn = None
+        self.logger = None
+        self._prog = progname
+        self._triggers = []
+        self._queues = {}
+        self._notify = None
+        pass
+
+    def set_logger(self, logger):
+        self.logger = logger
+
+    ### start of triggers ###
+    def watch_path(self, path, debounce = None):
+        """
+        run this job soon after file or directory `path` changes, events
+        within `debounce` seconds are coalesced into one run
+        """
+        self._triggers.append({'type': 'path', 'path': path, 'debounce': debounce})
+
+    def watch_table(self, table, namespace = None, debounce = None):
+        """
+        run this job soon after EveDB `table` (of `namespace`, default to
+        namespace of this job) is changed by another connection. writes of
+        the job through its own connection (_db()) do not trigger it
+        """
+        namespace = self._prog if namespace is None else namespace
+        self._triggers.append({'type': 'table', 'namespace': namespace,
+                               'table': table, 'debounce': debounce})
+
+    def triggers(self):
+        return self._triggers
+    ### end of triggers ###
+
+    ### start of pipelines ###
+    def set_queues(self, queues, notify = None):
+        self._queues = queues
+        self._notify = notify
+
+    def emit(self, pipeline, item, timeout = 0):
+        """
+        put `item` onto queue of `pipeline` (see PollingServiceAPI.add_pipeline),
+        wait up to `timeout` seconds while the queue is full, return False if
+        the item is dropped. by default it does not wait, a consumer which is
+        unhealthy or reloading would hold the worker of this job forever
+        """
+        q = self._queues.get(pipeline)
+        if q is None:
+            if self.logger is not None:
+                self.logger.error('pipeline [{}] is not connected to this job'.format(pipeline))
+            return False
+        was_empty = q.empty()
+        try:
+            if timeout is not None and timeout <= 0:
+                q.put_nowait(item)
+            else:
+                q.put(item, timeout=timeout)
+        except queue.Full:
+            if self.logger is not None:
+                self.logger.error('pipeline [{}] is full, item dropped'.format(pipeline))
+            return False
+        if was_empty and self._notify is not None:
+            # wake up the daemon to trigger the consumer
+            self._notify()
+        return True
+
+    def consume(self, pipeline, max_items = None):
+        """
+        take up to `max_items` (None for all) queued items of `pipeline`
+        without waiting
+        """
+        items = []
+        q = self._queues.get(pipeline)
+        while q is not None and (max_items is None or len(items) < max_items):
+            try:
+                items.append(q.get_nowait())
+            except queue.Empty:
+                break
+        return items
+    ### end of pipelines ###
+
+    ### start of hot reload ###
+    def export_state(self):
+        """
+        state handed to the new instance when the job is reloaded
+        """
+        return None
+
+    def import_state(self, state):
+        """
+        take `state` from export_state() of the instance being replaced
+        """
+        pass
+    ### end of hot reload ###
+
+    def process_one(self):
+        raise Exception("No implement in base class")
+
+    def process_batch(self, budget):
+        """
+        process as many items as `budget` (PollingBudget) allows, return
+        number of items processed. default implementation calls process_one
+        once, or repeatedly until budget exhausted if `batch_items` is set
+        """
+        while True:
+            self.process_one()
+            budget.consume()
+            if self.batch_items is None or budget.exhausted():
+                return budget.used
+
+    ### start of db facilities ##
+    def set_dbfile(self, dbfile):
+        self._dbfile = dbfile
+
+    def _db(self):
+        if self._dbconn is None:
+            if self._dbfile is None:
+                self._dbfile = eve.common.db_filepath()
+            self._dbconn = EveDB(self._dbfile)
+            self._dbconn.set_namespace(self._prog)
+        return self._dbconn
+    ### end of db facilities ##
@@ -2,49 +2,40 @@
 # vim: set expandtab:
 
 import os, sys
-import psutil
 import importlib
 import time
-import logging
 import signal
+import threading
+import hashlib
+import json
+import queue
+import selectors
 
 import eve.common
 from cmdbase import CmdBase
 from eve.database import EveDB
-from eve.cliparser import CliParser
-
-class PollingJob:
-    def __init__(self, progname):
-        self._dbfile = None
-        self._dbconn = None
-        self.logger = None
-        self._prog = progname
-        pass
-
-    def set_logger(self, logger):
-        self.logger = logger
+from eve.cron import CronSchedule
+from eve.polling_job import PollingBudget, PollingJob
 
-    def process_one(self):
-        raise "No implement in base class"
+class PipelineQueue(queue.Queue):
+    """
+    queue of a pipeline, counts items ever put so the daemon triggers the
+    consumer only for new items
+    """
+    def __init__(self, maxsize = 0):
+        super().__init__(maxsize)
+        self.puts = 0
 
-    ### start of db facilities ##
-    def set_dbfile(self, dbfile):
-        self._dbfile = dbfile
-
-    def _db(self):
-        if self._dbconn is None:
-            if self._dbfile is None:
-                self._dbfile = eve.common.db_filepath()
-            self._dbconn = EveDB(self._dbfile)
-            self._dbconn.set_namespace(self._prog)
-        return self._dbconn
-    ### end of db facilities ##
+    def _put(self, item):
+        # called with the lock of the queue held
+        self.puts += 1
+        super()._put(item)
 
 PROGNAME='polling_service'
 
 class PollingServiceDBHelper:
     __table = 'jobs'
-    __table_version = '1'
+    __table_version = '5'
     __schema = [
         {
             'name': 'jobname',
@@ -64,7 +55,164 @@ class PollingServiceDBHelper:
             'type': 'integer'
         }, {
             'name': 'status',
-            'type': 'text' # (good|err),<note>
+            'type': 'text' # (good|warn|err),<note>
+        }, {
+            'name': 'timeout',
+            'type': 'integer'
+        }, {
+            'name': 'new_timeout',
+            'type': 'integer'
+        }, {
+            'name': 'last_run',
+            'type': 'real' # wall-clock time.time()
+        }, {
+            'name': 'next_due',
+            'type': 'real' # wall-clock time.time()
+        }, {
+            'name': 'priority',
+            'type': 'text' # key of PollingDaemon.PRIORITY_CLASSES
+        }, {
+            'name': 'new_priority',
+            'type': 'text'
+        }, {
+            'name': 'cron',
+            'type': 'text' # CronSchedule expression, overrides interval
+        }, {
+            'name': 'new_cron',
+            'type': 'text'
+        }
+    ]
+    # version => (next version, columns to add)
+    __upgrades = {
+        '1': ('2', [
+            {'name': 'timeout', 'type': 'integer'},
+            {'name': 'new_timeout', 'type': 'integer'}
+        ]),
+        '2': ('3', [
+            {'name': 'last_run', 'type': 'real'},
+            {'name': 'next_due', 'type': 'real'}
+        ]),
+        '3': ('4', [
+            {'name': 'priority', 'type': 'text'},
+            {'name': 'new_priority', 'type': 'text'}
+        ]),
+        '4': ('5', [
+            {'name': 'cron', 'type': 'text'},
+            {'name': 'new_cron', 'type': 'text'}
+        ]),
+    }
+
+    # explicit trigger requests, see PollingServiceAPI.trigger
+    __trigger_table = 'triggers'
+    __trigger_table_version = '1'
+    __trigger_schema = [
+        {
+            'name': 'jobname',
+            'type': 'text',
+            'primary': True
+        }, {
+            'name': 'ts',
+            'type': 'real'
+        }
+    ]
+
+    # requests to the running daemon, e.g. reload of a job, see PollingServiceAPI
+    __command_table = 'commands'
+    __command_table_version = '1'
+    __command_schema = [
+        {
+            'name': 'id',
+            'type': 'integer',
+            'primary': True
+        }, {
+            'name': 'target',
+            'type': 'text' # jobname
+        }, {
+            'name': 'command',
+            'type': 'text'
+        }, {
+            'name': 'ts',
+            'type': 'real'
+        }
+    ]
+
+    # producer => consumer job queues, see PollingServiceAPI.add_pipeline
+    __pipeline_table = 'pipelines'
+    __pipeline_table_version = '1'
+    __pipeline_schema = [
+        {
+            'name': 'name',
+            'type': 'text',
+            'primary': True
+        }, {
+            'name': 'producer',
+            'type': 'text'
+        }, {
+            'name': 'consumer',
+            'type': 'text'
+        }, {
+            'name': 'maxsize',
+            'type': 'integer'
+        }
+    ]
+
+    # one row per job run, rolled up into runs_hourly by compact_runs
+    __run_table = 'runs'
+    __run_table_version = '1'
+    __run_schema = [
+        {
+            'name': 'id',
+            'type': 'integer',
+            'primary': True
+        }, {
+            'name': 'jobname',
+            'type': 'text'
+        }, {
+            'name': 'start',
+            'type': 'real' # wall-clock time.time()
+        }, {
+            'name': 'duration',
+            'type': 'real'
+        }, {
+            'name': 'outcome',
+            'type': 'text' # succ|fail|timeout
+        }, {
+            'name': 'items',
+            'type': 'integer'
+        }
+    ]
+    __hourly_table = 'runs_hourly'
+    __hourly_table_version = '1'
+    __hourly_schema = [
+        {
+            'name': 'jobname',
+            'type': 'text',
+            'primary': True
+        }, {
+            'name': 'hour',
+            'type': 'integer', # wall-clock time of the hour start
+            'primary': True
+        }, {
+            'name': 'runs',
+            'type': 'integer'
+        }, {
+            'name': 'succ',
+            'type': 'integer'
+        }, {
+            'name': 'fail',
+            'type': 'integer'
+        }, {
+            'name': 'timeout',
+            'type': 'integer'
+        }, {
+            'name': 'items',
+            'type': 'integer'
+        }, {
+            'name': 'total_duration',
+            'type': 'real'
+        }, {
+            'name': 'max_duration',
+            'type': 'real'
         }
     ]
 
@@ -83,6 +231,33 @@ class PollingServiceDBHelper:
         cmdline = db.evedb_get('{}.cmdline'.format(PROGNAME))
         return (pid, cmdline)
 
+    @classmethod
+    def setworkerinfo(cls, pids):
+        db = cls.__getdbconn()
+        db.evedb_set('{}.workers'.format(PROGNAME), ','.join([str(p) for p in pids]))
+
+    @classmethod
+    def getworkerinfo(cls):
+        db = cls.__getdbconn()
+        pids = db.evedb_get('{}.workers'.format(PROGNAME))
+        return [int(p) for p in pids.split(',') if p] if pids else []
+
+    @classmethod
+    def setmemoryreport(cls, pid, report):
+        db = cls.__getdbconn()
+        db.evedb_set('{}.memory.{}'.format(PROGNAME, pid), json.dumps(report))
+
+    @classmethod
+    def getmemoryreport(cls, pid):
+        db = cls.__getdbconn()
+        report = db.evedb_get('{}.memory.{}'.format(PROGNAME, pid))
+        return json.loads(report) if report else None
+
+    @classmethod
+    def resetdb(cls):
+        # a forked worker must not share the sqlite connection of its parent
+        cls.__dbconn = None
+
     @classmethod
     def __getdbconn(cls):
         if cls.__dbconn is None:
@@ -98,21 +273,46 @@ class PollingServiceDBHelper:
         if db is not None:
             cls.__dbconn = db
         db = cls.__getdbconn()
-        if db.table_version(cls.__table) != cls.__table_version:
+        if db.table_version(cls.__trigger_table) is None:
+            db.table_create(cls.__trigger_table, cls.__trigger_schema, cls.__trigger_table_version)
+        if db.table_version(cls.__command_table) is None:
+            db.table_create(cls.__command_table, cls.__command_schema, cls.__command_table_version)
+        if db.table_version(cls.__pipeline_table) is None:
+            db.table_create(cls.__pipeline_table, cls.__pipeline_schema, cls.__pipeline_table_version)
+        if db.table_version(cls.__run_table) is None:
+            db.table_create(cls.__run_table, cls.__run_schema, cls.__run_table_version)
+            db.table_create_index(cls.__run_table, ['jobname', 'start'])
+            db.table_create_index(cls.__run_table, ['start'])
+        if db.table_version(cls.__hourly_table) is None:
+            db.table_create(cls.__hourly_table, cls.__hourly_schema, cls.__hourly_table_version)
+            db.table_create_index(cls.__hourly_table, ['hour'])
+        version = db.table_version(cls.__table)
+        if version is None:
             db.table_create(cls.__table, cls.__schema, cls.__table_version)
+            return
+        while version in cls.__upgrades:
+            next_version, columns = cls.__upgrades[version]
+            # bump version only after the last column is added
+            for idx, column in enumerate(columns):
+                last = idx == len(columns) - 1
+                db.table_add_column(cls.__table, column, next_version if last else version)
+            version = next_version
 
     @classmethod
-    def update_job(cls, jobname, enable = None, interval = None):
+    def update_job(cls, jobname, enable = None, interval = None, timeout = None, priority = None, cron = None):
         cls.setupdb()
         db = cls.__getdbconn()
         rows = db.table_select(cls.__table, {'jobname': jobname})
         if len(rows) == 0:
             # new job
-            if enable is None or interval is None:
+            if enable is None or (interval is None and not cron):
                 return False
             record = {'jobname': jobname,
                        'enable': None, 'new_enable': int(enable),
                        'interval': None, 'new_interval': interval,
+                       'timeout': None, 'new_timeout': timeout,
+                       'priority': None, 'new_priority': priority,
+                       'cron': None, 'new_cron': cron,
                        'status': 'good,new'}
         else:
             record = rows[0]
@@ -120,6 +320,12 @@ class PollingServiceDBHelper:
                 record['new_enable'] = int(enable)
             if interval is not None:
                 record['new_interval'] = interval
+            if timeout is not None:
+                record['new_timeout'] = timeout
+            if priority is not None:
+                record['new_priority'] = priority
+            if cron is not None:
+                record['new_cron'] = cron
         db.table_update(cls.__table, record)
         return True
 
@@ -136,6 +342,160 @@ class PollingServiceDBHelper:
         db.table_update(cls.__table, record)
         return True
 
+    @classmethod
+    def update_jobschedule(cls, jobname, last_run, next_due):
+        cls.setupdb()
+        db = cls.__getdbconn()
+        db.table_update_condition(cls.__table,
+                {'last_run': last_run, 'next_due': next_due},
+                {'jobname': jobname})
+
+    @classmethod
+    def add_trigger(cls, jobname):
+        cls.setupdb()
+        db = cls.__getdbconn()
+        db.table_update(cls.__trigger_table, {'jobname': jobname, 'ts': time.time()})
+
+    @classmethod
+    def pop_triggers(cls, jobnames):
+        cls.setupdb()
+        db = cls.__getdbconn()
+        popped = []
+        # by rowid, conditions of table_delete match text with LIKE
+        table = db.table_name(cls.__trigger_table)
+        for row in db.execute('SELECT `rowid`, `jobname` FROM `{}`;'.format(table)):
+            if row['jobname'] in jobnames:
+                db.execute('DELETE FROM `{}` WHERE `rowid` = ?;'.format(table), (row['rowid'],))
+                popped.append(row['jobname'])
+        return popped
+
+    @classmethod
+    def add_command(cls, target, command):
+        cls.setupdb()
+        db = cls.__getdbconn()
+        db.table_update(cls.__command_table, {'target': target, 'command': command, 'ts': time.time()})
+
+    @classmethod
+    def pop_commands(cls, targets, expire = 3600):
+        """
+        take commands for `targets`, commands nobody took in `expire` seconds
+        are dropped
+        """
+        cls.setupdb()
+        db = cls.__getdbconn()
+        popped = []
+        now = time.time()
+        for row in db.table_select(cls.__command_table):
+            if row['target'] in targets:
+                db.table_delete(cls.__command_table, {'id': row['id']}, 1)
+                popped.append(row)
+            elif row['ts'] < now - expire:
+                db.table_delete(cls.__command_table, {'id': row['id']}, 1)
+        return popped
+
+    @classmethod
+    def update_pipeline(cls, name, producer, consumer, maxsize):
+        cls.setupdb()
+        db = cls.__getdbconn()
+        db.table_update(cls.__pipeline_table, {'name': name, 'producer': producer,
+                'consumer': consumer, 'maxsize': maxsize})
+
+    @classmethod
+    def delete_pipeline(cls, name):
+        cls.setupdb()
+        db = cls.__getdbconn()
+        rows = db.table_select(cls.__pipeline_table, {'name': name})
+        if len(rows) == 0:
+            return None
+        db.table_delete(cls.__pipeline_table, {'name': name}, 1)
+        return rows[0]
+
+    @classmethod
+    def get_pipelines(cls):
+        cls.setupdb()
+        db = cls.__getdbconn()
+        return db.table_select(cls.__pipeline_table)
+
+    @classmethod
+    def add_runs(cls, records):
+        cls.setupdb()
+        db = cls.__getdbconn()
+        db.table_insert_many(cls.__run_table, records)
+
+    @classmethod
+    def compact_runs(cls, max_age, max_rows, hourly_max_age):
+        """
+        roll raw runs older than max_age seconds, or beyond the newest max_rows,
+        into per-hour aggregates, and drop aggregates older than hourly_max_age
+        """
+        cls.setupdb()
+        db = cls.__getdbconn()
+        runs = db.table_name(cls.__run_table)
+        hourly = db.table_name(cls.__hourly_table)
+        now = time.time()
+        with db.transaction():
+            cutoff = now - max_age
+            rows = db.execute('SELECT `start` FROM `{}` ORDER BY `start` DESC LIMIT 1 OFFSET ?;'
+                    .format(runs), (max_rows - 1,))
+            if len(rows) != 0:
+                cutoff = max(cutoff, rows[0]['start'])
+            count = db.execute('SELECT COUNT(*) AS `n` FROM `{}` WHERE `start` < ?;'
+                    .format(runs), (cutoff,))[0]['n']
+            if count != 0:
+                db.execute('''INSERT INTO `{hourly}`
+                        (`jobname`, `hour`, `runs`, `succ`, `fail`, `timeout`, `items`,
+                         `total_duration`, `max_duration`)
+                    SELECT `jobname`, CAST(`start` / 3600 AS INTEGER) * 3600 AS `h`, COUNT(*),
+                        SUM(`outcome` = 'succ'), SUM(`outcome` = 'fail'), SUM(`outcome` = 'timeout'),
+                        SUM(`items`), SUM(`duration`), MAX(`duration`)
+                    FROM `{runs}` WHERE `start` < ? GROUP BY `jobname`, `h`
+                    ON CONFLICT (`jobname`, `hour`) DO UPDATE SET
+                        `runs` = `runs` + excluded.`runs`,
+                        `succ` = `succ` + excluded.`succ`,
+                        `fail` = `fail` + excluded.`fail`,
+                        `timeout` = `timeout` + excluded.`timeout`,
+                        `items` = `items` + excluded.`items`,
+                        `total_duration` = `total_duration` + excluded.`total_duration`,
+                        `max_duration` = MAX(`max_duration`, excluded.`max_duration`);'''
+                    .format(hourly=hourly, runs=runs), (cutoff,))
+                db.execute('DELETE FROM `{}` WHERE `start` < ?;'.format(runs), (cutoff,))
+            db.execute('DELETE FROM `{}` WHERE `hour` < ?;'.format(hourly), (now - hourly_max_age,))
+        return count
+
+    @classmethod
+    def get_run_trend(cls, since, bucket = 3600, jobname = None, offset = 0):
+        """
+        per-job aggregates of runs since `since` in buckets of `bucket` seconds
+        (a multiple of an hour), merging raw runs and hourly rollups. buckets
+        are aligned to a timezone `offset` seconds east of UTC, e.g. to local
+        days with time.localtime().tm_gmtoff
+        """
+        cls.setupdb()
+        db = cls.__getdbconn()
+        runs = db.table_name(cls.__run_table)
+        hourly = db.table_name(cls.__hourly_table)
+        job_cond = ' AND `jobname` = :jobname' if jobname is not None else ''
+        sql = '''SELECT `jobname`, `bucket`, SUM(`runs`) AS `runs`, SUM(`succ`) AS `succ`,
+                SUM(`fail`) AS `fail`, SUM(`timeout`) AS `timeout`, SUM(`items`) AS `items`,
+                SUM(`total_duration`) AS `total_duration`, MAX(`max_duration`) AS `max_duration`
+            FROM (
+                SELECT `jobname`, CAST((`start` + :offset) / :bucket AS INTEGER) * :bucket - :offset AS `bucket`,
+                    COUNT(*) AS `runs`, SUM(`outcome` = 'succ') AS `succ`,
+                    SUM(`outcome` = 'fail') AS `fail`, SUM(`outcome` = 'timeout') AS `timeout`,
+                    SUM(`items`) AS `items`, SUM(`duration`) AS `total_duration`,
+                    MAX(`duration`) AS `max_duration`
+                FROM `{runs}` WHERE `start` >= :since{cond} GROUP BY `jobname`, `bucket`
+                UNION ALL
+                SELECT `jobname`, CAST((`hour` + :offset) / :bucket AS INTEGER) * :bucket - :offset AS `bucket`,
+                    SUM(`runs`), SUM(`succ`), SUM(`fail`), SUM(`timeout`), SUM(`items`),
+                    SUM(`total_duration`), MAX(`max_duration`)
+                FROM `{hourly}` WHERE `hour` >= :since_hour{cond} GROUP BY `jobname`, `bucket`
+            ) GROUP BY `jobname`, `bucket` ORDER BY `jobname`, `bucket`;'''.format(
+                runs=runs, hourly=hourly, cond=job_cond)
+        args = {'since': since, 'since_hour': int(since // 3600) * 3600,
+                'bucket': bucket, 'jobname': jobname, 'offset': offset}
+        return db.execute(sql, args)
+
     @classmethod
     def get_jobstatus(cls):
         cls.setupdb()
@@ -154,6 +514,9 @@ class PollingServiceDBHelper:
             record = rows[0]
             record['interval'] = record['new_interval']
             record['enable'] = record['new_enable']
+            record['timeout'] = record['new_timeout']
+            record['priority'] = record['new_priority']
+            record['cron'] = record['new_cron']
         db.table_update(cls.__table, record)
         return True
 
@@ -173,39 +536,183 @@ class PollingServiceJob(PollingJob):
 class PollingDaemon:
     SERVICE_JOB_NAME = 'eve.polling_service#PollingServiceJob'
     SERVICE_JOB_INTERVAL = 30
+    DEFAULT_JOB_TIMEOUT = 300
+    # upper bound of time a job may spend in one process_batch call, so a
+    # batching job gives its worker back to the other jobs
+    BATCH_QUANTUM = 30
+    # overdue jobs restored on startup are started this far apart, but all
+    # of them within STARTUP_WINDOW seconds
+    STARTUP_STAGGER = 5
+    STARTUP_WINDOW = 120
+    # number of job runs allowed at the same time. runs abandoned after
+    # their deadline are not counted, their threads can not be stopped and
+    # keep running, at most one per job, beyond this limit
+    WORKER_THREADS = 4
+    # weight: share of workers under contention (weighted fair queuing)
+    # reserved: workers only this class may use, clamped so at least one
+    # worker is shared by all classes
+    # latency: target seconds between due time and start of a run
+    PRIORITY_CLASSES = {
+        'high':   {'weight': 4, 'reserved': 1, 'latency': 5},
+        'normal': {'weight': 2, 'reserved': 0, 'latency': 60},
+        'low':    {'weight': 1, 'reserved': 0, 'latency': 600},
+    }
+    DEFAULT_PRIORITY = 'normal'
+    # quiet time before a triggered job runs, and the longest a stream of
+    # events can postpone it
+    TRIGGER_DEBOUNCE = 0.2
+    TRIGGER_MAX_DELAY = 5
+    # how often watched tables (and paths without inotify) are checked.
+    # sqlite does not notify other connections of commits, so with table
+    # watches the daemon wakes up this often even when idle
+    WATCH_POLL_INTERVAL = 1
+    # longest sleep of the scheduling loop when nothing is due
+    MAX_SLEEP = 60
+    # default capacity of a pipeline queue, a producer is not started while
+    # any of its queues is full
+    PIPELINE_MAXSIZE = 1000
+    # run history is written every HISTORY_BATCH runs or HISTORY_FLUSH seconds
+    HISTORY_BATCH = 50
+    HISTORY_FLUSH = 60
+    # raw runs older than HISTORY_MAX_AGE or beyond the newest HISTORY_MAX_ROWS
+    # are rolled up into hourly aggregates, which are kept HISTORY_HOURLY_MAX_AGE
+    HISTORY_COMPACT_INTERVAL = 3600
+    HISTORY_MAX_AGE = 7 * 86400
+    HISTORY_MAX_ROWS = 100000
+    HISTORY_HOURLY_MAX_AGE = 400 * 86400
+    # methods of job classes charged with allocations under them, see
+    # __handle_memory
+    PROFILED_METHODS = ['process_batch', 'process_one']
 
-    def __init__(self, loglevel = 'DEBUG'):
+    def __init__(self, loglevel = 'DEBUG', workers = None, channel = None,
+            logfile = 'stdout', logjson = False, logrotate = None):
+        # records are written by a listener thread, the scheduling loop
+        # never waits for the log file
         eve.common.enable_logger(
             loglevel = loglevel,
             loggername = 'PollingDaemon',
-            logfile = 'stdout'
+            logfile = logfile,
+            queued = True,
+            logjson = logjson,
+            logrotate = logrotate
         )
 
         self.logger = eve.common.logger()
         self.jobs = {} # jobname => obj
+        self.workers = workers if workers else __class__.WORKER_THREADS
+        self.reserved = self.__clamp_reserved(self.workers)
+        # virtual time and per-class virtual finish time for fair queuing
+        self.vtime = 0.0
+        self.vfinish = {prio: 0.0 for prio in __class__.PRIORITY_CLASSES}
+        # worker threads, the channel reader and signals write to the pipe
+        # to wake up the scheduling loop
+        self.selector = selectors.DefaultSelector()
+        self.wake_r, self.wake_w = os.pipe()
+        os.set_blocking(self.wake_r, False)
+        os.set_blocking(self.wake_w, False)
+        self.selector.register(self.wake_r, selectors.EVENT_READ)
+        self.signaled = False
+
+        self.inotify = None
+        self.path_watches = {} # inotify wd or path => [(jobname, debounce)]
+        self.watch_paths = {} # inotify wd => path
+        self.path_mtimes = {} # path => mtime, without inotify only
+        self.table_watches = {} # full table name => [(jobname, debounce)]
+        self.watchdb = None
+        self.watch_version = None # data_version of the last check
+        self.watch_seen = {} # (full table name, jobname) => change counter
+        self.watch_ts = 0
+
+        self.history = [] # run records not written yet
+        self.history_ts = time.monotonic() + __class__.HISTORY_FLUSH
+        self.compact_ts = time.monotonic() + __class__.HISTORY_COMPACT_INTERVAL
+        self.stopping = False
+        self.pipelines = {} # name => {producer, consumer, queue, seen}
+        self.profiler = None # MemoryProfiler, created on first use
+
+        # sharded mode, jobs are assigned by PollingLeader through channel
+        self.channel = channel
+        if channel is not None:
+            self.inbox = queue.SimpleQueue()
+            reader = threading.Thread(target=self.__read_channel, name='channel')
+            reader.daemon = True
+            reader.start()
+            return
 
         service_job = self.__create_job(__class__.SERVICE_JOB_NAME)
         if service_job is None:
             raise Exception()
         service_job.set_daemon(self)
-        self.__save_job(__class__.SERVICE_JOB_NAME, service_job, __class__.SERVICE_JOB_INTERVAL)
+        self.__save_job(__class__.SERVICE_JOB_NAME, service_job, __class__.SERVICE_JOB_INTERVAL, priority='high')
         self.__load_jobs()
+        self.__load_pipelines()
 
     def logger(self):
         return self.logger
 
     def __load_jobs(self):
-        for job in PollingServiceDBHelper.get_jobstatus():
+        self.__add_jobs(PollingServiceDBHelper.get_jobstatus())
+
+    def __add_jobs(self, rows):
+        loaded = []
+        for job in rows:
             if job['status'].startswith('err'):
                 self.logger.debug('skip creating err jobs')
                 continue
-            r = self.new_job(job['jobname'], job['new_interval'])
+            if job['jobname'] in self.jobs:
+                self.jobs[job['jobname']]['retired'] = False
+                continue
+            r = self.new_job(job['jobname'], job['new_interval'], job['new_timeout'],
+                    job['new_priority'], job['new_cron'])
 
             if not r:
                 PollingServiceDBHelper.update_jobstatus(job['jobname'], 'err,create')
             else:
                 PollingServiceDBHelper.update_jobstatus(job['jobname'], 'good,loaded')
                 PollingServiceDBHelper.consume_job_change(job['jobname'])
+                loaded.append(job)
+        self.__restore_schedule(loaded)
+
+    def __restore_schedule(self, rows):
+        wall_now = time.time()
+        mono_now = time.monotonic()
+        overdue = []
+        for row in rows:
+            job = self.jobs[row['jobname']]
+            next_due = row['next_due']
+            if next_due is not None and next_due > wall_now:
+                # never wait longer than one period, the clock may have jumped
+                delay = min(next_due - wall_now, self.__next_ts(job, mono_now) - mono_now)
+                job['next_ts'] = mono_now + delay
+                self.logger.debug('job[{}] restored, due in {:.0f}s'.format(job['name'], delay))
+            elif next_due is None and job['cron'] is not None:
+                # never run, wait for its first fire time
+                job['next_ts'] = self.__next_ts(job, mono_now)
+            else:
+                overdue.append((next_due or 0, job))
+
+        if len(overdue) == 0:
+            return
+        overdue.sort(key=lambda x: x[0])
+        stagger = min(__class__.STARTUP_STAGGER, __class__.STARTUP_WINDOW / len(overdue))
+        for idx, (_, job) in enumerate(overdue):
+            job['next_ts'] = mono_now + idx * stagger
+            self.logger.debug('job[{}] overdue, start in {:.0f}s'.format(job['name'], idx * stagger))
+
+    def __next_ts(self, job, mono_now):
+        if job['cron'] is not None:
+            wall_now = time.time()
+            return mono_now + job['cron'].next_fire(wall_now) - wall_now
+        return mono_now + job['interval']
+
+    def __save_schedule(self, job, start):
+        if job['name'] == __class__.SERVICE_JOB_NAME:
+            return
+        wall_now = time.time()
+        mono_now = time.monotonic()
+        last_run = wall_now - (mono_now - start)
+        next_due = wall_now + (job['next_ts'] - mono_now)
+        PollingServiceDBHelper.update_jobschedule(job['name'], last_run, next_due)
 
     def __create_job(self, jobname):
         if jobname in self.jobs:
@@ -222,71 +729,891 @@ class PollingDaemon:
             self.logger.error('job[{}] creation failed, ex: {}'.format(jobname, e))
             return None
 
-    def __save_job(self, jobname, cls, interval):
+    def __save_job(self, jobname, cls, interval, timeout = None, priority = None, cron = None):
         self.jobs[jobname] = {
             'name': jobname,
             'inst': cls,
             'interval': interval,
+            'cron': cron, # CronSchedule or None
+            'timeout': timeout if timeout else __class__.DEFAULT_JOB_TIMEOUT,
+            'priority': priority if priority else __class__.DEFAULT_PRIORITY,
             'next_ts': time.monotonic(),
-            'healthy': True
+            'healthy': True,
+            'retired': False, # assigned to another worker, drop once idle
+            'run': None, # in-flight run, see __start_job
+            'trigger': None, # pending trigger, see __fire
+            'reload': False, # reload requested, done once the job is idle
+            'degraded': False, # warn or err status written by a run
+            'watch_own': {}, # own changes of watched tables at run start
+            'metrics': {
+                'runs': 0,
+                'succ': 0,
+                'fail': 0,
+                'timeout': 0,
+                'items': 0,
+                'late': 0,
+                'triggers': 0,
+                'last_duration': None
+            }
         }
+        if cron is not None:
+            self.jobs[jobname]['next_ts'] = self.__next_ts(self.jobs[jobname], time.monotonic())
         self.logger.info('job[{}] saved in joblist'.format(jobname))
         return True
 
-    def new_job(self, jobname, interval):
-        if not isinstance(interval, int):
-            self.looger.error('polling interval should be integer')
+    def new_job(self, jobname, interval, timeout = None, priority = None, cron = None):
+        if cron:
+            try:
+                cron = CronSchedule(cron)
+                cron.next_fire(time.time())
+            except CronSchedule.BadExpressionException as e:
+                self.logger.error('bad cron expression of job[{}]: {}'.format(jobname, e))
+                return False
+        else:
+            cron = None
+            if not isinstance(interval, int):
+                self.logger.error('polling interval should be integer')
+                return False
+        if timeout is not None and not isinstance(timeout, int):
+            self.logger.error('polling timeout should be integer')
+            return False
+        if priority is not None and priority not in __class__.PRIORITY_CLASSES:
+            self.logger.error('unknown priority class [{}]'.format(priority))
             return False
         inst = self.__create_job(jobname)
         if inst is None:
             return False
-        return self.__save_job(jobname, inst, interval)
+        self.__save_job(jobname, inst, interval, timeout, priority, cron)
+        self.__register_triggers(jobname, inst.triggers())
+        self.__attach_queues(self.jobs[jobname])
+        return True
 
-    def run(self):
-        while True:
-            for job in self.jobs.values():
-                if not job['healthy']:
+    ### start of job scheduling ###
+    def __clamp_reserved(self, workers):
+        # reservations taking every worker would starve the other classes,
+        # classes are served in order of PRIORITY_CLASSES
+        left = workers - 1
+        reserved = {}
+        for prio, conf in __class__.PRIORITY_CLASSES.items():
+            reserved[prio] = min(conf['reserved'], max(left, 0))
+            left -= reserved[prio]
+            if reserved[prio] != conf['reserved']:
+                self.logger.warning('{} worker(s) reserved for [{}], clamped to {} of {} workers'
+                        .format(conf['reserved'], prio, reserved[prio], workers))
+        return reserved
+
+    def __busy_workers(self):
+        # abandoned runs are written off and do not hold a worker, their
+        # threads are not capped by self.workers (see WORKER_THREADS)
+        busy = {prio: 0 for prio in __class__.PRIORITY_CLASSES}
+        for job in self.jobs.values():
+            if job['run'] is not None and not job['run']['abandoned']:
+                busy[job['priority']] += 1
+        return busy
+
+    def __can_start(self, prio, busy):
+        free = self.workers - sum(busy.values())
+        for p, reserved in self.reserved.items():
+            if p != prio:
+                free -= max(reserved - busy[p], 0)
+        return free > 0
+
+    def __cost(self, job):
+        duration = job['metrics']['last_duration']
+        return max(duration if duration is not None else 1.0, 0.01)
+
+    def __dispatch(self, now):
+        due = [job for job in self.jobs.values()
+                if job['healthy'] and not job['retired']
+                and job['run'] is None and now >= self.__due_ts(job)
+                and not self.__backpressured(job)]
+        due.sort(key=lambda job: self.__due_ts(job))
+        busy = self.__busy_workers()
+        while len(due) != 0:
+            # jobs are FIFO within a class, pick the class head with the
+            # smallest virtual finish time among classes allowed to start
+            best = None
+            seen = set()
+            for job in due:
+                prio = job['priority']
+                if prio in seen:
                     continue
-                if time.monotonic() < job['next_ts']:
+                seen.add(prio)
+                if not self.__can_start(prio, busy):
                     continue
-                self.logger.debug('>> job[{}]'.format(job['name']))
-                succ = True
+                weight = __class__.PRIORITY_CLASSES[prio]['weight']
+                start = max(self.vtime, self.vfinish[prio])
+                finish = start + self.__cost(job) / weight
+                if best is None or finish < best[1]:
+                    best = (start, finish, job)
+            if best is None:
+                break
+            start, finish, job = best
+            self.vtime = start
+            self.vfinish[job['priority']] = finish
+            due.remove(job)
+            busy[job['priority']] += 1
+            self.__start_job(job, now)
+    ### end of job scheduling ###
+
+    ### start of job execution ###
+    def __start_job(self, job, now):
+        latency = now - self.__due_ts(job)
+        job['trigger'] = None
+        target = __class__.PRIORITY_CLASSES[job['priority']]['latency']
+        if latency > target:
+            job['metrics']['late'] += 1
+            self.logger.info('job[{}] started {:.1f}s late, target of [{}] is {}s'
+                    .format(job['name'], latency, job['priority'], target))
+        run = {
+            'start': now,
+            'wall_start': time.time(),
+            'end': None,
+            'deadline': now + job['timeout'],
+            'done': False,
+            'succ': False,
+            'items': 0,
+            'abandoned': False
+        }
+
+        budget = self.__job_budget(job)
+
+        def worker():
+            # a trace of its own, the run is on its own thread
+            with eve.common.span('job', job=job['name'], priority=job['priority'], latency=latency) as span:
+                try:
+                    items = job['inst'].process_batch(budget)
+                    run['items'] = budget.used if items is None else items
+                    run['succ'] = True
+                    span.set('items', run['items'])
+                except Exception as e:
+                    span.set('error', '{}: {}'.format(type(e).__name__, e))
+                    eve.common.log(eve.common.DEBUG, 'job[{}] raised {}', job['name'], e)
+                finally:
+                    run['end'] = time.monotonic()
+                    run['done'] = True
+                    self.__wake()
+
+        eve.common.log(eve.common.DEBUG, '>> job[{}]', job['name'])
+        job['run'] = run
+        self.__mark_watches(job)
+        job['metrics']['runs'] += 1
+        # python threads can not be killed, a run over its deadline is
+        # abandoned and the job waits for the thread before running again
+        thread = threading.Thread(target=worker, name='job[{}]'.format(job['name']))
+        thread.daemon = True
+        thread.start()
+
+    def __job_budget(self, job):
+        inst = job['inst']
+        seconds = min(job['timeout'], __class__.BATCH_QUANTUM)
+        if inst.batch_seconds is not None:
+            seconds = min(seconds, inst.batch_seconds)
+        return PollingBudget(seconds, inst.batch_items)
+
+    def __finish_job(self, job):
+        run = job['run']
+        metrics = job['metrics']
+        job['run'] = None
+        self.__sync_watches(job, time.monotonic())
+        if run['abandoned']:
+            self.logger.info('<< job[{}] abandoned run finished after {:.1f}s'
+                    .format(job['name'], run['end'] - run['start']))
+            return
+
+        metrics['last_duration'] = run['end'] - run['start']
+        if run['succ']:
+            metrics['succ'] += 1
+            metrics['items'] += run['items']
+            job['next_ts'] = self.__next_ts(job, run['end'])
+            self.__record_run(job, run, 'succ', metrics['last_duration'])
+            eve.common.log(eve.common.DEBUG, '<< job[{}] processed {} item(s)', job['name'], run['items'])
+            self.__save_schedule(job, run['start'])
+            if job['degraded']:
+                job['degraded'] = False
+                self.logger.info('job[{}] recovered'.format(job['name']))
+                PollingServiceDBHelper.update_jobstatus(job['name'], 'good,recovered')
+        else:
+            metrics['fail'] += 1
+            job['healthy'] = False
+            self.__record_run(job, run, 'fail', metrics['last_duration'])
+            job['degraded'] = True
+            self.logger.error('<< job[{}] finished with exception, mark as error'.format(job['name']))
+            PollingServiceDBHelper.update_jobstatus(job['name'], 'err,exception')
+
+    def __abandon_job(self, job, now):
+        run = job['run']
+        run['abandoned'] = True
+        job['metrics']['timeout'] += 1
+        job['metrics']['last_duration'] = now - run['start']
+        job['next_ts'] = self.__next_ts(job, now)
+        self.__record_run(job, run, 'timeout', now - run['start'])
+        job['degraded'] = True
+        self.logger.error('<< job[{}] exceeds deadline of {}s, abandon it'.format(job['name'], job['timeout']))
+        PollingServiceDBHelper.update_jobstatus(job['name'], 'warn,timeout')
+        self.__save_schedule(job, run['start'])
+
+    def __check_job(self, job, now):
+        run = job['run']
+        if run['done']:
+            self.__finish_job(job)
+        elif not run['abandoned'] and now >= run['deadline']:
+            self.__abandon_job(job, now)
+    ### end of job execution ###
+
+    ### start of run history ###
+    def __record_run(self, job, run, outcome, duration):
+        if job['name'] == __class__.SERVICE_JOB_NAME:
+            return
+        self.history.append({
+            'jobname': job['name'],
+            'start': run['wall_start'],
+            'duration': duration,
+            'outcome': outcome,
+            'items': run['items']
+        })
+
+    def __flush_history(self, now, force = False):
+        if len(self.history) != 0 and (force or now >= self.history_ts
+                or len(self.history) >= __class__.HISTORY_BATCH):
+            records, self.history = self.history, []
+            try:
+                PollingServiceDBHelper.add_runs(records)
+            except Exception as e:
+                self.logger.error('failed to write {} run record(s), ex: {}'.format(len(records), e))
+        if now >= self.history_ts:
+            self.history_ts = now + __class__.HISTORY_FLUSH
+        if now >= self.compact_ts:
+            # compaction is one transaction, concurrent workers just serialize
+            self.compact_ts = now + __class__.HISTORY_COMPACT_INTERVAL
+            try:
+                n = PollingServiceDBHelper.compact_runs(__class__.HISTORY_MAX_AGE,
+                        __class__.HISTORY_MAX_ROWS, __class__.HISTORY_HOURLY_MAX_AGE)
+                self.logger.debug('rolled {} run record(s) into hourly history'.format(n))
+            except Exception as e:
+                self.logger.error('failed to compact run history, ex: {}'.format(e))
+    ### end of run history ###
+
+    def __sleep_time(self):
+        now = time.monotonic()
+        wakeup = now + __class__.MAX_SLEEP
+        if len(self.table_watches) != 0 or len(self.path_mtimes) != 0:
+            wakeup = min(wakeup, self.watch_ts)
+        for job in self.jobs.values():
+            run = job['run']
+            if run is None:
+                # due jobs waiting for a worker are woken by a finishing run
+                due = self.__due_ts(job)
+                if due > now:
+                    wakeup = min(wakeup, due)
+            elif not run['abandoned']:
+                wakeup = min(wakeup, run['deadline'])
+        if len(self.history) != 0:
+            wakeup = min(wakeup, self.history_ts)
+        return max(wakeup - now, 0.01)
+
+    def __wait(self, timeout):
+        for key, _ in self.selector.select(timeout):
+            if key.fileobj == self.wake_r:
                 try:
-                    job['inst'].process_one()
-                except:
-                    succ = False
+                    while os.read(self.wake_r, 4096):
+                        pass
+                except BlockingIOError:
                     pass
-                if succ:
-                    job['next_ts'] = time.monotonic() + job['interval']
-                    self.logger.debug('<< job[{}]'.format(job['name']))
-                else:
-                    job['healthy'] = False
-                    self.logger.error('<< job[{}] finished with exception, mark as error'.format(job['name']))
-                    PollingServiceDBHelper.update_jobstatus(job['name', 'err,exception'])
-            self.jobs = {k: v for k, v in self.jobs.items() if v['healthy']}
-            time.sleep(1)
-            # TODO: smarter sleep time, instead of sleep(1)
+            elif key.fileobj is self.inotify:
+                self.__handle_inotify()
+        if self.signaled:
+            self.signaled = False
+            self.__handle_explicit_triggers()
+            self.__handle_commands()
 
-    @staticmethod
-    def sighdr(sig, frame):
+    def __wake(self):
+        try:
+            os.write(self.wake_w, b'.')
+        except BlockingIOError:
+            pass # pipe is full, loop will wake up anyway
+
+    def __sigwake(self, sig, frame):
+        self.signaled = True
+        self.__wake()
+
+    def run(self):
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGUSR1, self.sighdr)
+            signal.signal(signal.SIGUSR2, self.__sigwake)
+        self.__handle_explicit_triggers()
+        self.__handle_commands()
+        while not self.stopping:
+            now = time.monotonic()
+            self.__poll_watches(now)
+            for job in self.jobs.values():
+                if job['run'] is not None:
+                    self.__check_job(job, now)
+            if self.channel is not None:
+                self.__handle_messages()
+            for job in list(self.jobs.values()):
+                if job['reload'] and job['run'] is None:
+                    self.__reload_job(job)
+            self.jobs = {k: v for k, v in self.jobs.items()
+                    if v['healthy'] and not (v['retired'] and v['run'] is None)}
+            self.__poll_pipelines(now)
+            self.__dispatch(now)
+            self.__flush_history(now)
+            self.__wait(self.__sleep_time())
+        self.__stop()
+
+    ### start of triggers ###
+    def __due_ts(self, job):
+        if job['trigger'] is None:
+            return job['next_ts']
+        return min(job['next_ts'], job['trigger']['fire_at'])
+
+    def __fire(self, jobname, debounce, now):
+        job = self.jobs.get(jobname)
+        if job is None or job['retired'] or not job['healthy']:
+            return
+        debounce = __class__.TRIGGER_DEBOUNCE if debounce is None else debounce
+        trigger = job['trigger']
+        if trigger is None:
+            job['trigger'] = {'first': now, 'fire_at': now + debounce}
+            eve.common.log(eve.common.DEBUG, 'job[{}] triggered', jobname)
+        else:
+            # coalesce into the pending trigger, postpone it for debounce
+            trigger['fire_at'] = min(now + debounce, trigger['first'] + __class__.TRIGGER_MAX_DELAY)
+        job['metrics']['triggers'] += 1
+
+    def __register_triggers(self, jobname, triggers):
+        for trigger in triggers:
+            try:
+                if trigger['type'] == 'path':
+                    self.__watch_path(jobname, trigger['path'], trigger['debounce'])
+                elif trigger['type'] == 'table':
+                    self.__watch_table(jobname, trigger['namespace'], trigger['table'], trigger['debounce'])
+            except Exception as e:
+                self.logger.error('job[{}] failed to register trigger {}, ex: {}'.format(jobname, trigger, e))
+
+    def __watch_path(self, jobname, path, debounce):
+        from eve.inotify import Inotify
+        if self.inotify is None and Inotify.available():
+            self.inotify = Inotify()
+            self.selector.register(self.inotify, selectors.EVENT_READ)
+        if self.inotify is not None:
+            key = self.inotify.add_watch(path)
+            self.watch_paths[key] = path
+        else:
+            # no inotify, fallback to check mtime periodically
+            key = path
+            self.path_mtimes[path] = os.stat(path).st_mtime if os.path.exists(path) else None
+        self.path_watches.setdefault(key, []).append((jobname, debounce))
+
+    def __watch_table(self, jobname, namespace, table, debounce):
+        if self.watchdb is None:
+            self.watchdb = EveDB(eve.common.db_filepath())
+        self.watchdb.set_namespace(namespace)
+        fullname = self.watchdb.table_watch(table)
+        self.table_watches.setdefault(fullname, []).append((jobname, debounce))
+        self.watch_seen[(fullname, jobname)] = self.watchdb.table_changes().get(fullname)
+        # its own writes are told apart from those of other connections
+        self.jobs[jobname]['inst']._db().track_changes()
+
+    def __rewatch_path(self, wd):
+        # the watched inode is gone or moved (e.g. an editor saved by rename),
+        # watch whatever is at the path now, poll it until it comes back
+        path = self.watch_paths.pop(wd)
+        watchers = self.path_watches.pop(wd, [])
+        self.inotify.rm_watch(wd)
+        try:
+            key = self.inotify.add_watch(path)
+            self.watch_paths[key] = path
+        except OSError:
+            key = path
+            self.path_mtimes[path] = None
+        self.path_watches.setdefault(key, []).extend(watchers)
+
+    def __handle_inotify(self):
+        from eve.inotify import Inotify
+        now = time.monotonic()
+        fired = set()
+        gone = set()
+        for wd, mask, name in self.inotify.read():
+            if mask & (Inotify.IN_IGNORED | Inotify.IN_DELETE_SELF | Inotify.IN_MOVE_SELF):
+                gone.add(wd)
+            if wd in fired:
+                continue
+            fired.add(wd)
+            for jobname, debounce in self.path_watches.get(wd, []):
+                self.__fire(jobname, debounce, now)
+        for wd in gone:
+            if wd in self.watch_paths:
+                self.__rewatch_path(wd)
+
+    def __poll_watches(self, now):
+        if now < self.watch_ts:
+            return
+        self.watch_ts = now + __class__.WATCH_POLL_INTERVAL
+
+        for path, mtime in list(self.path_mtimes.items()):
+            current = os.stat(path).st_mtime if os.path.exists(path) else None
+            if current != mtime:
+                self.path_mtimes[path] = current
+                for jobname, debounce in self.path_watches.get(path, []):
+                    self.__fire(jobname, debounce, now)
+                if self.inotify is not None and current is not None:
+                    # back after __rewatch_path, watch it with inotify again
+                    del self.path_mtimes[path]
+                    watchers = self.path_watches.pop(path, [])
+                    key = self.inotify.add_watch(path)
+                    self.watch_paths[key] = path
+                    self.path_watches.setdefault(key, []).extend(watchers)
+
+        if len(self.table_watches) == 0:
+            return
+        # data_version is cheap, only read the counters if someone committed
+        current = self.watchdb.data_version()
+        if current == self.watch_version:
+            return
+        self.watch_version = current
+        latest = self.watchdb.table_changes()
+        for table, watchers in self.table_watches.items():
+            for jobname, debounce in watchers:
+                job = self.jobs.get(jobname)
+                if job is not None and job['run'] is not None:
+                    # its own writes are known once it ends, see __sync_watches
+                    continue
+                if latest.get(table) != self.watch_seen.get((table, jobname)):
+                    self.watch_seen[(table, jobname)] = latest.get(table)
+                    self.__fire(jobname, debounce, now)
+
+    def __mark_watches(self, job):
+        # a starting run handles changes so far, remember the writes of its
+        # connection to tell them from others when it ends
+        if not any(key[1] == job['name'] for key in self.watch_seen):
+            return
+        latest = self.watchdb.table_changes()
+        for key in self.watch_seen:
+            if key[1] == job['name']:
+                self.watch_seen[key] = latest.get(key[0])
+        job['watch_own'] = job['inst']._db().own_changes()
+
+    def __sync_watches(self, job, now):
+        # changes of watched tables while the job ran, less its own writes,
+        # were made by others and trigger it again
+        if not any(key[1] == job['name'] for key in self.watch_seen):
+            return
+        latest = self.watchdb.table_changes()
+        own = job['inst']._db().own_changes()
+        before = job['watch_own']
+        for table, watchers in self.table_watches.items():
+            for jobname, debounce in watchers:
+                key = (table, jobname)
+                if jobname != job['name'] or key not in self.watch_seen:
+                    continue
+                changes = (latest.get(table) or 0) - (self.watch_seen[key] or 0)
+                others = changes - (own.get(table, 0) - before.get(table, 0))
+                self.watch_seen[key] = latest.get(table)
+                if others > 0:
+                    self.__fire(jobname, debounce, now)
+
+    def __handle_explicit_triggers(self):
+        now = time.monotonic()
+        for jobname in PollingServiceDBHelper.pop_triggers(self.jobs.keys()):
+            self.__fire(jobname, 0, now)
+    ### end of triggers ###
+
+    ### start of pipelines ###
+    def __load_pipelines(self):
+        pipelines = {}
+        for row in PollingServiceDBHelper.get_pipelines():
+            if row['producer'] not in self.jobs and row['consumer'] not in self.jobs:
+                continue
+            maxsize = row['maxsize'] if row['maxsize'] else __class__.PIPELINE_MAXSIZE
+            old = self.pipelines.get(row['name'])
+            if old is not None and old['queue'].maxsize == maxsize:
+                q = old['queue']
+            else:
+                q = PipelineQueue(maxsize)
+                # carry over queued items when capacity changes
+                while old is not None and not old['queue'].empty() and not q.full():
+                    q.put_nowait(old['queue'].get_nowait())
+            pipelines[row['name']] = {'producer': row['producer'],
+                                      'consumer': row['consumer'],
+                                      'queue': q,
+                                      'seen': old['seen'] if old is not None and old['queue'] is q else 0}
+        self.pipelines = pipelines
+        for job in self.jobs.values():
+            self.__attach_queues(job)
+
+    def __attach_queues(self, job):
+        queues = {name: p['queue'] for name, p in self.pipelines.items()
+                if job['name'] in (p['producer'], p['consumer'])}
+        job['inst'].set_queues(queues, self.__wake)
+
+    def __backpressured(self, job):
+        for p in self.pipelines.values():
+            if p['producer'] == job['name'] and p['queue'].full():
+                return True
+        return False
+
+    def __poll_pipelines(self, now):
+        # the consumer is triggered for items put since it was last
+        # triggered, items it left are processed on its schedule
+        for p in self.pipelines.values():
+            job = self.jobs.get(p['consumer'])
+            if job is None or job['run'] is not None or job['trigger'] is not None:
+                continue
+            puts = p['queue'].puts
+            if puts != p['seen'] and not p['queue'].empty():
+                p['seen'] = puts
+                self.__fire(job['name'], 0, now)
+    ### end of pipelines ###
+
+    ### start of memory profiling ###
+    def __handle_memory(self, action):
+        from eve.memory_profiler import MemoryProfiler
+        if self.profiler is None:
+            self.profiler = MemoryProfiler()
+        if action == 'start':
+            self.logger.info('memory profiler started')
+            self.profiler.start()
+        elif action == 'stop':
+            self.logger.info('memory profiler stopped')
+            self.profiler.stop()
+        elif action != 'snapshot':
+            self.logger.error('unknown memory command [{}]'.format(action))
+            return
+        # allocations are charged to the job whose run made them, found by
+        # the process methods its class defines in the tracebacks
+        groups = {}
+        for name, job in self.jobs.items():
+            groups[name] = [MemoryProfiler.code_range(getattr(type(job['inst']), method))
+                    for method in __class__.PROFILED_METHODS
+                    if getattr(type(job['inst']), method) is not getattr(PollingJob, method)]
+        report = self.profiler.snapshot(groups)
+        if report is None:
+            report = {'pid': os.getpid(), 'ts': time.time()}
+        report['tracing'] = self.profiler.running()
+        import psutil
+        report['rss'] = psutil.Process(os.getpid()).memory_info().rss
+        PollingServiceDBHelper.setmemoryreport(os.getpid(), report)
+    ### end of memory profiling ###
+
+    ### start of hot reload ###
+    def __handle_commands(self):
+        pipelines = False
+        # commands for the process itself are addressed by pid
+        targets = list(self.jobs.keys()) + ['pid:{}'.format(os.getpid())]
+        for row in PollingServiceDBHelper.pop_commands(targets):
+            if row['command'].startswith('memory '):
+                self.__handle_memory(row['command'].split(' ', 1)[1])
+            elif row['command'] == 'reload':
+                self.logger.info('job[{}] reload requested'.format(row['target']))
+                self.jobs[row['target']]['reload'] = True
+            elif row['command'] == 'pipelines':
+                pipelines = True
+            else:
+                self.logger.error('unknown command [{}] for job[{}]'.format(row['command'], row['target']))
+        if pipelines:
+            self.__load_pipelines()
+
+    def __reload_job(self, job):
+        """
+        re-import module of an idle job and swap in a new instance, keep the
+        old module and instance if anything fails
+        """
+        job['reload'] = False
+        jobname = job['name']
+        old = job['inst']
+        modname, clsname = jobname.split('#')
+        module = sys.modules.get(modname)
+        saved = dict(module.__dict__) if module is not None else None
+        try:
+            module = importlib.reload(module) if module is not None else importlib.import_module(modname)
+            inst = getattr(module, clsname)()
+            inst.set_logger(self.logger)
+            inst.import_state(old.export_state())
+        except Exception as e:
+            if saved is not None:
+                # reload executes the new code in the same module object
+                module.__dict__.clear()
+                module.__dict__.update(saved)
+            self.logger.error('job[{}] reload failed, keep running old code, ex: {}'.format(jobname, e))
+            PollingServiceDBHelper.update_jobstatus(jobname, 'warn,reload')
+            return False
+
+        job['inst'] = inst
+        self.__attach_queues(job)
+        self.__unregister_triggers(jobname)
+        self.__register_triggers(jobname, inst.triggers())
+        if jobname == __class__.SERVICE_JOB_NAME:
+            inst.set_daemon(self)
+        self.logger.info('job[{}] reloaded'.format(jobname))
+        PollingServiceDBHelper.update_jobstatus(jobname, 'good,reloaded')
+        return True
+
+    def __unregister_triggers(self, jobname):
+        for watches in (self.path_watches, self.table_watches):
+            for key in watches:
+                watches[key] = [w for w in watches[key] if w[0] != jobname]
+        self.watch_seen = {k: v for k, v in self.watch_seen.items() if k[1] != jobname}
+    ### end of hot reload ###
+
+    ### start of sharded mode ###
+    def __read_channel(self):
+        for line in self.channel.makefile('r'):
+            self.inbox.put(json.loads(line))
+            self.__wake()
+        # leader is gone, nobody can stop or reassign us anymore
+        self.logger.error('channel to leader closed, exit')
+        eve.common.shutdown_logger()
+        os._exit(1)
+
+    def __handle_messages(self):
+        while not self.inbox.empty():
+            msg = self.inbox.get()
+            if 'assign' in msg:
+                self.assign_jobs(msg['assign'])
+
+    def assign_jobs(self, jobnames):
+        jobnames = set(jobnames)
+        for name, job in self.jobs.items():
+            if name not in jobnames and not job['retired']:
+                self.logger.info('job[{}] moved to another worker'.format(name))
+                job['retired'] = True
+        rows = PollingServiceDBHelper.get_jobstatus()
+        self.__add_jobs([row for row in rows if row['jobname'] in jobnames])
+        self.__load_pipelines()
+    ### end of sharded mode ###
+
+    def sighdr(self, sig, frame):
+        # stop from the scheduling loop, not in the middle of a db write
         print('Receive signal, stop now')
-        PollingServiceDBHelper.setdaemoninfo("", "")
+        self.stopping = True
+        self.__wake()
+
+    def __stop(self):
+        self.__flush_history(time.monotonic(), force=True)
+        if self.channel is None:
+            PollingServiceDBHelper.setdaemoninfo("", "")
+        eve.common.shutdown_logger()
         os._exit(0)
 
     def run_daemon(self):
-        r = os.fork()
-        if r < 0:
-            return False
-        if r > 0:
-            print('daemon start running in pid[{}]'.format(r))
-            return True
+        return daemonize(self.run, self.sighdr)
+
+def daemonize(run, sighdr):
+    r = os.fork()
+    if r < 0:
+        return False
+    if r > 0:
+        print('daemon start running in pid[{}]'.format(r))
+        return True
+
+    # child process here
+    pid = os.getpid()
+    signal.signal(signal.SIGUSR1, sighdr)
+    import psutil
+    cmdline = ' '.join(psutil.Process(pid).cmdline())
+    PollingServiceDBHelper.setdaemoninfo(pid, cmdline)
+    run()
 
-        # child process here
-        pid = os.getpid()
-        signal.signal(signal.SIGUSR1, PollingDaemon.sighdr)
-        cmdline = ' '.join(psutil.Process(pid).cmdline())
-        PollingServiceDBHelper.setdaemoninfo(pid, cmdline)
-        self.run()
+class PollingLeader:
+    """
+    owns the job table and shards jobs over `nworkers` forked PollingDaemon
+    processes by rendezvous hashing, so only the jobs of a dead worker move
+    """
+    RELOAD_INTERVAL = PollingDaemon.SERVICE_JOB_INTERVAL
+    RESPAWN_DELAY = 5
+    # longest wait for records of stopping workers
+    STOP_LOG_WAIT = 5
+
+    def __init__(self, nworkers, loglevel = 'DEBUG', logfile = 'stdout', logjson = False, logrotate = None):
+        eve.common.enable_logger(
+            loglevel = loglevel,
+            loggername = 'PollingLeader',
+            logfile = logfile,
+            queued = True,
+            logjson = logjson,
+            logrotate = logrotate
+        )
+        self.logger = eve.common.logger()
+        self.loglevel = loglevel
+        # workers send their records to the leader, which writes (and
+        # rotates) the log file, see __spawn
+        self.logfile = logfile
+        self.jobnames = []
+        self.groups = {} # jobname => pipeline group, see pipeline_groups
+        self.reload_ts = 0
+        self.dirty = True
+        self.slots = [{'idx': idx, 'pid': None, 'sock': None, 'logsock': None, 'receiver': None,
+                'jobs': None, 'respawn_ts': 0} for idx in range(nworkers)]
+
+    @staticmethod
+    def owner(jobname, slots):
+        def score(slot):
+            key = '{}#{}'.format(slot['idx'], jobname).encode()
+            return hashlib.md5(key).hexdigest()
+        return max(slots, key=score)
+
+    @staticmethod
+    def pipeline_groups(pipelines):
+        """
+        map each job connected by `pipelines` to the smallest jobname of its
+        connected group
+        """
+        parent = {}
+        def find(name):
+            while parent.setdefault(name, name) != name:
+                name = parent[name]
+            return name
+        for p in pipelines:
+            a, b = find(p['producer']), find(p['consumer'])
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+        return {name: find(name) for name in parent}
+
+    def __spawn(self, slot):
+        import socket
+        parent_sock, child_sock = socket.socketpair()
+        parent_log, child_log = socket.socketpair() if self.logfile != 'none' else (None, None)
+        pid = os.fork()
+        if pid == 0:
+            parent_sock.close()
+            if parent_log is not None:
+                parent_log.close()
+            for other in self.slots:
+                if other['sock'] is not None:
+                    other['sock'].close()
+                if other['logsock'] is not None:
+                    other['logsock'].close()
+            signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+            signal.signal(signal.SIGUSR2, signal.SIG_DFL)
+            PollingServiceDBHelper.resetdb()
+            try:
+                PollingDaemon(self.loglevel, channel=child_sock,
+                        logfile=child_log if child_log is not None else 'none').run()
+            finally:
+                eve.common.shutdown_logger()
+                os._exit(1)
+
+        child_sock.close()
+        if parent_log is not None:
+            child_log.close()
+            # ends when the worker exits and its end of the socket is closed
+            receiver = threading.Thread(target=self.__receive_logs, args=(slot, parent_log),
+                    name='logs[{}]'.format(slot['idx']))
+            receiver.daemon = True
+            receiver.start()
+            slot['receiver'] = receiver
+        slot['pid'] = pid
+        slot['sock'] = parent_sock
+        slot['logsock'] = parent_log
+        slot['jobs'] = None
+        self.dirty = True
+        self.logger.info('worker[{}] started in pid[{}]'.format(slot['idx'], pid))
+        self.__save_workers()
+
+    def __receive_logs(self, slot, sock):
+        eve.common.receive_logs(sock)
+        if slot['logsock'] is sock:
+            slot['logsock'] = None
+
+    def __lost(self, slot):
+        slot['sock'].close()
+        slot['pid'] = None
+        slot['sock'] = None
+        slot['jobs'] = None
+        slot['respawn_ts'] = time.monotonic() + __class__.RESPAWN_DELAY
+        self.dirty = True
+        self.__save_workers()
+
+    def __save_workers(self):
+        PollingServiceDBHelper.setworkerinfo([s['pid'] for s in self.slots if s['pid'] is not None])
+
+    def __reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            for slot in self.slots:
+                if slot['pid'] == pid:
+                    self.logger.error('worker[{}] pid[{}] died with status {}, rebalance'
+                            .format(slot['idx'], pid, status))
+                    self.__lost(slot)
+
+    def __reload(self):
+        rows = PollingServiceDBHelper.get_jobstatus()
+        jobnames = sorted([r['jobname'] for r in rows if not r['status'].startswith('err')])
+        groups = __class__.pipeline_groups(PollingServiceDBHelper.get_pipelines())
+        if jobnames != self.jobnames or groups != self.groups:
+            self.jobnames = jobnames
+            self.groups = groups
+            self.dirty = True
+        self.reload_ts = time.monotonic() + __class__.RELOAD_INTERVAL
+
+    def __rebalance(self):
+        live = [slot for slot in self.slots if slot['pid'] is not None]
+        if len(live) == 0:
+            return
+        shards = {slot['idx']: [] for slot in live}
+        for jobname in self.jobnames:
+            # jobs connected by pipelines share in-memory queues, so they are
+            # placed by the name of their group instead of their own name
+            key = self.groups.get(jobname, jobname)
+            shards[__class__.owner(key, live)['idx']].append(jobname)
+        for slot in live:
+            jobs = shards[slot['idx']]
+            if jobs == slot['jobs']:
+                continue
+            try:
+                slot['sock'].sendall((json.dumps({'assign': jobs}) + '\n').encode())
+                slot['jobs'] = jobs
+                self.logger.debug('worker[{}] assigned {} job(s)'.format(slot['idx'], len(jobs)))
+            except OSError as e:
+                self.logger.error('worker[{}] unreachable, ex: {}'.format(slot['idx'], e))
+                os.kill(slot['pid'], signal.SIGKILL)
+        self.dirty = False
+
+    def sighdr(self, sig, frame):
+        print('Receive signal, stop workers now')
+        for slot in self.slots:
+            if slot['pid'] is not None:
+                # workers flush their run history before exit
+                os.kill(slot['pid'], signal.SIGUSR1)
+        # their last records come through the log sockets
+        deadline = time.monotonic() + __class__.STOP_LOG_WAIT
+        for slot in self.slots:
+            if slot['receiver'] is not None:
+                slot['receiver'].join(max(deadline - time.monotonic(), 0))
+        PollingServiceDBHelper.setworkerinfo([])
+        PollingServiceDBHelper.setdaemoninfo("", "")
+        eve.common.shutdown_logger()
+        os._exit(0)
+
+    def sigforward(self, sig, frame):
+        for slot in self.slots:
+            if slot['pid'] is not None:
+                os.kill(slot['pid'], sig)
+
+    def run(self):
+        signal.signal(signal.SIGUSR1, self.sighdr)
+        signal.signal(signal.SIGUSR2, self.sigforward)
+        while True:
+            self.__reap()
+            now = time.monotonic()
+            for slot in self.slots:
+                if slot['pid'] is None and now >= slot['respawn_ts']:
+                    self.__spawn(slot)
+            if now >= self.reload_ts:
+                self.__reload()
+            if self.dirty:
+                self.__rebalance()
+            time.sleep(1)
+
+    def run_daemon(self):
+        return daemonize(self.run, self.sighdr)
 
 class PollingServiceCLI(CmdBase):
     version = '1.0.0'
@@ -297,22 +1624,34 @@ class PollingServiceCLI(CmdBase):
 
     def _prepare_parser(self, parser):
         parser.add_argument('params', nargs='*', default=[])
+        parser.add_argument('--workers', '-w', type=int, default=1,
+                help='number of worker processes sharing the jobs, default: 1')
 
     def _run(self):
         PollingServiceDBHelper.setupdb(self._db())
-        cp = CliParser()
+        return self._cli_invoke(self.__build_parser, self._args.params)
+
+    def _cli_builder(self):
+        return self.__build_parser
 
+    def __build_parser(self, cp):
         cp.add_command(['start'],            inst=self, func=PollingServiceCLI.start,     help="start polling service")
         cp.add_command(['start', 'debug'],   inst=self, func=PollingServiceCLI.start,     help="start polling service in foreground mode", default_args={'debug': True})
         cp.add_command(['stop'],             inst=self, func=PollingServiceCLI.stop,      help="stop polling service")
         cp.add_command(['restart'],          inst=self, func=PollingServiceCLI.restart,   help="restart polling service")
         cp.add_command(['status'],           inst=self, func=PollingServiceCLI.status,    help="show status of polling service")
         cp.add_command(['jobstatus'],        inst=self, func=PollingServiceCLI.jobstatus, help="show status of polling jobs")
+        cp.add_command(['trigger', '@jobname'], inst=self, func=PollingServiceCLI.trigger, help="run a polling job as soon as possible")
+        cp.add_command(['reload', '@jobname'], inst=self, func=PollingServiceCLI.reload, help="reload code of a polling job without restarting service")
+        cp.add_command(['memory'],           inst=self, func=PollingServiceCLI.memory,    help="show memory usage and top allocation sites of polling service")
+        cp.add_command(['memory', 'start'],  inst=self, func=PollingServiceCLI.memory,    help="start tracing memory allocations of polling service", default_args={'action': 'start'})
+        cp.add_command(['memory', 'stop'],   inst=self, func=PollingServiceCLI.memory,    help="stop tracing memory allocations of polling service", default_args={'action': 'stop'})
+        cp.add_command(['history'],          inst=self, func=PollingServiceCLI.history,   help="show daily run history of polling jobs in last 7 days")
+        cp.add_command(['history', '@jobname'], inst=self, func=PollingServiceCLI.history, help="show daily run history of a polling job in last 7 days")
+        cp.add_command(['history', '@jobname', '@days(int)'], inst=self, func=PollingServiceCLI.history, help="show run history of a polling job in last n days, hourly if n <= 2")
 
         cp.add_command(['dummyjob'],         inst=self, func=PollingServiceCLI.dummyjob,  help='insert dummy job')
 
-        cp.invoke(self._args.params)
-
     def dummyjob(self):
         PollingServiceAPI.add_job(TestJob, 5)
 
@@ -321,6 +1660,7 @@ class PollingServiceCLI(CmdBase):
         if pid is None or len(pid) == 0:
             return False
 
+        import psutil
         try:
             process = psutil.Process(int(pid))
         except:
@@ -333,10 +1673,21 @@ class PollingServiceCLI(CmdBase):
         if self.__is_running():
             self.loginfo('polling service already started')
             return True
+        loglevel = 'DEBUG' if debug else 'INFO'
+        # daemon logs to stdout unless a log file is given
+        logargs = {
+            'logfile': self._args.logfile if self._args.logfile not in ['stderr', 'stdout', 'none'] else 'stdout',
+            'logjson': self._args.logjson,
+            'logrotate': self._args.logrotate,
+        }
+        if self._args.workers > 1:
+            daemon = PollingLeader(self._args.workers, loglevel, **logargs)
+        else:
+            daemon = PollingDaemon(loglevel, **logargs)
         if not debug:
-            return PollingDaemon('INFO').run_daemon()
+            return daemon.run_daemon()
         else:
-            return PollingDaemon('DEBUG').run()
+            return daemon.run()
 
     def stop(self):
         if not self.__is_running():
@@ -352,6 +1703,9 @@ class PollingServiceCLI(CmdBase):
     def status(self):
         if self.__is_running():
             print("Polling Service is running")
+            workers = PollingServiceDBHelper.getworkerinfo()
+            if len(workers) != 0:
+                print("Worker pids: {}".format(', '.join([str(p) for p in workers])))
             return True
 
         db = self._db()
@@ -362,24 +1716,174 @@ class PollingServiceCLI(CmdBase):
             print("Polling Service is not running")
         return True
 
+    def trigger(self, jobname):
+        if not PollingServiceAPI.trigger(jobname):
+            self.loginfo('polling service not running, job[{}] will run on next start'.format(jobname))
+        return True
+
+    def reload(self, jobname):
+        if not PollingServiceAPI.reload_job(jobname):
+            self.loginfo('polling service not running, job[{}] will load new code on next start'.format(jobname))
+        else:
+            self.loginfo('reload of job[{}] requested, see jobstatus for result'.format(jobname))
+        return True
+
+    def memory(self, action = 'snapshot'):
+        reports = PollingServiceAPI.memory(action)
+        if reports is None:
+            self.loginfo('polling service not running')
+            return False
+        mib = lambda n: '{:.1f} MiB'.format(n / 1048576)
+        for report in reports:
+            print('pid {} rss {}'.format(report['pid'], mib(report['rss'])))
+            if not report['tracing']:
+                print('  memory profiler not running, start it with "memory start"')
+                continue
+            print('  traced {} peak {}'.format(mib(report['traced']), mib(report['peak'])))
+            print('  jobs (since start / since last snapshot):')
+            for name, group in sorted(report['groups'].items(), key=lambda g: -g[1]['since_baseline']):
+                print('    {} {} ({:+.1f} KiB / {:+.1f} KiB)'.format(name, mib(group['size']),
+                        group['since_baseline'] / 1024, group['since_previous'] / 1024))
+            print('  top allocation sites:')
+            for site in report['top']:
+                print('    {} {:.1f} KiB in {} blocks'.format(site['site'], site['size'] / 1024, site['count']))
+            print('  growth since start:')
+            for site in report['growth']:
+                print('    {} {:+.1f} KiB {:+d} blocks'.format(site['site'], site['size_diff'] / 1024, site['count_diff']))
+        return True
+
     def jobstatus(self):
         PollingServiceDBHelper.setupdb(self._db())
         rows = PollingServiceDBHelper.get_jobstatus()
         print('Total {} jobs'.format(len(rows)))
+        with eve.common.Table([{'name': 'jobname', 'title': 'job'}, {'name': 'status'}]) as table:
+            for row in rows:
+                table.add(row)
+
+    def history(self, jobname = None, days = 7):
+        bucket = 3600 if days <= 2 else 86400
+        # local days, not utc ones
+        rows = PollingServiceDBHelper.get_run_trend(time.time() - days * 86400, bucket, jobname,
+                time.localtime().tm_gmtoff)
+        fmt = '%Y-%m-%d %H:00' if bucket == 3600 else '%Y-%m-%d'
+        current = None
         for row in rows:
-            print('{} ... {}'.format(row['jobname'], row['status']))
+            if row['jobname'] != current:
+                current = row['jobname']
+                print(current)
+            avg = row['total_duration'] / row['runs'] if row['runs'] else 0
+            print('  {} runs {:>5} succ {:>5} fail {:>3} timeout {:>3} items {:>7} avg {:>7.2f}s max {:>7.2f}s'.format(
+                time.strftime(fmt, time.localtime(row['bucket'])), row['runs'], row['succ'],
+                row['fail'], row['timeout'], row['items'] or 0, avg, row['max_duration'] or 0))
+        if current is None:
+            print('No run history')
 
 class PollingServiceAPI:
     @staticmethod
     def __to_jobname(polling_job):
+        if isinstance(polling_job, str):
+            return polling_job
         if not isinstance(polling_job, type):
             polling_job = type(polling_job)
         return '#'.join([polling_job.__module__, polling_job.__name__])
 
     @staticmethod
-    def add_job(polling_job, interval, enable = True):
+    def add_job(polling_job, interval = None, enable = True, timeout = None, priority = None, cron = None):
+        """
+        register `polling_job` to run every `interval` seconds, or at times
+        matching `cron` expression (see CronSchedule) when given
+        """
+        jobname = PollingServiceAPI.__to_jobname(polling_job)
+        if cron:
+            CronSchedule(cron).next_fire(time.time())
+        return PollingServiceDBHelper.update_job(jobname, interval = interval, enable = enable,
+                timeout = timeout, priority = priority, cron = cron)
+
+    @staticmethod
+    def trigger(polling_job):
+        """
+        ask the running daemon to run `polling_job` right away,
+        return False if the daemon could not be notified
+        """
+        jobname = PollingServiceAPI.__to_jobname(polling_job)
+        PollingServiceDBHelper.add_trigger(jobname)
+        return PollingServiceAPI.__notify_daemon()
+
+    @staticmethod
+    def reload_job(polling_job):
+        """
+        ask the running daemon to re-import module of `polling_job` and swap
+        in a new instance once the job is idle, state is carried over by
+        PollingJob.export_state() and import_state(state). on failure the
+        old code keeps running and job status becomes warn,reload
+        """
         jobname = PollingServiceAPI.__to_jobname(polling_job)
-        return PollingServiceDBHelper.update_job(jobname, interval = interval, enable = enable)
+        PollingServiceDBHelper.add_command(jobname, 'reload')
+        return PollingServiceAPI.__notify_daemon()
+
+    @staticmethod
+    def add_pipeline(name, producer, consumer, maxsize = None):
+        """
+        connect `producer` to `consumer` by bounded in-memory queue `name`
+        of `maxsize` items (default PollingDaemon.PIPELINE_MAXSIZE). the
+        producer calls PollingJob.emit(name, item), the consumer is triggered
+        when items arrive and takes them with PollingJob.consume(name), items
+        it leaves wait for its next scheduled run. the producer is not
+        started while the queue is full. queued items are lost when the
+        daemon stops
+        """
+        producer = PollingServiceAPI.__to_jobname(producer)
+        consumer = PollingServiceAPI.__to_jobname(consumer)
+        PollingServiceDBHelper.update_pipeline(name, producer, consumer, maxsize)
+        for jobname in (producer, consumer):
+            PollingServiceDBHelper.add_command(jobname, 'pipelines')
+        return PollingServiceAPI.__notify_daemon()
+
+    @staticmethod
+    def remove_pipeline(name):
+        pipeline = PollingServiceDBHelper.delete_pipeline(name)
+        if pipeline is None:
+            return False
+        for jobname in (pipeline['producer'], pipeline['consumer']):
+            PollingServiceDBHelper.add_command(jobname, 'pipelines')
+        return PollingServiceAPI.__notify_daemon()
+
+    @staticmethod
+    def memory(action = 'snapshot', wait = 10):
+        """
+        send memory profiler `action` (start|snapshot|stop) to the daemon or
+        each of its workers, return their reports (see MemoryProfiler), or
+        None if the daemon is not running
+        """
+        pid, _ = PollingServiceDBHelper.getdaemoninfo()
+        if pid is None or len(pid) == 0:
+            return None
+        pids = PollingServiceDBHelper.getworkerinfo() or [int(pid)]
+        ts = time.time()
+        for p in pids:
+            PollingServiceDBHelper.add_command('pid:{}'.format(p), 'memory {}'.format(action))
+        if not PollingServiceAPI.__notify_daemon():
+            return None
+        reports = {}
+        deadline = time.monotonic() + wait
+        while len(reports) != len(pids) and time.monotonic() < deadline:
+            time.sleep(0.2)
+            for p in pids:
+                report = PollingServiceDBHelper.getmemoryreport(p)
+                if report is not None and report['ts'] >= ts:
+                    reports[p] = report
+        return [reports[p] for p in pids if p in reports]
+
+    @staticmethod
+    def __notify_daemon():
+        pid, _ = PollingServiceDBHelper.getdaemoninfo()
+        if pid is None or len(pid) == 0:
+            return False
+        try:
+            os.kill(int(pid), signal.SIGUSR2)
+        except (ProcessLookupError, PermissionError):
+            return False
+        return True
 
     @staticmethod
     def enable_job(polling_job, enable=True):
@@ -389,7 +1893,23 @@ class PollingServiceAPI:
     @staticmethod
     def set_job_interval(polling_job, interval):
         jobname = PollingServiceAPI.__to_jobname(polling_job)
-        return PollingServiceDBHelper.update_job(jobname, interval = interval)
+        return PollingServiceDBHelper.update_job(jobname, interval = interval, cron = '')
+
+    @staticmethod
+    def set_job_cron(polling_job, cron):
+        jobname = PollingServiceAPI.__to_jobname(polling_job)
+        CronSchedule(cron).next_fire(time.time())
+        return PollingServiceDBHelper.update_job(jobname, cron = cron)
+
+    @staticmethod
+    def set_job_priority(polling_job, priority):
+        jobname = PollingServiceAPI.__to_jobname(polling_job)
+        return PollingServiceDBHelper.update_job(jobname, priority = priority)
+
+    @staticmethod
+    def set_job_timeout(polling_job, timeout):
+        jobname = PollingServiceAPI.__to_jobname(polling_job)
+        return PollingServiceDBHelper.update_job(jobname, timeout = timeout)
 
 class TestJob(PollingJob):
     def __init__(self):
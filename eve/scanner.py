@@ -0,0 +1,101 @@
+#!/usr/bin/python
+# vim: set expandtab:
+
+import os
+import sys
+
+def stamp(file):
+    """
+    (mtime, size) of the directory of module `file` (its __init__.py) and of
+    the file itself, changed when the module is edited or files are added,
+    removed or renamed in its directory
+    """
+    dst = os.stat(os.path.dirname(file))
+    st = os.stat(file)
+    return (dst.st_mtime_ns, st.st_mtime_ns, st.st_size)
+
+def digest(file):
+    """
+    hash of module `file` and the names of sources next to it, for stamps
+    changed by a touch or a save without changes
+    """
+    import hashlib
+    h = hashlib.sha1()
+    with open(file, 'rb') as f:
+        h.update(f.read())
+    for name in sorted(os.listdir(os.path.dirname(file))):
+        if name.endswith('.py'):
+            h.update(b'\0' + os.fsencode(name))
+    return h.hexdigest()
+
+def scan(m):
+    """
+    what eve needs of module `m`, stamped before it is imported, so a change
+    made while importing is seen by the next scan
+    """
+    import importlib
+    import importlib.util
+    spec = importlib.util.find_spec(m)
+    if spec is None or spec.origin is None:
+        raise ImportError('module {} not found'.format(m))
+    result = {
+        'file': spec.origin,
+        'stamp': stamp(spec.origin),
+        'digest': digest(spec.origin),
+    }
+    mod = importlib.import_module(m)
+    classes = mod.__all__
+    result['desc'] = mod.__desc__
+    result['classes'] = {k: v for k, v in mod.__classmap__.items() if k in classes}
+    result['alias'] = {k: v for k, v in getattr(mod, '__alias__', {}).items() if v in classes}
+    result['complete'] = {k: dict(hints) for k, hints in getattr(mod, '__completion__', {}).items() if k in classes}
+    return result
+
+def build_trees(classes, dbfile):
+    """
+    cache the CliParser trees of `classes` [(module, name, classname), ...]
+    in the cache dir of `dbfile`, for eve system complete to offer commands
+    never run. return names of classes with a tree, classes failing to
+    build are reported to stderr
+    """
+    import importlib
+    import eve.common
+    eve.common.set_dbfilepath(dbfile)
+    built = []
+    for m, name, classname in classes:
+        try:
+            mod = importlib.import_module('{}.{}'.format(m, name))
+            inst = getattr(mod, classname)(name, None, classname)
+            build = inst._cli_builder()
+            if build is not None:
+                inst._cli_parser(build)
+                built.append(name)
+        except Exception as e:
+            sys.stderr.write('failed to build tree of "{}": {}\n'.format(name, e))
+    return built
+
+def main():
+    """
+    python -m eve.scanner <module> [<dbfile>], write the scan of module as
+    marshal to stdout, with the names of classes whose trees are cached for
+    `dbfile` if given.
+    python -m eve.scanner --trees <dbfile> <module>:<name>:<classname> ...,
+    only cache the trees, write the names of classes with a tree.
+    output of modules while imported goes to stderr
+    """
+    import marshal
+    out = os.fdopen(os.dup(1), 'wb')
+    os.dup2(2, 1)
+    if sys.argv[1] == '--trees':
+        result = build_trees([tuple(c.split(':', 2)) for c in sys.argv[3:]], sys.argv[2])
+    else:
+        result = scan(sys.argv[1])
+        if len(sys.argv) > 2:
+            result['trees'] = build_trees([(sys.argv[1], k, v) for k, v in result['classes'].items()], sys.argv[2])
+    sys.stdout.flush()
+    marshal.dump(result, out)
+    out.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+#!/usr/bin/python
+# vim: set expandtab:
+
+import os
+import sys
+import threading
+
+class StackSampler:
+    """
+    sample the stack of one thread from a background thread, so time spent
+    blocked (db, network, subprocesses) is seen too. dump() writes collapsed
+    stacks, one `frame;frame;... count` per line, the input format of
+    flamegraph.pl, inferno and speedscope
+    """
+    INTERVAL = 0.001
+
+    def __init__(self, thread_id = None, interval = None):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval if interval is not None else __class__.INTERVAL
+        self.stacks = {}
+        self.samples = 0
+        self.__names = {}
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def __name(self, code):
+        name = self.__names.get(code)
+        if name is None:
+            name = '{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename),
+                    code.co_firstlineno).replace(';', ':')
+            self.__names[code] = name
+        return name
+
+    def __sample(self):
+        while not self.__stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(self.__name(frame.f_code))
+                frame = frame.f_back
+            if len(stack) == 0:
+                continue
+            key = ';'.join(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def start(self):
+        self.__stop.clear()
+        self.__thread = threading.Thread(target=self.__sample, name='stack-sampler', daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        if self.__thread is None:
+            return
+        self.__stop.set()
+        self.__thread.join()
+        self.__thread = None
+
+    def dump(self, filename):
+        with open(filename, 'w') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write('{} {}\n'.format(stack, count))
@@ -12,3 +12,7 @@ __classmap__ = {
 __alias__ = {
         'fl': 'filelist',
         }
+__completion__ = {
+        'comic': {'id': 'list.id', 'idlist': 'list.id'},
+        'connect': {'machine': 'server.mach'},
+        }
@@ -1,15 +1,13 @@
 #!/usr/bin/python
 # vim: ts=4:sw=4:expandtab
-import argparse
-from eve.cliparser import CliParser
-from eve.polling_service import PollingJob, PollingServiceAPI
-import requests
+from eve.polling_job import PollingJob
 import re
 import unicodedata
 import time
 import random
 
 from cmdbase import CmdBase
+import eve.common
 from eve.common import *
 
 PROGNAME = 'Comic'
@@ -54,6 +52,7 @@ class ComicDBConstant:
 
 class ComicScanner:
     BASEURL = 'https://www.manhuagui.com'
+    TIMEOUT = 30
 
     @staticmethod
     def scan_url(url):
@@ -65,9 +64,13 @@ class ComicScanner:
                 'upgrade-insecure-requests': '1',
                 'user-agent': 'Mozilla/5.0 (Windows NT 6.3; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/72.0.3626.109 Safari/537.36',
                 }
+        import requests
         ret = {'s': 'good'}
         try:
-            r = requests.get(url, headers = headers)
+            with eve.common.span('http', method='GET', url=url) as span:
+                r = requests.get(url, headers = headers, timeout = ComicScanner.TIMEOUT)
+                span.set('status', r.status_code)
+                span.set('bytes', len(r.content))
             content = r.content.decode()
         except Exception as e:
             # self.logerror('Failed to get content from {}'.format(url))
@@ -116,6 +119,10 @@ class ComicScanner:
             return ComicScanner.RET_UPDATED
 
 class ComicJob(PollingJob):
+    batch_items = 10
+    # number of comics scanned at the same time within a batch
+    concurrency = 2
+
     def __init__(self):
         super().__init__(PROGNAME)
         self.comic_list = []
@@ -133,15 +140,39 @@ class ComicJob(PollingJob):
             self.logger.error('No record in comic database')
             return False
         
-        row = self.comic_list.pop()
-        ret = ComicScanner.scan_one(row, self._db())
+        self.__scan(self.comic_list.pop())
+        return True
+
+    def process_batch(self, budget):
+        self.fetch_list()
+        if len(self.comic_list) == 0:
+            self.logger.error('No record in comic database')
+            return 0
+
+        from concurrent.futures import ThreadPoolExecutor
+        # spans of the pool threads belong to the trace of this run
+        parent = eve.common.current_span()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            # stop at the end of the list, next tick fetches it again
+            while len(self.comic_list) != 0 and not budget.exhausted():
+                n = min(self.concurrency, len(self.comic_list))
+                if budget.remaining_items() is not None:
+                    n = min(n, budget.remaining_items())
+                rows = [self.comic_list.pop() for _ in range(n)]
+                list(pool.map(lambda row: self.__scan(row, parent), rows))
+                budget.consume(n)
+        return budget.used
+
+    def __scan(self, row, parent = None):
+        with eve.common.span('comic.scan', parent=parent, comic=row['name']):
+            ret = ComicScanner.scan_one(row, self._db())
         if ret not in [ComicScanner.RET_UPDATED, ComicScanner.RET_UPTODATE]:
             self.logger.error('scan {} failed, result: {}'.format(row['name'], ret))
         elif ret == ComicScanner.RET_UPDATED:
             self.logger.info('{} updated'.format(row['name']))
         else:
             self.logger.debug('no update for {}'.format(row['name']))
-        return True
+        return ret
 
 class Comic(CmdBase):
 
@@ -199,13 +230,19 @@ class Comic(CmdBase):
         rows = self.__list_comics(filter)
         print('Total {} records'.format(len(rows)))
 
+        # every column has a width, rows are printed as they come
+        table = eve.common.Table([
+            {'name': 'id', 'width': 3, 'align': '>'},
+            {'name': 'name', 'width': 40, 'cut': True},
+            {'name': 'status', 'width': 7},
+            {'name': 'url'},
+        ], sep=' | ', header=False)
         for row in rows:
-            name = self._cut_str(row['name'], 40)
-            status = row['status']
-            print('{:3d} | {} | {} | {}'.format(row['id'], name, status, row['url']))
-            print('    > viewed {}({}) {}'.format(row['viewed_episode'], row['viewed_update'], row['viewed_url']))
-            print('    > latest {}({}) {}'.format(row['latest_episode'], row['latest_update'], row['latest_url']))
-            print('-' * 80)
+            table.add(row)
+            table.text('    > viewed {}({}) {}'.format(row['viewed_episode'], row['viewed_update'], row['viewed_url']))
+            table.text('    > latest {}({}) {}'.format(row['latest_episode'], row['latest_update'], row['latest_url']))
+            table.text('-' * 80)
+        table.close()
 
         if reset:
             if filter is None or len(filter) == 0:
@@ -262,11 +299,18 @@ class Comic(CmdBase):
             self.loginfo('mark {} as viewed'.format(row['name']))
 
     def daemon_enable(self, enable):
+        # the polling service is heavy to import, only this command needs it
+        from eve.polling_service import PollingServiceAPI
         PollingServiceAPI.add_job(ComicJob, interval=60, enable=enable)
 
     def _run(self):
         self.__setup_db()
-        cp = CliParser()
+        return self._cli_invoke(self.__build_parser, self._args.params)
+
+    def _cli_builder(self):
+        return self.__build_parser
+
+    def __build_parser(self, cp):
         cp.register_help_keywords('?')
         cp.add_command(['list'], inst=self, func=Comic.run_list, help="list all comics")
         cp.add_command(['list', '@filter'], inst=self, func=Comic.run_list, help="list @filter comics, filter: updated, error")
@@ -281,8 +325,6 @@ class Comic(CmdBase):
         cp.add_command(['daemon'], help="config comic daemon", hidden=True)
         cp.add_command(['daemon', 'enable', '@enable(bool)'], inst=self, func=Comic.daemon_enable, help="enable daemon feature", hidden=True)
 
-        cp.invoke(self._args.params)
-
 
     # =======================
 
@@ -290,17 +332,7 @@ class Comic(CmdBase):
         parser.add_argument('params', nargs='*', default=[])
 
     def _cut_str(self, _str, _len):
-        _str = str(_str)
-        if cht_width(_str) <= _len:
-            return '{{:{}}}'.format(_len - cht_len(_str)).format(_str)
-        for i in range(0, _len):
-            r = _str[0:i] + " ..."
-            clen = cht_width(r)
-            if clen == _len:
-                return r
-            if clen == _len - 1:
-                return r + ' '
-        raise None # should not come here
+        return pad_width(cut_width(str(_str), _len), _len)
 
 if __name__ == '__main__':
     Comic(PROGNAME).run()
@@ -5,6 +5,7 @@ import subprocess
 import os
 
 from cmdbase import CmdBase
+import eve.common
 
 class Connect(CmdBase):
 
@@ -46,11 +47,14 @@ class Connect(CmdBase):
     def __run_list(self):
         db = self._db()
         res = db.table_select(self.__table)
-        print('{:12} {}'.format('machine', 'target'))
-        print('------------ ------------')
+        table = eve.common.Table([
+            {'name': 'mach', 'title': 'machine', 'width': 12},
+            {'name': 'target', 'width': 12},
+        ])
         for r in res:
             target = self.__build_target_str(r['user'], r['addr'], r['port'])
-            print('{:12} {}'.format(r['mach'], target))
+            table.add({'mach': r['mach'], 'target': target})
+        table.close()
         self.loginfo('Total {} alias(es) in db'.format(len(res)))
         return 0
 
@@ -112,7 +116,7 @@ class Connect(CmdBase):
         self.loginfo('Connect to {}'.format(target))
 
         server = '{}@{}'.format(user, addr) if user != '-' else addr
-        cmdline = ['ssh', '-p', str(port), server]
+        cmdline = [self._required_path('ssh'), '-p', str(port), server]
 
         self.logdebug('Run command: {}'.format(cmdline))
         try:
@@ -134,7 +138,7 @@ class Connect(CmdBase):
         # ssh-copy-id -i ~/.ssh/id_rsa.pub root@{target}
         keyfile = os.path.expanduser('~/.ssh/id_rsa.pub')
         target = '{}@{}'.format(user, addr) if user != '-' else addr
-        cmdline = ['ssh-copy-id', '-i', keyfile, '-p', str(port), target]
+        cmdline = [self._required_path('ssh-copy-id'), '-i', keyfile, '-p', str(port), target]
         self.loginfo('Copying ~/.ssh/id_rsa.pub to server')
         self.logdebug('Run command: {}'.format(cmdline))
         r = subprocess.call(cmdline)
@@ -4,7 +4,6 @@ import csv
 import sys
 from cmdbase import CmdBase
 from eve.database import EveDB
-from eve.cliparser import CliParser
 
 class Einvoice(CmdBase):
     version = '1.0.0'
@@ -17,7 +16,12 @@ class Einvoice(CmdBase):
         parser.add_argument('params', nargs='*', default=[])
 
     def _run(self):
-        cp = CliParser()
+        return self._cli_invoke(self.__build_parser, self._args.params)
+
+    def _cli_builder(self):
+        return self.__build_parser
+
+    def __build_parser(self, cp):
         cp.add_command(['parse', 'from', '@files...'], 
                         inst=self, func=Einvoice.do_parse,
                         help="parse einvoce aggregated file(s), output to stdout")
@@ -25,8 +29,6 @@ class Einvoice(CmdBase):
                         inst=self, func=Einvoice.do_parse,
                         help="parse einvoce aggregated file(s), output to @\{outfile\}_meta.csv, and @\{outfile\}_detial.csv")
 
-        cp.invoke(self._args.params)
-
     def do_parse(self, files, outfile=None):
         all_metas = []
         all_details = []
@@ -50,7 +50,7 @@ class FileList(CmdBase):
       if len(args.basedir) == 1 and not os.path.isdir(args.basedir[0]):
          singlefile = True
 
-      cmd = ['grep', '-nr', nocase, args.pattern] + args.basedir
+      cmd = [self._required_path('grep'), '-nr', nocase, args.pattern] + args.basedir
       cmd = [c for c in cmd if c]
       lines = []
       try:
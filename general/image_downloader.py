@@ -2,11 +2,11 @@
 import argparse
 import os, sys
 import re
-import requests
 import traceback
 import logging
 
 from cmdbase import CmdBase
+import eve.common
 
 class ImageDownloader(CmdBase):
 
@@ -90,6 +90,7 @@ class ImageDownloader(CmdBase):
       return '{}/{}.{}'.format(self._args.outdir, serial, ext)
 
    def __download(self):
+      import requests
       args = self._args
       urls = self.__imgs
       outdir = args.outdir
@@ -112,7 +113,10 @@ class ImageDownloader(CmdBase):
 
          self.logdebug('Download {}-th file from "%s"'.format(url))
          try:
-            r = requests.get(url, verify=not args.no_verify)
+            with eve.common.span('http', method='GET', url=url) as span:
+               r = requests.get(url, verify=not args.no_verify)
+               span.set('status', r.status_code)
+               span.set('bytes', len(r.content))
          except Exception as e:
             failure += 1
             self.logerror('Failed to download {}'.format(url))
@@ -22,7 +22,7 @@ class Wait(CmdBase):
         if self._args.all:
             param = 'axo'
 
-        cmd = ['ps', param, 'pid,command']
+        cmd = [self._required_path('ps'), param, 'pid,command']
         lines = []
         try:
             self.logdebug("run cmd: " + str(cmd))
@@ -0,0 +1,8 @@
+#!/usr/bin/python
+# vim: set expandtab:
+
+import os
+import sys
+
+# commands import eve and cmdbase from the script dir, as eve.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,102 @@
+#!/usr/bin/python
+# vim: set expandtab:
+
+import sys
+
+import pytest
+
+import eve.common
+from eve.cmdbase import CmdBase
+from eve.database import EveDB
+
+class Writer(CmdBase):
+    """
+    writes `value`, then ends as told by --then
+    """
+    def __init__(self):
+        CmdBase.__init__(self, 'writer', '1.0.0')
+
+    def _prepare_parser(self, parser):
+        parser.add_argument('value')
+        parser.add_argument('--then', default='ok',
+                choices=['ok', 'fail', 'exit', 'exit0', 'raise', 'inner'])
+
+    def _run(self):
+        db = self._db()
+        db.table_insert_many('values', [{'v': self._args.value}])
+        then = self._args.then
+        if then == 'fail':
+            return 1
+        if then == 'exit':
+            sys.exit(3)
+        if then == 'exit0':
+            sys.exit(0)
+        if then == 'raise':
+            raise ValueError(self._args.value)
+        if then == 'inner':
+            # only the savepoint is rolled back, the line goes on
+            try:
+                with db.savepoint():
+                    db.table_insert_many('values', [{'v': self._args.value + '.inner'}])
+                    raise ValueError('inner')
+            except ValueError:
+                pass
+        return 0
+
+@pytest.fixture
+def dbfile(tmp_path):
+    dbfile = str(tmp_path / 'eve.db')
+    eve.common.set_dbfilepath(dbfile)
+    db = EveDB(dbfile)
+    db.set_namespace('writer')
+    db.table_create('values', [{'name': 'v', 'type': 'text'}])
+    yield dbfile
+    eve.common.shutdown_logger()
+
+def run_batch(monkeypatch, tmp_path, lines):
+    batch = tmp_path / 'batch.txt'
+    batch.write_text('\n'.join(lines) + '\n')
+    monkeypatch.setattr(sys, 'argv', ['writer', '--batch', str(batch), '--logfile', 'none'])
+    return Writer().run()
+
+def values(dbfile):
+    db = EveDB(dbfile)
+    db.set_namespace('writer')
+    return sorted(row['v'] for row in db.table_select('values'))
+
+def test_failed_lines_are_rolled_back(monkeypatch, tmp_path, dbfile):
+    r = run_batch(monkeypatch, tmp_path, [
+        'a',
+        'b --then fail',
+        '# c',
+        '',
+        'd --then raise',
+        'e --then exit',
+        'f --then exit0',
+        'g --then bad',
+        'h',
+    ])
+    assert r == 1
+    assert values(dbfile) == ['a', 'f', 'h']
+
+def test_savepoint_in_line(monkeypatch, tmp_path, dbfile):
+    assert run_batch(monkeypatch, tmp_path, ['a --then inner', 'b']) == 0
+    assert values(dbfile) == ['a', 'b']
+
+def test_savepoint_rollback(dbfile):
+    db = EveDB(dbfile)
+    db.set_namespace('writer')
+    with db.transaction():
+        db.table_insert_many('values', [{'v': 'outer'}])
+        with pytest.raises(ValueError):
+            with db.savepoint():
+                db.table_insert_many('values', [{'v': 'inner'}])
+                raise ValueError()
+        with db.savepoint():
+            db.table_insert_many('values', [{'v': 'kept'}])
+    assert values(dbfile) == ['kept', 'outer']
+    with pytest.raises(ValueError):
+        with db.transaction(deferred=True):
+            db.table_insert_many('values', [{'v': 'dropped'}])
+            raise ValueError()
+    assert values(dbfile) == ['kept', 'outer']
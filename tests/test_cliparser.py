@@ -0,0 +1,180 @@
+#!/usr/bin/python
+# vim: set expandtab:
+
+import os
+import json
+
+import pytest
+
+from eve.cliparser import CliParser, AMBIGUOUS
+
+class Commands:
+    def __init__(self):
+        self.calls = []
+
+    def run(self, name, **args):
+        self.calls.append((name, args))
+        return name
+
+    def build(self, cp):
+        cp.add_command(['show'], inst=self, func=Commands.run, default_args={'name': 'show'})
+        cp.add_command(['show', 'slot', '@idlist(int)...'], inst=self, func=Commands.run, default_args={'name': 'slot'})
+        cp.add_command(['set', 'feature', '@enable(bool)'], inst=self, func=Commands.run, default_args={'name': 'feature'})
+        cp.add_command(['set', 'filesystem', '@fstype'], inst=self, func=Commands.run, default_args={'name': 'fs'})
+        cp.add_command(['delete', '@id'], inst=self, func=Commands.run, default_args={'name': 'delete'})
+        cp.add_command(['delete', 'all'], inst=self, func=Commands.run, default_args={'name': 'delete all'})
+
+def parser():
+    commands = Commands()
+    cp = CliParser()
+    commands.build(cp)
+    # bad commands return None instead of printing help
+    cp.register_bad_command_handler(lambda parse_info: None)
+    return commands, cp
+
+def test_prefix_map():
+    _, cp = parser()
+    cp.compile()
+    node = cp.root.const_children['set']
+    assert node.prefix_map['f'] is AMBIGUOUS
+    assert node.prefix_map['fe'] is node.const_children['feature']
+    assert node.prefix_map['fil'] is node.const_children['filesystem']
+    assert node.prefix_map['feature'] is node.const_children['feature']
+    assert 'features' not in node.prefix_map
+
+def test_invoke_by_prefix():
+    commands, cp = parser()
+    assert cp.invoke(['sh']) == 'show'
+    assert cp.invoke(['s', 'fe', 'yes']) is None # s is show or set
+    assert cp.invoke(['se', 'fe', 'yes']) == 'feature'
+    assert commands.calls[-1] == ('feature', {'enable': True})
+    assert cp.invoke(['set', 'files', 'ext4']) == 'fs'
+    assert commands.calls[-1] == ('fs', {'fstype': 'ext4'})
+    assert cp.invoke(['sh', 'sl', '1', '0x10']) == 'slot'
+    assert commands.calls[-1] == ('slot', {'idlist': [1, 16]})
+    assert cp.invoke(['set', 'f', 'yes']) is None
+
+def test_const_before_variable():
+    commands, cp = parser()
+    assert cp.invoke(['delete', 'a']) == 'delete all'
+    assert cp.invoke(['delete', 'b']) == 'delete'
+    assert commands.calls[-1] == ('delete', {'id': 'b'})
+
+def test_lazy_compile_after_add():
+    commands, cp = parser()
+    assert cp.invoke(['sh']) == 'show'
+    cp.add_command(['shutdown'], inst=commands, func=Commands.run, default_args={'name': 'shutdown'})
+    assert cp.invoke(['sh']) is None
+    assert cp.invoke(['shu']) == 'shutdown'
+
+@pytest.mark.parametrize('tokens', [['se'], ['setup'], ['sho'], ['set', 'feat']])
+def test_ambiguous_token(tokens):
+    _, cp = parser()
+    with pytest.raises(CliParser.CmdTreeBuildException):
+        cp.add_command(tokens + ['x'])
+
+def test_conflicted_variable():
+    _, cp = parser()
+    with pytest.raises(CliParser.CmdTreeBuildException):
+        cp.add_command(['delete', '@name'])
+
+def test_help_keyword():
+    _, cp = parser()
+    helped = []
+    cp.register_help_command_handler(lambda parse_info: helped.append(parse_info['match_cnt']))
+    cp.invoke(['set', '?'])
+    assert helped == [1]
+
+### freeze / thaw / cache ###
+def test_freeze_thaw_roundtrip():
+    commands, cp = parser()
+    frozen = json.loads(json.dumps(cp.freeze(commands)))
+    other = Commands()
+    thawed = CliParser.thaw(frozen, other)
+    thawed.register_bad_command_handler(lambda parse_info: None)
+    assert thawed.invoke(['se', 'fil', 'xfs']) == 'fs'
+    assert thawed.invoke(['delete', 'a']) == 'delete all'
+    assert thawed.invoke(['s']) is None
+    # handlers are bound to the instance given to thaw
+    assert other.calls == [('fs', {'fstype': 'xfs'}), ('delete all', {})]
+    assert commands.calls == []
+    assert thawed.freeze(other) == frozen
+
+def test_thaw_is_lazy():
+    commands, cp = parser()
+    thawed = CliParser.thaw(cp.freeze(commands), commands)
+    assert thawed.root.const_children == {}
+    assert thawed.invoke(['sh']) == 'show'
+    # only nodes on the way are thawed
+    assert thawed.root.const_children['set'].const_children == {}
+    helped = []
+    thawed.register_help_command_handler(lambda parse_info: helped.append(parse_info['node']))
+    thawed.invoke(['set', 'help'])
+    assert sorted(helped[0].const_children) == ['feature', 'filesystem']
+    assert helped[0].const_children['feature'].frozen is None
+
+def test_freeze_options():
+    commands, cp = parser()
+    cp.add_option(['-v', '--verbose'], inst=commands, func=Commands.run, default_args={'name': 'verbose'})
+    thawed = CliParser.thaw(cp.freeze(commands), commands)
+    assert thawed.invoke(['--verbose', 'sh']) == 'show'
+    assert commands.calls == [('verbose', {}), ('show', {})]
+
+def test_freeze_rejects():
+    commands, cp = parser()
+    with pytest.raises(CliParser.CmdTreeFreezeException):
+        cp.freeze(Commands()) # bound to another instance
+    cp.add_command(['lambda'], func=lambda: 0)
+    with pytest.raises(CliParser.CmdTreeFreezeException):
+        cp.freeze(commands)
+    commands, cp = parser()
+    cp.add_command(['object'], inst=commands, func=Commands.run, default_args={'name': object()})
+    with pytest.raises(CliParser.CmdTreeFreezeException):
+        cp.freeze(commands)
+    commands, cp = parser()
+    frozen = cp.freeze(commands)
+    frozen['version'] = -1
+    with pytest.raises(CliParser.CmdTreeFreezeException):
+        CliParser.thaw(frozen)
+
+def test_cache_file_key(tmp_path):
+    cache_file = CliParser.cache_file
+    source = str(tmp_path / 'cmd.py')
+    assert cache_file(source, 'cache', 'Cmd') == cache_file(str(tmp_path / '.' / 'cmd.py'), 'cache', 'Cmd')
+    assert cache_file(source, 'cache', 'Cmd') != cache_file(source, 'cache', 'Other')
+    assert cache_file(source, 'cache', 'Cmd') != cache_file(str(tmp_path / 'other.py'), 'cache', 'Cmd')
+    assert os.path.dirname(cache_file(source, 'cache', 'Cmd')) == 'cache'
+
+def test_cached(tmp_path):
+    source = tmp_path / 'cmd.py'
+    source.write_text('# commands\n')
+    cachedir = str(tmp_path / 'cache')
+    builds = []
+    def build(cp):
+        builds.append(1)
+        commands.build(cp)
+
+    commands = Commands()
+    cp = CliParser.cached(build, str(source), cachedir, commands, 'Cmd')
+    assert len(builds) == 1
+    assert os.path.isfile(CliParser.cache_file(str(source), cachedir, 'Cmd'))
+    cp = CliParser.cached(build, str(source), cachedir, commands, 'Cmd')
+    assert len(builds) == 1
+    assert cp.invoke(['sh']) == 'show'
+    # a changed source builds again
+    source.write_text('# commands changed\n')
+    CliParser.cached(build, str(source), cachedir, commands, 'Cmd')
+    assert len(builds) == 2
+    CliParser.cached(build, str(source), cachedir, commands, 'Cmd')
+    assert len(builds) == 2
+
+def test_cached_unfreezable(tmp_path):
+    source = tmp_path / 'cmd.py'
+    source.write_text('# commands\n')
+    cachedir = str(tmp_path / 'cache')
+    def build(cp):
+        cp.add_command(['lambda'], func=lambda: 'built')
+    for _ in range(2):
+        cp = CliParser.cached(build, str(source), cachedir, None, 'Cmd')
+        assert cp.invoke(['lambda']) == 'built'
+    assert not os.path.exists(CliParser.cache_file(str(source), cachedir, 'Cmd'))
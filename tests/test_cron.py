@@ -0,0 +1,134 @@
+#!/usr/bin/python
+# vim: set expandtab:
+
+import random
+import datetime
+
+import pytest
+
+from eve.cron import CronSchedule
+
+# how far the brute force looks, expressions below fire within it
+BRUTE_DAYS = 62
+
+def brute_next(expr, ts):
+    """
+    first minute after `ts` matching `expr`, stepping one minute at a time
+    """
+    fields = expr.split()
+    minute, hour, day, month, dow = [expand(f, lo, hi) for f, (lo, hi) in
+            zip(fields, [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)])]
+    dow = set(d % 7 for d in dow)
+    dt = datetime.datetime.fromtimestamp(ts).replace(second=0, microsecond=0)
+    for _ in range(BRUTE_DAYS * 24 * 60):
+        dt += datetime.timedelta(minutes=1)
+        dom_ok = dt.day in day
+        dow_ok = dt.isoweekday() % 7 in dow
+        if fields[2] == '*' or fields[4] == '*':
+            day_ok = dom_ok and dow_ok
+        else:
+            day_ok = dom_ok or dow_ok
+        if dt.minute in minute and dt.hour in hour and dt.month in month and day_ok:
+            return dt.timestamp()
+    return None
+
+def expand(field, lo, hi):
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/')
+            step = int(step)
+        if part == '*':
+            first, last = lo, hi
+        elif '-' in part:
+            first, last = [int(v) for v in part.split('-')]
+        else:
+            first = int(part)
+            last = hi if step != 1 else first
+        values.update(range(first, last + 1, step))
+    return values
+
+def random_field(rnd, lo, hi):
+    kind = rnd.randrange(5)
+    if kind == 0:
+        return '*'
+    if kind == 1:
+        return '*/{}'.format(rnd.randint(2, 7))
+    if kind == 2:
+        first = rnd.randint(lo, hi)
+        return '{}-{}'.format(first, rnd.randint(first, hi))
+    if kind == 3:
+        return ','.join(str(v) for v in sorted(rnd.sample(range(lo, hi + 1), 3)))
+    first = rnd.randint(lo, hi - 1)
+    return '{}-{}/{}'.format(first, hi, rnd.randint(2, 3))
+
+@pytest.mark.parametrize('expr', [
+    '* * * * *',
+    '*/15 * * * *',
+    '0 0 * * *',
+    '30 4 1,15 * 5',
+    '0 12 * * 1-5',
+    '5-10/2 */3 * * *',
+    '59 23 31 * *',
+    '0 0 * * 7',
+    '0 0 1 * 0',
+])
+def test_next_fire_matches_brute_force(expr):
+    rnd = random.Random(expr)
+    cron = CronSchedule(expr)
+    start = datetime.datetime(2026, 1, 1).timestamp()
+    for _ in range(20):
+        ts = start + rnd.randrange(365 * 86400) + rnd.random()
+        assert cron.next_fire(ts) == brute_next(expr, ts), ts
+
+def test_next_fire_random_expressions():
+    rnd = random.Random(31)
+    start = datetime.datetime(2026, 1, 1).timestamp()
+    checked = 0
+    while checked < 40:
+        expr = ' '.join([random_field(rnd, 0, 59), random_field(rnd, 0, 23),
+                random_field(rnd, 1, 28), '*', random_field(rnd, 0, 6)])
+        ts = start + rnd.randrange(365 * 86400)
+        expected = brute_next(expr, ts)
+        if expected is None:
+            continue
+        assert CronSchedule(expr).next_fire(ts) == expected, expr
+        checked += 1
+
+def test_next_fire_is_strictly_after():
+    cron = CronSchedule('*/5 * * * *')
+    ts = datetime.datetime(2026, 3, 1, 10, 5).timestamp()
+    assert cron.next_fire(ts) == datetime.datetime(2026, 3, 1, 10, 10).timestamp()
+    assert cron.next_fire(ts - 1) == ts
+
+def test_next_fire_rare_dates():
+    ts = datetime.datetime(2026, 3, 1).timestamp()
+    assert CronSchedule('0 0 29 2 *').next_fire(ts) == datetime.datetime(2028, 2, 29).timestamp()
+    assert CronSchedule('@yearly').next_fire(ts) == datetime.datetime(2027, 1, 1).timestamp()
+    with pytest.raises(CronSchedule.BadExpressionException):
+        CronSchedule('0 0 30 2 *').next_fire(ts)
+
+def test_names_and_macros():
+    assert CronSchedule('0 9 * jan-mar mon,FRI').dows == [1, 5]
+    assert CronSchedule('0 9 * jan-mar mon,FRI').months == [1, 2, 3]
+    assert CronSchedule('0 0 * * sun,7').dows == [0]
+    hourly = CronSchedule('@hourly')
+    assert hourly.minutes == [0] and hourly.hours == list(range(24))
+
+@pytest.mark.parametrize('expr', [
+    '* * * *',
+    '* * * * * *',
+    '60 * * * *',
+    '* 24 * * *',
+    '* * 0 * *',
+    '* * * 13 *',
+    '* * * * 8',
+    '*/0 * * * *',
+    '5-1 * * * *',
+    'x * * * *',
+    '@never',
+])
+def test_bad_expressions(expr):
+    with pytest.raises(CronSchedule.BadExpressionException):
+        CronSchedule(expr)
@@ -0,0 +1,107 @@
+#!/usr/bin/python
+# vim: set expandtab:
+
+import time
+import random
+
+import pytest
+
+import eve.common
+from eve.database import EveDB
+from eve.polling_service import PollingServiceDBHelper, PROGNAME
+
+DAY = 86400
+# far enough back for every run of the tests
+SINCE = time.time() - 60 * DAY
+
+@pytest.fixture
+def db(tmp_path):
+    eve.common.set_dbfilepath(str(tmp_path / 'eve.db'))
+    PollingServiceDBHelper.resetdb()
+    PollingServiceDBHelper.setupdb()
+    db = EveDB(str(tmp_path / 'eve.db'))
+    db.set_namespace(PROGNAME)
+    yield db
+    PollingServiceDBHelper.resetdb()
+
+def add_runs(n, days, seed):
+    rnd = random.Random(seed)
+    now = time.time()
+    records = []
+    for _ in range(n):
+        records.append({
+            'jobname': rnd.choice(['a', 'b', 'c']),
+            'start': now - rnd.random() * days * DAY,
+            # quarter seconds, sums are exact whatever the order
+            'duration': rnd.randrange(1, 40) / 4,
+            'outcome': rnd.choice(['succ', 'succ', 'fail', 'timeout']),
+            'items': rnd.randrange(10),
+        })
+    PollingServiceDBHelper.add_runs(records)
+    return records
+
+def raw_count(db):
+    return db.execute('SELECT COUNT(*) AS `n` FROM `{}`;'.format(db.table_name('runs')))[0]['n']
+
+def trend(bucket, offset = 0, jobname = None):
+    return [dict(row) for row in PollingServiceDBHelper.get_run_trend(SINCE, bucket, jobname, offset)]
+
+def test_rollup_keeps_aggregates(db):
+    records = add_runs(500, 20, 33)
+    hourly, daily = trend(3600), trend(DAY)
+    n = PollingServiceDBHelper.compact_runs(7 * DAY, 100000, 400 * DAY)
+    assert n == len([r for r in records if r['start'] < time.time() - 7 * DAY])
+    assert raw_count(db) == len(records) - n
+    assert trend(3600) == hourly
+    assert trend(DAY) == daily
+    assert sum(row['runs'] for row in daily) == len(records)
+    assert sum(row['fail'] for row in daily) == len([r for r in records if r['outcome'] == 'fail'])
+    assert max(row['max_duration'] for row in daily) == max(r['duration'] for r in records)
+
+def test_compaction_is_idempotent(db):
+    add_runs(300, 20, 34)
+    PollingServiceDBHelper.compact_runs(7 * DAY, 100000, 400 * DAY)
+    rows, hourly = raw_count(db), trend(3600)
+    assert PollingServiceDBHelper.compact_runs(7 * DAY, 100000, 400 * DAY) == 0
+    assert raw_count(db) == rows
+    assert trend(3600) == hourly
+
+def test_compaction_merges_into_existing_hours(db):
+    records = add_runs(200, 3, 35)
+    daily = trend(DAY)
+    # rolled up in two steps, the second adds to hours of the first
+    PollingServiceDBHelper.compact_runs(2 * DAY, 100000, 400 * DAY)
+    PollingServiceDBHelper.compact_runs(DAY, 100000, 400 * DAY)
+    assert trend(DAY) == daily
+    assert sum(row['runs'] for row in trend(DAY)) == len(records)
+
+def test_compaction_keeps_newest_rows(db):
+    add_runs(200, 3, 36)
+    daily = trend(DAY)
+    PollingServiceDBHelper.compact_runs(30 * DAY, 50, 400 * DAY)
+    assert raw_count(db) == 50
+    assert trend(DAY) == daily
+
+def test_old_rollups_are_dropped(db):
+    add_runs(200, 20, 37)
+    PollingServiceDBHelper.compact_runs(0, 100000, 10 * DAY)
+    assert raw_count(db) == 0
+    hours = [row['bucket'] for row in trend(3600)]
+    assert len(hours) != 0
+    assert min(hours) >= int((time.time() - 10 * DAY) // 3600) * 3600
+
+def test_trend_buckets_follow_offset(db):
+    records = add_runs(300, 5, 38)
+    offset = 8 * 3600
+    daily = trend(DAY, offset)
+    for row in daily:
+        assert (row['bucket'] + offset) % DAY == 0
+    assert sum(row['runs'] for row in daily) == len(records)
+    PollingServiceDBHelper.compact_runs(0, 100000, 400 * DAY)
+    assert trend(DAY, offset) == daily
+
+def test_trend_of_one_job(db):
+    records = add_runs(100, 2, 39)
+    rows = trend(DAY, jobname='b')
+    assert set(row['jobname'] for row in rows) == {'b'}
+    assert sum(row['runs'] for row in rows) == len([r for r in records if r['jobname'] == 'b'])
@@ -0,0 +1,98 @@
+#!/usr/bin/python
+# vim: set expandtab:
+
+import io
+import random
+import unicodedata
+
+import pytest
+
+from eve.common import cht_width, cht_len, cut_width, pad_width, Table
+
+def slow_width(msg):
+    return sum(2 if unicodedata.east_asian_width(c) in ('F', 'W') else 1 for c in msg)
+
+def test_cht_width():
+    assert cht_width('') == 0
+    assert cht_width('abc') == 3
+    assert cht_width('漢字') == 4
+    assert cht_width('ｶﾀｶﾅ') == 4 # halfwidth
+    assert cht_width('ＡＢ') == 4 # fullwidth
+    assert cht_width('é漢a') == 4
+    assert cht_width(123) == 3
+    assert cht_len('漢字ab') == 2
+    assert cht_len(None) == 0
+
+def test_cht_width_random():
+    rnd = random.Random(50)
+    chars = 'abc é漢字かなｶﾅＡ한글'
+    for _ in range(200):
+        msg = ''.join(rnd.choice(chars) for _ in range(rnd.randrange(30)))
+        assert cht_width(msg) == slow_width(msg)
+
+@pytest.mark.parametrize('msg', ['hello world', '漢字漢字漢字漢字', 'ab漢字cd漢字', 'a漢'])
+def test_cut_width(msg):
+    for width in range(-1, 20):
+        cut = cut_width(msg, width)
+        assert cht_width(cut) <= max(width, 0), (msg, width, cut)
+        if cht_width(msg) <= width:
+            assert cut == msg
+        elif width >= 4:
+            # the longest prefix that fits with the ellipsis
+            assert cut.endswith(' ...')
+            prefix = cut[:-4]
+            assert msg.startswith(prefix)
+            assert cht_width(msg[:len(prefix) + 1]) > width - 4
+        else:
+            assert msg.startswith(cut)
+
+def test_cut_width_ellipsis():
+    assert cut_width('abcdef', 4, '…') == 'abc…'
+    assert cut_width('abcdef', 4, '') == 'abcd'
+    assert cut_width('abcdef', 2) == 'ab'
+    assert cut_width('漢字漢字', 3) == '漢'
+    assert cut_width(1234567, 5) == '1 ...'
+
+def test_pad_width():
+    assert pad_width('ab', 4) == 'ab  '
+    assert pad_width('ab', 4, '>') == '  ab'
+    assert pad_width('漢', 4) == '漢  '
+    assert pad_width('漢字漢', 4) == '漢字漢'
+    assert pad_width(7, 3, '>') == '  7'
+
+def lines(out):
+    return out.getvalue().splitlines()
+
+def test_table_fixed_widths():
+    out = io.StringIO()
+    table = Table([
+        {'name': 'id', 'width': 3, 'align': '>'},
+        {'name': 'name', 'width': 8, 'cut': True},
+        {'name': 'status', 'width': 7},
+        {'name': 'url'},
+    ], sep=' | ', header=False, out=out)
+    table.add({'id': 1, 'name': '漢字漢字漢字', 'status': 'good', 'url': 'u1'})
+    # rows are written as they are added
+    assert len(lines(out)) == 1
+    table.text('---')
+    table.add({'id': 22, 'name': 'ab', 'status': 'error', 'url': 'u2'})
+    table.close()
+    assert lines(out) == [
+        '  1 | 漢字 ... | good    | u1',
+        '---',
+        ' 22 | ab       | error   | u2',
+    ]
+
+def test_table_measured_widths():
+    out = io.StringIO()
+    with Table([{'name': 0, 'title': 'name'}, {'name': 1, 'title': 'n', 'align': '>', 'max': 3}, {'name': 2}],
+            out=out) as table:
+        table.add(['漢字', 1, 'x'])
+        table.add(['abc', 12345, 'y'])
+        assert out.getvalue() == ''
+    assert lines(out) == [
+        'name   n 2',
+        '---- --- -',
+        '漢字   1 x',
+        'abc  12345 y',
+    ]